@@ -0,0 +1,317 @@
+"""
+OCR Telegram Bot - Local HTTP OCR API
+=====================================
+
+Optional HTTP server exposing the bot's OCR pipeline to internal services.
+
+Endpoints:
+----------
+POST /ocr?lang=ukr+eng&filename=scan.pdf&profile=fast
+    Body is either the raw file (streamed, never buffered in full) or a
+    multipart form with a 'file' field and optional 'lang' and 'profile' fields.
+    Responds with NDJSON: one record per page as soon as it is recognized,
+    then a final summary record.
+    Declined with 503 while the bot process drains for shutdown.
+GET /livez, GET /readyz
+    Liveness and readiness checks, see lifecycle.py.
+
+The server runs jobs through an OcrWorkerPool: the bot's own pool when started
+from bot.py with API_ENABLED, or a dedicated one when run standalone:
+
+    python api.py --host 127.0.0.1 --port 8080
+"""
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+import asyncio
+import logging
+import argparse
+import tempfile
+import contextlib
+
+from aiohttp import web
+
+from consts import (ALLOWED_FORMATS, API_HOST, API_PORT, API_MAX_UPLOAD_SIZE, API_READ_CHUNK, API_PAGE_BATCH,
+                    API_MAX_PAGE_JOBS, OCR_PROFILES, DEFAULT_OCR_PROFILE)
+from lifecycle import Lifecycle, add_health_routes
+from metrics import observe
+from ocr_pool import OcrWorkerPool
+from ocr_engine import split_reruns, RerunBudget
+from reader import process_input_files, recognize_text_from_pdf, count_pdf_pages
+from utils.helpers import sanitize_filename
+
+logger = logging.getLogger(__name__)
+
+POOL_KEY = web.AppKey('ocr_pool', OcrWorkerPool)
+LIFECYCLE_KEY = web.AppKey('lifecycle', Lifecycle)
+LANG_PATTERN = re.compile(r'^[a-z_]+(\+[a-z_]+)*$')
+
+
+class UploadError(Exception):
+    """
+    Raised when an upload is rejected before processing starts.
+    """
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+async def _save_stream(read_chunk, path: str):
+    """
+    Copy a request body to disk chunk by chunk, enforcing API_MAX_UPLOAD_SIZE.
+
+    Each chunk is written before the next one is read, so a fast client is
+    slowed down to disk speed instead of filling memory.
+
+    :param read_chunk: Coroutine function returning the next chunk of at most the given size
+    :param path: Destination path
+    """
+    size = 0
+    with open(path, 'wb') as f:
+        while True:
+            chunk = await read_chunk(API_READ_CHUNK)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > API_MAX_UPLOAD_SIZE:
+                raise UploadError(413, f'Upload exceeds {API_MAX_UPLOAD_SIZE} bytes')
+            await asyncio.to_thread(f.write, chunk)
+    if not size:
+        raise UploadError(400, 'Empty upload')
+
+
+def _check_upload(filename, lang, profile) -> tuple:
+    """
+    Validate file name, OCR language and OCR profile of an upload.
+
+    :return: Tuple (sanitized file name, language, profile)
+    """
+    if not filename:
+        raise UploadError(400, "Missing 'filename'")
+    name = sanitize_filename(filename)
+    ext = os.path.splitext(name)[1].lower().lstrip('.')
+    if ext not in ALLOWED_FORMATS:
+        raise UploadError(415, f'Unsupported format: {ext or filename}')
+    if not LANG_PATTERN.match(lang):
+        raise UploadError(400, f'Invalid language: {lang}')
+    if profile not in OCR_PROFILES:
+        raise UploadError(400, f'Unknown profile: {profile}')
+    return name, lang, profile
+
+
+async def _receive_upload(request: web.Request, temp_dir: str) -> tuple:
+    """
+    Store the uploaded file in temp_dir.
+
+    :return: Tuple (file path, file name, language, profile)
+    """
+    lang = request.query.get('lang', 'ukr')
+    profile = request.query.get('profile', DEFAULT_OCR_PROFILE)
+    filename = request.query.get('filename')
+
+    if request.content_type.startswith('multipart/'):
+        multipart = await request.multipart()
+        while True:
+            part = await multipart.next()
+            if part is None:
+                raise UploadError(400, "Missing 'file' field")
+            if part.name == 'lang':
+                lang = (await part.text()).strip()
+            elif part.name == 'profile':
+                profile = (await part.text()).strip()
+            elif part.name == 'file':
+                name, lang, profile = _check_upload(part.filename or filename, lang, profile)
+                path = os.path.join(temp_dir, name)
+                await _save_stream(part.read_chunk, path)
+                return path, name, lang, profile
+
+    name, lang, profile = _check_upload(filename, lang, profile)
+    path = os.path.join(temp_dir, name)
+    await _save_stream(request.content.read, path)
+    return path, name, lang, profile
+
+
+async def _write_record(response: web.StreamResponse, record: dict):
+    """
+    Write one NDJSON record; waits while the client is not reading (backpressure).
+    """
+    await response.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n')
+
+
+async def _stream_pdf(response, pool: OcrWorkerPool, path: str, name: str, lang: str, profile: str) -> int:
+    """
+    OCR a PDF in page batches and stream pages in order as batches complete.
+
+    At most API_MAX_PAGE_JOBS batches run ahead of the client, so a slow reader
+    also slows down recognition. Each batch gets its share of the request's
+    adaptive re-run budget.
+
+    :return: Number of pages streamed
+    """
+    total = await pool.run(count_pdf_pages, path)
+    batches = [range(start, min(start + API_PAGE_BATCH, total)) for start in range(0, total, API_PAGE_BATCH)]
+    running = []
+    try:
+        for batch, max_reruns in zip(batches, split_reruns(len(batches))):
+            job = pool.run(recognize_text_from_pdf, path, lang, batch, profile, RerunBudget(max_reruns))
+            running.append((batch, asyncio.ensure_future(job)))
+            if len(running) < API_MAX_PAGE_JOBS:
+                continue
+            await _write_batch(response, name, *running.pop(0))
+        while running:
+            await _write_batch(response, name, *running.pop(0))
+    finally:
+        for _, task in running:
+            task.cancel()
+    return total
+
+
+async def _write_batch(response, name: str, batch: range, task):
+    """
+    Wait for a page batch job and stream its pages.
+    """
+    result = await task
+    page_texts = result.page_texts()
+    for page_num in batch:
+        await _write_record(response, {'file': name, 'page': page_num + 1, 'text': page_texts.get(page_num + 1, '')})
+
+
+def _draining(request: web.Request) -> bool:
+    """
+    :return: True while the bot process serving the API drains for shutdown
+    """
+    lifecycle = request.app.get(LIFECYCLE_KEY)
+    return bool(lifecycle and lifecycle.draining)
+
+
+async def _respond(request: web.Request, pool: OcrWorkerPool, path: str, name: str, lang: str,
+                   profile: str) -> web.StreamResponse:
+    """
+    OCR a received upload and stream its pages as NDJSON.
+    """
+    started = time.perf_counter()
+    response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson; charset=utf-8'})
+    await response.prepare(request)
+    logger.info('API request: %s with language: %s, profile: %s', name, lang, profile)
+
+    try:
+        if name.lower().endswith('.pdf'):
+            pages = await _stream_pdf(response, pool, path, name, lang, profile)
+        else:
+            results = await pool.run(process_input_files, [path], lang, profile)
+            result = next(iter(results.values()))
+            page_texts = result.page_texts() or {None: ''}
+            for page, text in page_texts.items():
+                await _write_record(response, {'file': name, 'page': page or 1, 'text': text})
+            pages = len(page_texts)
+        seconds = time.perf_counter() - started
+        observe(f'api.profile.{profile}', seconds)
+        await _write_record(response, {
+            'file': name, 'done': True, 'pages': pages, 'profile': profile, 'seconds': round(seconds, 3)
+        })
+    except ConnectionResetError:
+        logger.info('API client disconnected while receiving results for %s', name)
+        return response
+    except (ValueError, RuntimeError, OSError) as e:
+        logger.error('API processing error for %s: %s', name, e, exc_info=True)
+        await _write_record(response, {'file': name, 'error': str(e)})
+    except asyncio.CancelledError:
+        if _draining(request):
+            # Interrupted at the shutdown deadline: tell the client before the connection closes
+            with contextlib.suppress(ConnectionError, RuntimeError):
+                await _write_record(response, {'file': name, 'error': 'Interrupted by shutdown, please resend'})
+        raise
+
+    await response.write_eof()
+    return response
+
+
+async def handle_ocr(request: web.Request) -> web.StreamResponse:
+    """
+    Handle POST /ocr.
+
+    While the bot drains, new requests are declined with 503. Running requests
+    are tracked as jobs of the bot's Lifecycle, so shutdown waits for them and
+    interrupts those still running at its deadline.
+    """
+    if _draining(request):
+        return web.json_response({'error': 'Shutting down, retry later'}, status=503)
+    pool = request.app[POOL_KEY]
+    temp_dir = tempfile.mkdtemp(prefix='ocr_api_')
+    try:
+        try:
+            path, name, lang, profile = await _receive_upload(request, temp_dir)
+        except UploadError as e:
+            return web.json_response({'error': str(e)}, status=e.status)
+
+        lifecycle = request.app.get(LIFECYCLE_KEY)
+        if lifecycle is None:
+            return await _respond(request, pool, path, name, lang, profile)
+        if lifecycle.draining:
+            # Draining started while the upload was received
+            return web.json_response({'error': 'Shutting down, retry later'}, status=503)
+        with lifecycle.track(uuid.uuid4().hex[:12], None, None):
+            return await _respond(request, pool, path, name, lang, profile)
+    finally:
+        await asyncio.to_thread(shutil.rmtree, temp_dir, True)
+
+
+def create_app(pool: OcrWorkerPool, lifecycle: Lifecycle = None) -> web.Application:
+    """
+    Create the HTTP application.
+
+    :param pool: Started OcrWorkerPool used for all jobs
+    :param lifecycle: Lifecycle of the bot process, reported by /readyz and tracking OCR requests,
+        None when standalone
+    :return: aiohttp Application
+    """
+    app = web.Application()
+    app[POOL_KEY] = pool
+    if lifecycle is not None:
+        app[LIFECYCLE_KEY] = lifecycle
+    app.router.add_post('/ocr', handle_ocr)
+    add_health_routes(app, lambda: app[POOL_KEY], lifecycle)
+    return app
+
+
+async def start_api_server(pool: OcrWorkerPool, host: str = API_HOST, port: int = API_PORT,
+                           lifecycle: Lifecycle = None) -> web.AppRunner:
+    """
+    Start the HTTP server on the running event loop.
+
+    :return: AppRunner, call its cleanup() to stop the server
+    """
+    runner = web.AppRunner(create_app(pool, lifecycle))
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info('OCR API listening on http://%s:%d', host, port)
+    return runner
+
+
+def main():
+    """Run the API standalone with its own worker pool."""
+    parser = argparse.ArgumentParser(description='Local HTTP OCR API.')
+    parser.add_argument('--host', default=API_HOST)
+    parser.add_argument('--port', type=int, default=API_PORT)
+    parser.add_argument('--workers', type=int, help='OCR worker processes (default: CPU count)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    pool = OcrWorkerPool(size=args.workers)
+    pool.start()
+
+    async def close_pool(_app):
+        pool.shutdown()
+
+    app = create_app(pool)
+    app.on_cleanup.append(close_pool)
+    web.run_app(app, host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
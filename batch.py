@@ -0,0 +1,217 @@
+"""
+OCR Telegram Bot - Bulk OCR Command Line
+========================================
+
+Runs the bot's OCR pipeline over files and directories without Telegram.
+
+Files are spread across worker processes, and every result is appended to a
+JSONL file as soon as it completes. The JSONL file doubles as the checkpoint:
+running the same command again after a crash skips files already recorded.
+
+Usage:
+    python batch.py archive/ scans/page1.png --lang ukr+eng --output results.jsonl
+    python batch.py archive/ --output results.jsonl --output-dir texts/ --workers 8
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from consts import ALLOWED_FORMATS, OCR_PROFILES, DEFAULT_OCR_PROFILE
+from ocr_result import RESULT_FORMATS
+from ocr_engine import preload_backends
+from reader import process_input_files, save_texts_to_files
+from resources import available_cpus
+
+logger = logging.getLogger(__name__)
+
+
+def iter_input_files(inputs):
+    """
+    Walk input files and directories, yielding files with a supported extension.
+
+    :param inputs: File and directory paths
+    :return: Generator of (absolute path, path relative to its input root)
+    """
+    for item in inputs:
+        if os.path.isfile(item):
+            yield os.path.abspath(item), os.path.basename(item)
+            continue
+        for root, dirs, files in os.walk(item):
+            dirs.sort()
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower().lstrip('.') in ALLOWED_FORMATS:
+                    path = os.path.join(root, name)
+                    yield os.path.abspath(path), os.path.relpath(path, item)
+
+
+def load_checkpoint(output_path: str, retry_failed: bool) -> set:
+    """
+    Read paths already recorded in the JSONL output.
+
+    A truncated last line left by a crash is ignored, so that file is processed again.
+
+    :param output_path: JSONL output file
+    :param retry_failed: Do not count failed records as done
+    :return: Set of absolute paths to skip
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if retry_failed and record.get('status') != 'ok':
+                continue
+            done.add(record['path'])
+    return done
+
+
+def process_one(path: str, relative_path: str, lang: str, output_dir, fmt: str, profile: str) -> dict:
+    """
+    OCR one file in a worker process.
+
+    :return: JSONL record for the file
+    """
+    started = time.perf_counter()
+    record = {'path': path, 'lang': lang, 'profile': profile}
+    try:
+        results = process_input_files([path], lang, profile)
+        result = next(iter(results.values()))
+        if output_dir:
+            save_texts_to_files(results, os.path.join(output_dir, os.path.dirname(relative_path)), fmt)
+        record.update({
+            'status': 'ok',
+            'chars': len(result),
+            'pages': len(result.page_texts()),
+            'image_errors': result.errors,
+            'skipped_images': result.skipped,
+            'text': result.text,
+        })
+    except Exception as e:  # pylint: disable=broad-except
+        # A broken file must not stop the whole batch
+        record.update({'status': 'error', 'error': f'{type(e).__name__}: {e}'})
+    record['seconds'] = round(time.perf_counter() - started, 3)
+    return record
+
+
+class Summary:
+    """
+    Throughput and failure counters for a batch run.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.ok = 0
+        self.failed = 0
+        self.skipped = 0
+        self.pages = 0
+        self.chars = 0
+        self.failures = []
+
+    def add(self, record: dict):
+        """
+        Count a file's output record.
+
+        :param record: Record written to the output JSONL
+        """
+        if record['status'] == 'ok':
+            self.ok += 1
+            self.pages += record['pages']
+            self.chars += record['chars']
+        else:
+            self.failed += 1
+            self.failures.append((record['path'], record['error']))
+
+    def print(self, file=sys.stdout):
+        """
+        Print the file counts, the throughput and the failed files.
+
+        :param file: Stream to print to
+        """
+        elapsed = time.perf_counter() - self.started
+        processed = self.ok + self.failed
+        print(f'Processed {processed} file(s) in {elapsed:.1f}s: {self.ok} ok, {self.failed} failed, '
+              f'{self.skipped} skipped (already in output)', file=file)
+        if elapsed > 0 and processed:
+            print(f'Throughput: {processed / elapsed:.2f} files/s, {self.pages / elapsed:.2f} pages/s, '
+                  f'{self.chars / elapsed:.0f} chars/s', file=file)
+        for path, error in self.failures:
+            print(f'FAILED {path}: {error}', file=file)
+
+
+def run_batch(args) -> Summary:
+    """
+    Process all input files, streaming records to the JSONL output as they complete.
+    """
+    summary = Summary()
+    done = load_checkpoint(args.output, args.retry_failed)
+    workers = args.workers or available_cpus()[0]
+    # Every worker is busy while the queue is full, one OpenMP thread per Tesseract run avoids oversubscription
+    os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+
+    with open(args.output, 'a', encoding='utf-8') as output, \
+            ProcessPoolExecutor(max_workers=workers, initializer=preload_backends) as executor:
+        pending = set()
+
+        def drain(return_when):
+            finished, still_pending = wait(pending, return_when=return_when)
+            for future in finished:
+                record = future.result()
+                output.write(json.dumps(record, ensure_ascii=False) + '\n')
+                output.flush()
+                os.fsync(output.fileno())
+                summary.add(record)
+                logger.info('%s %s (%.1fs)', record['status'].upper(), record['path'], record['seconds'])
+            return still_pending
+
+        for path, relative_path in iter_input_files(args.inputs):
+            if path in done:
+                summary.skipped += 1
+                continue
+            done.add(path)
+            pending.add(executor.submit(process_one, path, relative_path, args.lang, args.output_dir, args.format,
+                                        args.profile))
+            # Keep the queue short so huge archives are walked lazily
+            if len(pending) >= workers * 2:
+                pending = drain(FIRST_COMPLETED)
+
+        while pending:
+            pending = drain(FIRST_COMPLETED)
+
+    return summary
+
+
+def main():
+    """Parse arguments and run the batch."""
+    parser = argparse.ArgumentParser(description='Bulk OCR files and directories with the bot pipeline.')
+    parser.add_argument('inputs', nargs='+', help='files or directories to process')
+    parser.add_argument('--lang', default='ukr', help="Tesseract language(s), e.g. 'ukr' or 'ukr+eng'")
+    parser.add_argument('--output', default='ocr_results.jsonl', help='JSONL output, also used as checkpoint')
+    parser.add_argument('--output-dir', help='also save each result as a file in this directory')
+    parser.add_argument('--profile', default=DEFAULT_OCR_PROFILE, choices=list(OCR_PROFILES), help='OCR profile')
+    parser.add_argument('--format', default='text', choices=sorted(RESULT_FORMATS), help='format of saved files')
+    parser.add_argument('--workers', type=int, help='worker processes (default: available CPUs)')
+    parser.add_argument('--retry-failed', action='store_true', help='process files recorded as failed again')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    try:
+        summary = run_batch(args)
+    except KeyboardInterrupt:
+        print('Interrupted: completed files are recorded, run the same command again to resume.', file=sys.stderr)
+        sys.exit(130)
+
+    summary.print()
+    sys.exit(1 if summary.failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Message chunker microbenchmark.
+
+Compares the linear UTF-16-aware splitter in handlers/delivery.py with the
+previous slicing implementation on large ASCII, Cyrillic and emoji-heavy
+texts, and checks that every chunk fits Telegram's limit in UTF-16 code units.
+
+Usage:
+    python benchmarks/chunker.py
+    python benchmarks/chunker.py --size-mb 8 --repeat 3
+"""
+import os
+import sys
+import random
+import argparse
+import timeit
+
+if not __package__:
+    # Run as a script: make the repository modules importable
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The imports need the repository root on sys.path, which the block above ensures
+# pylint: disable=wrong-import-position
+from consts import TELEGRAM_MAX_MESSAGE_LENGTH, HEADER_RESERVE
+from handlers.delivery import _split_text_into_chunks  # pylint: disable=protected-access
+from utils.helpers import utf16_len
+
+MAX_LENGTH = TELEGRAM_MAX_MESSAGE_LENGTH - HEADER_RESERVE
+
+WORDS = {
+    'ascii': ['lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur', 'adipiscing', 'elit'],
+    'cyrillic': [
+        'розпізнавання', 'тексту', 'документ',
+        'сторінка', 'зображення', 'мова',
+    ],
+    'emoji': ['文字', '認識', '🙂', '📄', '🇺🇦', 'テキスト', '𝔘𝔫𝔦𝔠𝔬𝔡𝔢'],
+}
+
+
+def legacy_split(text: str, max_length: int) -> list:
+    """
+    Previous implementation: slices the remaining text on every chunk (quadratic).
+    """
+    if len(text) <= max_length:
+        return [text]
+
+    chunks = []
+    while text:
+        if len(text) <= max_length:
+            chunks.append(text)
+            break
+
+        split_point = max_length
+
+        newline_pos = text.rfind('\n', 0, max_length)
+        if newline_pos > max_length // 2:
+            split_point = newline_pos + 1
+        else:
+            space_pos = text.rfind(' ', 0, max_length)
+            if space_pos > max_length // 2:
+                split_point = space_pos + 1
+
+        chunks.append(text[:split_point])
+        text = text[split_point:]
+
+    return chunks
+
+
+def make_text(kind: str, size: int) -> str:
+    """
+    Build a pseudo-random text of roughly `size` characters with words and line breaks.
+    """
+    rng = random.Random(42)
+    words = WORDS[kind]
+    parts = []
+    length = 0
+    while length < size:
+        word = rng.choice(words)
+        separator = '\n' if rng.random() < 0.08 else ' '
+        parts.append(word)
+        parts.append(separator)
+        length += len(word) + 1
+    return ''.join(parts)
+
+
+def main():
+    """
+    Time both splitters on each kind of text and print one line per kind.
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the Telegram message chunker.')
+    parser.add_argument('--size-mb', type=float, default=4.0, help='text size in millions of characters')
+    parser.add_argument('--repeat', type=int, default=3, help='timing repetitions, the best is reported')
+    args = parser.parse_args()
+
+    size = int(args.size_mb * 1_000_000)
+    for kind in WORDS:
+        text = make_text(kind, size)
+
+        chunks = list(_split_text_into_chunks(text, MAX_LENGTH))
+        assert ''.join(chunks) == text, 'chunks do not reassemble the text'
+        oversized = sum(1 for chunk in chunks if utf16_len(chunk) > MAX_LENGTH)
+        legacy_oversized = sum(1 for chunk in legacy_split(text, MAX_LENGTH) if utf16_len(chunk) > MAX_LENGTH)
+
+        new_time = min(timeit.repeat(lambda text=text: list(_split_text_into_chunks(text, MAX_LENGTH)),
+                                     number=1, repeat=args.repeat))
+        legacy_time = min(timeit.repeat(lambda text=text: legacy_split(text, MAX_LENGTH),
+                                        number=1, repeat=args.repeat))
+
+        print(f'{kind:<9} {len(text):>10} chars  {len(chunks):>6} chunks  '
+              f'new {new_time * 1000:>8.1f} ms  legacy {legacy_time * 1000:>8.1f} ms  '
+              f'over limit: new {oversized}, legacy {legacy_oversized}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+Startup-time benchmark.
+
+Imports each module in a fresh interpreter with `python -X importtime` and
+records its cumulative import time. Results are written as JSON; when a
+baseline file is given, the run fails if any module got slower than the
+allowed regression.
+
+Usage:
+    python benchmarks/startup.py
+    python benchmarks/startup.py --output baseline.json
+    python benchmarks/startup.py --baseline baseline.json --max-regression 25
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = (
+    'consts',
+    'localization',
+    'ocr_engine',
+    'reader',
+    'ocr_pool',
+    'utils',
+    'handlers',
+    'bot',
+    # Format backends, for reference: these must not show up in the modules above
+    'fitz',
+    'docx',
+    'PIL.Image',
+    'pytesseract',
+)
+HEAVY_BACKENDS = ('fitz', 'docx', 'PIL', 'pytesseract')
+
+_IMPORTTIME_LINE = re.compile(r'import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def measure_import(module: str) -> tuple:
+    """
+    Import a module in a fresh interpreter.
+
+    :param module: Module name
+    :return: Tuple (cumulative import time in ms, set of top-level modules imported)
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT_DIR, capture_output=True, text=True, check=True
+    )
+    cumulative_us = 0
+    imported = set()
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        imported.add(match.group(4).split('.')[0])
+        if match.group(4) == module:
+            cumulative_us = int(match.group(2))
+    return cumulative_us / 1000, imported
+
+
+def run_benchmark(repeat: int) -> dict:
+    """
+    Measure every module in MODULES.
+
+    :param repeat: Number of fresh interpreters per module; the median is kept
+    :return: Dictionary of module name to results
+    """
+    results = {}
+    for module in MODULES:
+        timings = []
+        imported = set()
+        for _ in range(repeat):
+            elapsed_ms, imported = measure_import(module)
+            timings.append(elapsed_ms)
+        results[module] = {
+            'import_ms': round(statistics.median(timings), 2),
+            'heavy_backends': sorted(name for name in HEAVY_BACKENDS if name in imported),
+        }
+    return results
+
+
+def compare_with_baseline(results: dict, baseline: dict, max_regression: float) -> list:
+    """
+    :param results: Results of this run from run_benchmark()
+    :param baseline: Results of a previous run, loaded from JSON
+    :param max_regression: Allowed import time increase in percent
+    :return: List of human-readable regressions
+    """
+    regressions = []
+    for module, current in results.items():
+        previous = baseline.get(module)
+        if not previous or not previous['import_ms']:
+            continue
+        change = (current['import_ms'] - previous['import_ms']) / previous['import_ms'] * 100
+        if change > max_regression:
+            regressions.append(
+                f"{module}: {previous['import_ms']:.1f} ms -> {current['import_ms']:.1f} ms (+{change:.0f}%)"
+            )
+        new_backends = set(current['heavy_backends']) - set(previous['heavy_backends'])
+        if new_backends:
+            regressions.append(f"{module}: now imports {', '.join(sorted(new_backends))} at load time")
+    return regressions
+
+
+def main():
+    """
+    Run the benchmark from the command line, print the results and optionally save them.
+
+    Exits with status 1 if a baseline is given and any module regressed against it.
+    """
+    parser = argparse.ArgumentParser(description='Measure module import times.')
+    parser.add_argument('--repeat', type=int, default=5, help='fresh interpreters per module')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--baseline', help='JSON results of a previous run to compare against')
+    parser.add_argument('--max-regression', type=float, default=25.0, help='allowed slowdown in percent')
+    args = parser.parse_args()
+
+    results = run_benchmark(args.repeat)
+    for module, result in results.items():
+        backends = ', '.join(result['heavy_backends']) or '-'
+        print(f"{module:<14} {result['import_ms']:>9.1f} ms   backends: {backends}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.max_regression)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -9,7 +9,7 @@ Bot Flow:
 ---------
 1. /start → Interface language selection
 2. OCR language selection
-3. File upload
+3. File upload (documents, photos or albums)
 4. Delivery method choice (message or file)
 5. OCR processing and result delivery
 
@@ -18,20 +18,126 @@ For utility functions, see the utils/ package.
 """
 import os
 import sys
+import signal
+import asyncio
+import logging
 
 from dotenv import load_dotenv
-from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, filters
+from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, CallbackQueryHandler, filters
 from telegram.error import TelegramError
 
-from localization import TRANSLATIONS
-from utils import setup_logger, create_translation_filter, create_multi_key_filter
-from handlers import start, handle_info, handle_text_delivery_choice, handle_menu_navigation, handle_files
+from consts import (API_ENABLED, HEALTH_ENABLED, DEFAULT_INTERFACE_LANG, VIEWER_CALLBACK_PREFIX, MAX_SIZE,
+                    LOCAL_MAX_SIZE, BOT_API_MAX_DOWNLOAD)
+from lifecycle import Lifecycle, start_health_server
+from localization import TRANSLATIONS, get_text
+from metrics import TIMINGS
+from ocr_pool import OcrWorkerPool
+from utils import setup_logger, create_translation_filter, create_multi_key_filter, PAGE_RANGE
+from handlers import (start, handle_info, handle_text_delivery_choice, handle_menu_navigation, handle_files,
+                      handle_photo, handle_page_range, handle_next_pages, handle_viewer_callback, discard_user_files,
+                      discard_continuation)
+
+logger = logging.getLogger(__name__)
+
+
+async def _drain_and_stop(app):
+    """Drain in-flight OCR jobs, tell users of interrupted ones to resend, then stop polling."""
+    interrupted = await app.bot_data['lifecycle'].drain()
+    for job in interrupted:
+        if job.chat_id is None:
+            # HTTP API requests are told in their response stream
+            continue
+        lang = app.user_data.get(job.user_id, {}).get('interface_lang', DEFAULT_INTERFACE_LANG)
+        try:
+            await app.bot.send_message(job.chat_id, get_text(lang, 'job_interrupted'))
+        except TelegramError as e:
+            logger.warning('Could not notify user %s about interrupted job: %s', job.user_id, e)
+    app.stop_running()
+
+
+def _on_stop_signal(app, signum: int):
+    """Start draining on the first stop signal, interrupt in-flight jobs at once on the next ones."""
+    lifecycle = app.bot_data['lifecycle']
+    name = signal.Signals(signum).name
+    if lifecycle.draining:
+        # The running drain sees the jobs finish and notifies their users
+        logger.warning('Received %s while draining, interrupting in-flight jobs', name)
+        lifecycle.interrupt()
+    else:
+        logger.info('Received %s, shutting down gracefully', name)
+        app.create_task(_drain_and_stop(app))
+
+
+def _install_signal_handlers(app):
+    """Handle SIGTERM and SIGINT by draining instead of stopping polling at once."""
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(signum, _on_stop_signal, app, signum)
+        except NotImplementedError:
+            # Windows: Ctrl+C still stops the bot, without draining
+            logger.warning('Signal handlers are not supported, shutdown will not drain jobs')
+            return
+
+
+async def _start_ocr_pool(app):
+    """Start the OCR worker pool, the HTTP API and health checks sharing it, once the application is initialized."""
+    pool = OcrWorkerPool()
+    pool.start()
+    app.bot_data['ocr_pool'] = pool
+    lifecycle = Lifecycle()
+    app.bot_data['lifecycle'] = lifecycle
+
+    if API_ENABLED:
+        from api import start_api_server  # pylint: disable=import-outside-toplevel
+        app.bot_data['api_runner'] = await start_api_server(pool, lifecycle=lifecycle)
+
+    if HEALTH_ENABLED:
+        app.bot_data['health_runner'] = await start_health_server(lambda: app.bot_data.get('ocr_pool'), lifecycle)
+
+    _install_signal_handlers(app)
+
+
+async def _stop_ocr_pool(app):
+    """Stop the HTTP servers and the OCR worker pool on application shutdown."""
+    for key in ('api_runner', 'health_runner'):
+        runner = app.bot_data.pop(key, None)
+        if runner:
+            await runner.cleanup()
+
+    # Uploads waiting for a delivery choice or for their next pages will not be processed after a restart
+    for user_data in app.user_data.values():
+        discard_user_files(user_data)
+        discard_continuation(user_data)
+
+    lifecycle = app.bot_data.get('lifecycle')
+    pool = app.bot_data.pop('ocr_pool', None)
+    if pool:
+        pool.shutdown(wait=not (lifecycle and lifecycle.interrupted))
+    TIMINGS.log_summary()
+
+
+def _max_upload_size(local_mode: bool) -> int:
+    """Upload limit from MAX_FILE_SIZE_MB, or the default for the Bot API mode."""
+    value = os.getenv('MAX_FILE_SIZE_MB')
+    if not value:
+        return LOCAL_MAX_SIZE if local_mode else MAX_SIZE
+    try:
+        max_size = int(value) * 1024 * 1024
+    except ValueError:
+        logger.critical('MAX_FILE_SIZE_MB must be a whole number of megabytes, got %r', value)
+        sys.exit(1)
+    if max_size > BOT_API_MAX_DOWNLOAD and not local_mode:
+        logger.warning('MAX_FILE_SIZE_MB is above the %d MB the cloud Bot API serves, larger uploads will fail '
+                       'to download; set BOT_API_LOCAL with a local Bot API server',
+                       BOT_API_MAX_DOWNLOAD // (1024 * 1024))
+    return max_size
 
 
 def main():
     """Initialize and run the bot."""
     # Setup logging
-    logger = setup_logger()
+    setup_logger()
 
     # Load environment variables
     load_dotenv()
@@ -47,7 +153,30 @@ def main():
 
     try:
         # Build application with concurrent updates for parallel processing
-        app = ApplicationBuilder().token(token).concurrent_updates(True).build()
+        builder = (
+            ApplicationBuilder()
+            .token(token)
+            .concurrent_updates(True)
+            .post_init(_start_ocr_pool)
+            .post_shutdown(_stop_ocr_pool)
+        )
+
+        # Optional alternative Bot API endpoint, e.g. a local Bot API server or the load-testing fake server
+        base_url = os.getenv('BOT_API_BASE_URL')
+        local_mode = bool(base_url) and os.getenv('BOT_API_LOCAL', '').lower() in ('1', 'true', 'yes')
+        if base_url:
+            builder.base_url(base_url)
+            builder.base_file_url(os.getenv('BOT_API_FILE_URL', base_url.replace('/bot', '/file/bot')))
+            # A local server (telegram-bot-api --local) hands out absolute paths on its disk instead of file URLs
+            builder.local_mode(local_mode)
+            logger.info('Using Bot API endpoint: %s%s', base_url, ' in local mode' if local_mode else '')
+        elif os.getenv('BOT_API_LOCAL'):
+            logger.warning('BOT_API_LOCAL needs BOT_API_BASE_URL of the local Bot API server, ignoring it')
+
+        app = builder.build()
+        app.bot_data['local_mode'] = local_mode
+        app.bot_data['max_size'] = _max_upload_size(local_mode)
+        logger.info('Maximum upload size: %d MB', app.bot_data['max_size'] // (1024 * 1024))
 
         # Register handlers
         app.add_handler(CommandHandler('start', start))
@@ -59,6 +188,14 @@ def main():
             filters.TEXT & create_multi_key_filter('btn_message', 'btn_text_file'),
             handle_text_delivery_choice
         ))
+        app.add_handler(MessageHandler(
+            filters.TEXT & create_translation_filter('btn_next_pages'),
+            handle_next_pages
+        ))
+        app.add_handler(MessageHandler(
+            filters.TEXT & filters.Regex(PAGE_RANGE),
+            handle_page_range
+        ))
         app.add_handler(MessageHandler(
             filters.TEXT & ~filters.COMMAND,
             handle_menu_navigation
@@ -67,9 +204,18 @@ def main():
             filters.Document.ALL,
             handle_files
         ))
+        app.add_handler(MessageHandler(
+            filters.PHOTO,
+            handle_photo
+        ))
+        app.add_handler(CallbackQueryHandler(
+            handle_viewer_callback,
+            pattern=f'^{VIEWER_CALLBACK_PREFIX}:'
+        ))
 
         logger.info('Bot handlers registered successfully. Starting polling...')
-        app.run_polling()
+        # Stop signals are handled by _install_signal_handlers, which drains jobs first
+        app.run_polling(stop_signals=None)
 
     except TelegramError as e:
         logger.critical('Telegram API error: %s', e, exc_info=True)
@@ -1,9 +1,117 @@
 ALLOWED_FORMATS = ('pdf', 'docx', 'doc', 'png', 'jpg', 'jpeg', 'tiff', 'bmp', 'gif')
-MAX_SIZE = 10 * 1024 * 1024
+MAX_SIZE = 10 * 1024 * 1024  # Upload limit, MAX_FILE_SIZE_MB in the environment overrides it
+LOCAL_MAX_SIZE = 2000 * 1024 * 1024  # Upload limit with a local Bot API server (BOT_API_LOCAL)
+BOT_API_MAX_DOWNLOAD = 20 * 1024 * 1024  # Largest file the cloud Bot API lets bots download
+
+# ZIP uploads: files in ZIP_MEMBER_FORMATS are extracted and recognized as one bundled result
+ZIP_FORMAT = 'zip'
+ZIP_MEMBER_FORMATS = tuple(fmt for fmt in ALLOWED_FORMATS if fmt != 'doc')  # Formats the reader can recognize
+ZIP_MAX_ENTRIES = 100  # Supported files per archive
+ZIP_MAX_MEMBERS = 1000  # Entries of any kind per archive
+ZIP_MAX_UNCOMPRESSED = 200 * 1024 * 1024  # Bytes the supported files may decompress to
 DEFAULT_INTERFACE_LANG = 'uk'
 TELEGRAM_MAX_MESSAGE_LENGTH = 4096
 HEADER_RESERVE = 25
 
+# Paginated result viewer for message delivery
+RESULT_VIEWER = True  # Show results longer than one message as pages of a single message
+VIEWER_CALLBACK_PREFIX = 'view'
+VIEWER_MAX_RESULTS = 500  # Results kept for page navigation, least recently viewed are evicted first
+VIEWER_MAX_CHARS = 20_000_000  # Total characters of the kept results
+VIEWER_TTL = 24 * 60 * 60  # Seconds a result can be navigated after delivery
+
+# Photo message settings
+PHOTO_TARGET_SIDE = 1280  # Smallest photo variant whose longer side reaches this is downloaded for OCR
+MEDIA_GROUP_DELAY = 1.0  # Seconds without a new album item before the album is treated as complete
+
+# PDF page range settings
+PDF_DEFAULT_PAGES = 10  # Pages of a PDF recognized per job when the user gave no range
+PDF_MAX_PAGES = 50  # Longest page range recognized per job, the rest is offered as next pages
+PAGE_RANGE_PATTERN = r'^\s*(?:pages?|сторінк[аи]|стор\.?)\s*:?\s*(\d+)\s*(?:[-–—]\s*(\d+))?\s*$'
+
+# OCR worker pool settings
+OCR_WORKERS = None  # None means one worker per available CPU, following the cgroup CPU quota
+OCR_THREADS_MAX = 4  # OpenMP threads (OMP_THREAD_LIMIT) of a Tesseract run while the pool is mostly idle
+OCR_PREWARM_LANGS = ('ukr', 'eng')  # Models read into the OS page cache when the pool starts
+TESSDATA_DIR = None  # None means TESSDATA_PREFIX or the system default
+OCR_PRELOAD_BACKENDS = True  # Import format backends when a worker starts instead of on first job
+OCR_SPECULATIVE = True  # Start OCR when a file is uploaded, before the delivery choice
+OCR_SPECULATIVE_SLOTS = None  # Workers speculative jobs may occupy at once, None means half of the pool
+OCR_CRASH_RETRIES = 1  # Times a job is retried on a new worker process after its worker died
+
+# OCR profiles: model set, OCR engine mode and page segmentation mode passed to Tesseract.
+# None keeps Tesseract's default; model sets are installed side by side (see Dockerfile).
+TESSDATA_FAST_DIR = '/usr/share/tessdata_fast'
+TESSDATA_BEST_DIR = '/usr/share/tessdata_best'
+OCR_PROFILES = {
+    'standard': {'tessdata_dir': None, 'oem': None, 'psm': None},
+    'fast': {'tessdata_dir': TESSDATA_FAST_DIR, 'oem': 1, 'psm': 6},  # LSTM only, single text block
+    'accurate': {'tessdata_dir': TESSDATA_BEST_DIR, 'oem': 1, 'psm': 3},
+    # Fast first pass, low-confidence text blocks re-run with these models and page segmentation mode
+    'adaptive': {'tessdata_dir': TESSDATA_FAST_DIR, 'oem': 1, 'psm': 3, 'rerun_profile': 'accurate', 'rerun_psm': 6},
+}
+DEFAULT_OCR_PROFILE = 'standard'
+ADAPTIVE_MIN_CONFIDENCE = 70  # Blocks with a lower mean word confidence are re-run
+ADAPTIVE_MAX_RERUNS = 12  # Block re-runs per job, caps the extra compute
+ADAPTIVE_RERUN_PADDING = 8  # Pixels added around a block before it is re-run
+ADAPTIVE_MIN_TEXT_HEIGHT = 24  # Blocks with smaller median word height are upscaled for the re-run
+ADAPTIVE_MAX_UPSCALE = 4
+METRICS_WINDOW = 1000  # Latest samples kept per timing metric
+
+# Memory settings
+OCR_MEMORY_BUDGET_MB = 1536  # RSS budget per OCR worker, None disables it
+OCR_THROTTLE_INTERVAL = 0.2  # Seconds between dispatch attempts while every worker is over budget
+PDF_TARGET_DPI = 300  # Resolution embedded PDF images are decoded at when the format allows it
+PDF_DRAFT_DECODING = True
+
+# Images Tesseract reads itself: files are passed by path and embedded PDF images through stdin,
+# instead of being decoded and re-encoded to a temporary file first
+OCR_DIRECT_INPUT = True
+DIRECT_INPUT_FORMATS = ('PNG', 'JPEG', 'TIFF', 'BMP')  # PIL format names
+DIRECT_INPUT_MODES = ('1', 'L', 'P', 'RGB')  # Transparency and CMYK are converted by PIL as before
+
+# Small embedded PDF/DOCX images of one document share a Tesseract run (file list input)
+# instead of paying a process launch and model load each
+OCR_BATCHING = True
+OCR_BATCH_MAX_PIXELS = 1_000_000  # Images with at most this many pixels are batched
+OCR_BATCH_SIZE = 16  # Images per Tesseract run
+
+# Tiling settings for very tall or very large images
+TILING_ENABLED = True
+TILE_MIN_HEIGHT = 6000  # Images taller than this are OCR'd in strips
+TILE_MIN_PIXELS = 40_000_000  # So are images with more pixels than this
+TILE_HEIGHT = 2000  # Target strip height in pixels
+TILE_OVERLAP = 40  # Rows shared by neighbouring strips
+TILE_SEARCH_WINDOW = 400  # How far from the target height to look for a blank row
+TILE_GAP_THRESHOLD = 2  # Maximum mean edge energy of a blank row
+TILE_PROFILE_WIDTH = 512  # Width the image is narrowed to before building the row profile
+TILE_MAX_OVERLAP_LINES = 3  # Lines compared when removing overlap duplicates
+TILE_MAX_WORKERS = 4  # Strips OCR'd in parallel
+
+# Triage of embedded PDF/DOCX images before OCR
+TRIAGE_ENABLED = True
+TRIAGE_SIDE = 512  # Longer side images are reduced to before measuring
+TRIAGE_MIN_STDDEV = 1.0  # Grayscale standard deviation below which an image is blank
+TRIAGE_INK_CONTRAST = 40  # Difference from the background level that counts a pixel as ink
+TRIAGE_MIN_INK_PIXELS = 16  # Fewer ink pixels in the reduced image mean a blank image
+TRIAGE_EDGE_THRESHOLD = 48  # Edge filter response that counts a pixel as an edge
+TRIAGE_MIN_EDGE_RATIO = 0.1  # Edge to ink pixel ratio below which ink is gradients or solid shapes, not text
+
+# Local HTTP OCR API settings
+API_ENABLED = False  # Serve the API from the bot process, sharing its worker pool
+API_HOST = '127.0.0.1'
+API_PORT = 8080
+API_MAX_UPLOAD_SIZE = 200 * 1024 * 1024
+API_READ_CHUNK = 256 * 1024
+API_PAGE_BATCH = 4  # PDF pages per worker job
+API_MAX_PAGE_JOBS = 2  # Page batches recognized ahead of the client
+
+# Shutdown and health check settings
+SHUTDOWN_DEADLINE = 60  # Seconds in-flight OCR jobs get to finish after SIGTERM before they are interrupted
+HEALTH_ENABLED = True  # Serve /livez and /readyz
+HEALTH_HOST = '0.0.0.0'
+HEALTH_PORT = 8090
+
 # Logging settings
 LOG_DIR_NAME = 'logs'
 LOG_FILE_NAME = 'bot.log'
@@ -12,6 +120,7 @@ LOG_LEVEL = 'INFO'
 LOG_MAX_BYTES = 5 * 1024 * 1024
 LOG_BACKUP_COUNT = 5
 LOG_ENCODING = 'utf-8'
+LOG_JSON = False  # Write the log file as JSON lines with job_id, user_id, stage and duration fields
 
 REQUIRED_LANGUAGES = ['uk', 'en']
 REQUIRED_KEYS = [
@@ -23,5 +132,10 @@ REQUIRED_KEYS = [
     'choose_multiple_languages', 'please_choose_alphabet', 'not_document', 'file_too_large',
     'unsupported_format', 'file_uploaded', 'please_upload_file', 'please_choose_delivery',
     'file_header', 'no_text_found', 'message_part', 'file_read_error',
-    'processing_started', 'processing_error', 'no_text_extracted', 'ocr_languages'
+    'processing_started', 'processing_error', 'no_text_extracted', 'ocr_languages',
+    'btn_ocr_profile', 'btn_profile_standard', 'btn_profile_fast', 'btn_profile_accurate',
+    'btn_profile_adaptive', 'choose_ocr_profile', 'ocr_profile_selected', 'bot_restarting', 'job_interrupted',
+    'btn_next_pages', 'page_range_set', 'invalid_page_range', 'pages_remaining', 'no_pages_to_continue',
+    'btn_download_all', 'results_expired', 'zip_received', 'zip_invalid', 'zip_no_files', 'zip_too_many_files',
+    'zip_too_large'
 ]
@@ -3,8 +3,9 @@ Handlers package for OCR Telegram Bot.
 """
 from .start import start, handle_interface_language_choice
 from .menu import handle_menu_navigation, handle_info
-from .files import handle_files
-from .delivery import handle_text_delivery_choice
+from .files import handle_files, handle_photo, handle_page_range
+from .viewer import handle_viewer_callback
+from .delivery import handle_text_delivery_choice, handle_next_pages, discard_user_files, discard_continuation
 
 __all__ = [
     'start',
@@ -12,5 +13,11 @@ __all__ = [
     'handle_menu_navigation',
     'handle_info',
     'handle_files',
+    'handle_photo',
+    'handle_page_range',
     'handle_text_delivery_choice',
+    'handle_next_pages',
+    'handle_viewer_callback',
+    'discard_user_files',
+    'discard_continuation',
 ]
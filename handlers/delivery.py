@@ -2,6 +2,8 @@
 Text delivery handlers and OCR processing.
 """
 import os
+import time
+import uuid
 import shutil
 import logging
 import asyncio
@@ -12,59 +14,101 @@ from telegram.constants import ChatAction
 from telegram.error import TelegramError
 from telegram.ext import ContextTypes
 
-from consts import TELEGRAM_MAX_MESSAGE_LENGTH, HEADER_RESERVE
+from consts import TELEGRAM_MAX_MESSAGE_LENGTH, HEADER_RESERVE, DEFAULT_OCR_PROFILE, RESULT_VIEWER
 from localization import get_text
-from reader import process_input_files, save_texts_to_files
-from utils.keyboards import get_user_lang, get_main_keyboard
+from ocr_result import DocumentResult
+from reader import save_texts_to_files
+from utils.keyboards import get_user_lang, get_main_keyboard, get_next_pages_keyboard
+from utils.helpers import utf16_len, is_draining
+from utils.logger import stage_fields
+from .speculative import collect_ocr_results, cancel_speculative_ocr, requested_pages, result_names
+from .viewer import send_result_viewer
 
 logger = logging.getLogger(__name__)
 
 
-def _split_text_into_chunks(text: str, max_length: int = TELEGRAM_MAX_MESSAGE_LENGTH) -> list:
+def _utf16_units(text: str, start: int, end: int) -> int:
     """
-    Split text into chunks that fit within Telegram's message size limit.
-    Tries to split at newlines or spaces to avoid breaking words.
+    Length of text[start:end] in UTF-16 code units.
+    """
+    return len(text[start:end].encode('utf-16-le')) // 2
 
-    :param text: Text to split
-    :param max_length: Maximum length of each chunk
-    :return: List of text chunks
+
+def _iter_chunk_bounds(text: str, max_length: int = TELEGRAM_MAX_MESSAGE_LENGTH):
     """
-    if len(text) <= max_length:
-        return [text]
+    Yield (start, end) indexes of chunks that fit within Telegram's message size limit.
+
+    Length is measured in UTF-16 code units, as Telegram counts it. Tries to split
+    at newlines or spaces in the second half of a chunk to avoid breaking words.
+    Runs in linear time: only windows of at most max_length characters are ever
+    measured, the remaining text is never copied.
 
-    chunks = []
-    while text:
-        if len(text) <= max_length:
-            chunks.append(text)
-            break
+    :param text: Text to split
+    :param max_length: Maximum length of each chunk in UTF-16 code units
+    :return: Generator of (start, end) index pairs
+    """
+    text_length = len(text)
+    is_ascii = text.isascii()
+    start = 0
+    while start < text_length:
+        end = min(text_length, start + max_length)
+
+        # Characters outside the BMP take two code units: shrink to the largest end that fits
+        excess = 0 if is_ascii else _utf16_units(text, start, end) - max_length
+        if excess > 0:
+            # Dropping n characters removes between n and 2n code units
+            low, high = max(start + 1, end - excess), end - (excess + 1) // 2
+            while low < high:
+                middle = (low + high + 1) // 2
+                if _utf16_units(text, start, middle) <= max_length:
+                    low = middle
+                else:
+                    high = middle - 1
+            end = low
+
+        if end == text_length:
+            yield start, end
+            return
 
-        split_point = max_length
+        split_point = end
+        half = (end - start) // 2
 
-        newline_pos = text.rfind('\n', 0, max_length)
-        if newline_pos > max_length // 2:
+        newline_pos = text.rfind('\n', start, end)
+        if newline_pos - start > half:
             split_point = newline_pos + 1
         else:
-            space_pos = text.rfind(' ', 0, max_length)
-            if space_pos > max_length // 2:
+            space_pos = text.rfind(' ', start, end)
+            if space_pos - start > half:
                 split_point = space_pos + 1
 
-        chunks.append(text[:split_point])
-        text = text[split_point:]
+        yield start, split_point
+        start = split_point
+
+
+def _split_text_into_chunks(text: str, max_length: int = TELEGRAM_MAX_MESSAGE_LENGTH):
+    """
+    Split text into chunks that fit within Telegram's message size limit.
 
-    return chunks
+    :param text: Text to split
+    :param max_length: Maximum length of each chunk in UTF-16 code units
+    :return: Generator of text chunks
+    """
+    for start, end in _iter_chunk_bounds(text, max_length):
+        yield text[start:end]
 
 
 async def _send_as_messages(update: Update, texts_dict: dict, lang: str):
     """
     Send OCR results as text messages.
-    Uses texts_dict directly without reading from files.
-    Handles Telegram's 4096 character limit by splitting long texts.
+    Renders plain text from the results without reading from files.
+    Handles Telegram's 4096 UTF-16 code unit limit by splitting long texts.
 
     :param update: Update object
-    :param texts_dict: Dictionary with file names and extracted text
+    :param texts_dict: Dictionary with file names and DocumentResult objects
     :param lang: User's interface language
     """
-    for file_name, text in texts_dict.items():
+    for file_name, result in texts_dict.items():
+        text = result.text
         await update.message.reply_text(
             get_text(lang, 'file_header', filename=file_name)
         )
@@ -74,17 +118,38 @@ async def _send_as_messages(update: Update, texts_dict: dict, lang: str):
             continue
 
         # Check if text needs splitting
-        if len(text) <= TELEGRAM_MAX_MESSAGE_LENGTH:
+        if utf16_len(text) <= TELEGRAM_MAX_MESSAGE_LENGTH:
             await update.message.reply_text(text)
             continue
 
         # For multipart messages, reserve space for header
         effective_max_length = TELEGRAM_MAX_MESSAGE_LENGTH - HEADER_RESERVE
-        chunks = _split_text_into_chunks(text, effective_max_length)
+        bounds = list(_iter_chunk_bounds(text, effective_max_length))
+
+        for i, (start, end) in enumerate(bounds):
+            part_header = get_text(lang, 'message_part', current=i + 1, total=len(bounds))
+            await update.message.reply_text(f"{part_header}\n{text[start:end]}")
+
+
+def _paginate(texts_dict: dict, lang: str) -> list:
+    """
+    Split OCR results into viewer pages that fit in one message with their headers.
 
-        for i, chunk in enumerate(chunks):
-            part_header = get_text(lang, 'message_part', current=i + 1, total=len(chunks))
-            await update.message.reply_text(f"{part_header}\n{chunk}")
+    :param texts_dict: Dictionary with file names and DocumentResult objects
+    :param lang: User's interface language
+    :return: List of (file name, start, end, part, parts) tuples, one page for a file without text
+    """
+    pages = []
+    for file_name, result in texts_dict.items():
+        text = result.text
+        if not text.strip():
+            pages.append((file_name, 0, 0, 1, 1))
+            continue
+        header = get_text(lang, 'file_header', filename=file_name)
+        max_length = TELEGRAM_MAX_MESSAGE_LENGTH - HEADER_RESERVE - utf16_len(header) - 1
+        bounds = list(_iter_chunk_bounds(text, max_length))
+        pages.extend((file_name, start, end, part, len(bounds)) for part, (start, end) in enumerate(bounds, start=1))
+    return pages
 
 
 async def _send_as_files(
@@ -99,7 +164,7 @@ async def _send_as_files(
 
     :param update: Update object
     :param context: Context object
-    :param texts_dict: Dictionary with file names and extracted text
+    :param texts_dict: Dictionary with file names and DocumentResult objects
     :param output_dir: Directory where text files are saved
     :param lang: User's interface language
     """
@@ -119,35 +184,176 @@ async def _send_as_files(
             )
 
 
+def discard_user_files(user_data: dict):
+    """
+    Remove a user's uploaded files and pending job state.
+
+    :param user_data: The user's user_data
+    """
+    for job in user_data.pop('speculative_jobs', {}).values():
+        job.cancel()
+
+    temp_dir = user_data.get('temp_dir')
+    if temp_dir and os.path.exists(temp_dir):
+        shutil.rmtree(temp_dir)
+
+    user_data.pop('temp_dir', None)
+    user_data.pop('file_paths', None)
+    user_data.pop('page_ranges', None)
+    user_data.pop('archives', None)
+    user_data.pop('delivery_choice', None)
+    user_data.pop('awaiting_delivery_choice', None)
+
+
+def _bundle_archives(archives: dict, texts_dict: dict, names: dict) -> dict:
+    """
+    Replace the results of each uploaded archive's files with one result named after the archive.
+
+    :param archives: Dictionary of archive names and paths of their extracted files
+    :param texts_dict: Dictionary with result names and DocumentResult objects
+    :param names: Dictionary of the job's file paths and result names (see result_names)
+    :return: Dictionary with result and archive names and DocumentResult objects, in upload order
+    """
+    if not archives:
+        return texts_dict
+    members = {names[path]: name for name, paths in archives.items() for path in paths if path in names}
+    bundled = {}
+    for file_name, result in texts_dict.items():
+        archive_name = members.get(file_name)
+        if archive_name is None:
+            bundled[file_name] = result
+        elif archive_name not in bundled:
+            member_names = [names[path] for path in archives[archive_name] if path in names]
+            bundled[archive_name] = DocumentResult.bundle(archive_name, [texts_dict[name] for name in member_names
+                                                                         if name in texts_dict])
+    return bundled
+
+
+def discard_continuation(user_data: dict):
+    """
+    Remove the PDF files kept for recognizing their next pages.
+
+    :param user_data: The user's user_data
+    """
+    continuation = user_data.pop('continuation', None)
+    if continuation and os.path.exists(continuation['dir']):
+        shutil.rmtree(continuation['dir'])
+
+
+def _keep_for_continuation(context: ContextTypes.DEFAULT_TYPE, user_id: int, texts_dict: dict,
+                           file_paths: list) -> list:
+    """
+    Keep PDFs with pages left after this job, so their next pages can be recognized without a new upload.
+
+    The files are moved out of the job's temp directory, which is removed when the job ends.
+
+    :param context: Context object
+    :param user_id: Telegram user ID
+    :param texts_dict: Dictionary with result names and DocumentResult objects of the job
+    :param file_paths: Paths of the job's files
+    :return: List of (result name, processed page range, page count) of the kept files
+    """
+    discard_continuation(context.user_data)
+    kept = []
+    next_pages = {}
+    continue_dir = None
+    for file_path, name in result_names(file_paths).items():
+        result = texts_dict.get(name)
+        processed = requested_pages(context, file_path)
+        if result is None or processed is None or result.page_count is None or processed.stop >= result.page_count:
+            continue
+        if continue_dir is None:
+            continue_dir = tempfile.mkdtemp(prefix=f'ocr_bot_{user_id}_next_')
+        kept_path = os.path.join(continue_dir, name)
+        os.replace(file_path, kept_path)
+        # Next range of the same length
+        next_pages[kept_path] = range(processed.stop, min(result.page_count, processed.stop + len(processed)))
+        kept.append((name, range(processed.start, min(processed.stop, result.page_count)), result.page_count))
+
+    if kept:
+        context.user_data['continuation'] = {
+            'dir': continue_dir,
+            'pages': next_pages,
+            'delivery': context.user_data.get('delivery_choice', 'message'),
+        }
+    return kept
+
+
 def _cleanup_user_files(context: ContextTypes.DEFAULT_TYPE):
     """
     Clean up temporary files for user.
 
     :param context: Context object
     """
-    temp_dir = context.user_data.get('temp_dir')
-    if temp_dir and os.path.exists(temp_dir):
-        shutil.rmtree(temp_dir)
+    cancel_speculative_ocr(context)
+    discard_user_files(context.user_data)
+
+
+async def _deliver_results(update: Update, context: ContextTypes.DEFAULT_TYPE, job_id: str, texts_dict: dict,
+                           lang: str):
+    """
+    Send the results the way the user chose: as messages, in the result viewer or as files.
+
+    :param update: Update object
+    :param context: Context object
+    :param job_id: Job identifier
+    :param texts_dict: Dictionary with result names and DocumentResult objects
+    :param lang: Interface language code
+    """
+    user_id = update.effective_user.id
+    delivery_choice = context.user_data.get('delivery_choice', 'message')
+    started = time.perf_counter()
+    pages = _paginate(texts_dict, lang) if RESULT_VIEWER and delivery_choice == 'message' else []
+    if len(pages) > 1:
+        logger.info('User %s sending results as %d viewer pages', user_id, len(pages))
+        texts = {file_name: result.text for file_name, result in texts_dict.items()}
+        await send_result_viewer(update, context, job_id, texts, pages)
+    elif delivery_choice == 'message':
+        logger.info('User %s sending results as messages', user_id)
+        await _send_as_messages(update, texts_dict, lang)
+    else:
+        with tempfile.TemporaryDirectory(prefix='ocr_output_') as output_dir:
+            await asyncio.to_thread(save_texts_to_files, texts_dict, output_dir)
+            logger.info('User %s sending results as files', user_id)
+            await _send_as_files(update, context, texts_dict, output_dir, lang)
+    logger.info('User %s results delivered as %s', user_id, delivery_choice,
+                extra=stage_fields('delivery', time.perf_counter() - started, job_id, user_id))
+
 
-    context.user_data.pop('temp_dir', None)
-    context.user_data.pop('file_paths', None)
-    context.user_data.pop('delivery_choice', None)
-    context.user_data.pop('awaiting_delivery_choice', None)
+async def _offer_next_pages(update: Update, context: ContextTypes.DEFAULT_TYPE, results: dict, file_paths: list,
+                            lang: str):
+    """
+    Keep the PDFs that have pages left and tell the user which pages the next job will recognize.
+
+    :param update: Update object
+    :param context: Context object
+    :param results: Dictionary with result names and DocumentResult objects of the job's files, before bundling
+    :param file_paths: Paths of the job's files
+    :param lang: Interface language code
+    """
+    user_id = update.effective_user.id
+    for file_name, pages, page_count in _keep_for_continuation(context, user_id, results, file_paths):
+        logger.info('User %s can continue %s after page %d of %d', user_id, file_name, pages.stop, page_count)
+        await update.message.reply_text(get_text(
+            lang, 'pages_remaining', filename=file_name, start=pages.start + 1, end=pages.stop, total=page_count,
+            button=get_text(lang, 'btn_next_pages')
+        ))
 
 
-async def _process_ocr_and_send(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def _process_ocr_and_send(update: Update, context: ContextTypes.DEFAULT_TYPE, job_id: str):
     """
     Process OCR on uploaded files and send results.
-    OCR processing runs in a separate thread to keep the bot responsive.
+    OCR processing runs in the worker pool to keep the bot responsive.
 
     :param update: Update object
     :param context: Context object
+    :param job_id: Job identifier
     """
     user_id = update.effective_user.id
     lang = get_user_lang(context)
     file_paths = context.user_data.get('file_paths', [])
     ocr_lang = context.user_data.get('ocr_lang_choice', 'ukr')
-    delivery_choice = context.user_data.get('delivery_choice', 'message')
+    ocr_profile = context.user_data.get('ocr_profile', DEFAULT_OCR_PROFILE)
 
     if not file_paths:
         logger.warning('User %s tried to process without uploading files', user_id)
@@ -164,27 +370,26 @@ async def _process_ocr_and_send(update: Update, context: ContextTypes.DEFAULT_TY
             action=ChatAction.TYPING
         )
 
-        logger.info('User %s started OCR processing with language: %s', user_id, ocr_lang)
+        logger.info('User %s started OCR processing with language: %s, profile: %s', user_id, ocr_lang, ocr_profile,
+                    extra=stage_fields('start', job_id=job_id, user_id=user_id))
 
-        # Run OCR in separate thread
-        texts_dict = await asyncio.to_thread(process_input_files, file_paths, ocr_lang)
+        # Reuse recognition started at upload time, run the rest on the worker pool
+        started = time.perf_counter()
+        results = await collect_ocr_results(context, file_paths, job_id, user_id)
+        texts_dict = _bundle_archives(context.user_data.get('archives'), results, result_names(file_paths))
 
-        logger.info('User %s OCR completed for %s file(s)', user_id, len(texts_dict))
+        logger.info('User %s OCR completed for %s file(s)', user_id, len(texts_dict),
+                    extra=stage_fields('ocr', time.perf_counter() - started, job_id, user_id))
 
-        # Validate results
-        if not texts_dict or all(not (text or '').strip() for text in texts_dict.values()):
+        # Validate results; PDFs with pages left are offered to continue even if these pages had no text
+        if not texts_dict or all(result.is_empty() for result in texts_dict.values()):
             logger.warning('User %s OCR produced no text', user_id)
             await update.message.reply_text(get_text(lang, 'no_text_extracted'))
-            return
-
-        if delivery_choice == 'message':
-            logger.info('User %s sending results as messages', user_id)
-            await _send_as_messages(update, texts_dict, lang)
         else:
-            with tempfile.TemporaryDirectory(prefix='ocr_output_') as output_dir:
-                await asyncio.to_thread(save_texts_to_files, texts_dict, output_dir)
-                logger.info('User %s sending results as files', user_id)
-                await _send_as_files(update, context, texts_dict, output_dir, lang)
+            await _deliver_results(update, context, job_id, texts_dict, lang)
+
+        # PDFs extracted from an archive can be continued too, so look them up before bundling
+        await _offer_next_pages(update, context, results, file_paths, lang)
 
     except TelegramError as e:
         logger.error('User %s Telegram error: %s', user_id, e, exc_info=True)
@@ -198,10 +403,24 @@ async def _process_ocr_and_send(update: Update, context: ContextTypes.DEFAULT_TY
     finally:
         _cleanup_user_files(context)
 
-    await update.message.reply_text(
-        get_text(lang, 'choose_alphabet'),
-        reply_markup=get_main_keyboard(context)
-    )
+    keyboard = get_next_pages_keyboard(context) if 'continuation' in context.user_data else get_main_keyboard(context)
+    await update.message.reply_text(get_text(lang, 'choose_alphabet'), reply_markup=keyboard)
+
+
+async def _run_job(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Run an OCR job for the pending files, tracked so a draining shutdown waits for it or interrupts it.
+
+    :param update: Update object
+    :param context: Context object
+    """
+    job_id = uuid.uuid4().hex[:12]
+    lifecycle = context.bot_data.get('lifecycle')
+    if lifecycle is None:
+        await _process_ocr_and_send(update, context, job_id)
+        return
+    with lifecycle.track(job_id, update.effective_user.id, update.effective_chat.id):
+        await _process_ocr_and_send(update, context, job_id)
 
 
 async def handle_text_delivery_choice(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -222,6 +441,10 @@ async def handle_text_delivery_choice(update: Update, context: ContextTypes.DEFA
         await update.message.reply_text(get_text(lang, 'please_upload_file'))
         return
 
+    if is_draining(context.bot_data):
+        await update.message.reply_text(get_text(lang, 'bot_restarting'))
+        return
+
     if choice == get_text(lang, 'btn_message'):
         context.user_data['delivery_choice'] = 'message'
         context.user_data['awaiting_delivery_choice'] = False
@@ -234,4 +457,34 @@ async def handle_text_delivery_choice(update: Update, context: ContextTypes.DEFA
         await update.message.reply_text(get_text(lang, 'please_choose_delivery'))
         return
 
-    await _process_ocr_and_send(update, context)
+    await _run_job(update, context)
+
+
+async def handle_next_pages(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Recognize the next pages of the PDFs kept after the previous job, delivered the same way.
+
+    :param update: Update object
+    :param context: Context object
+    """
+    user_id = update.effective_user.id
+    lang = get_user_lang(context)
+    continuation = context.user_data.get('continuation')
+
+    if not continuation or context.user_data.get('file_paths'):
+        await update.message.reply_text(get_text(lang, 'no_pages_to_continue'), reply_markup=get_main_keyboard(context))
+        return
+
+    if is_draining(context.bot_data):
+        await update.message.reply_text(get_text(lang, 'bot_restarting'))
+        return
+
+    # The kept files become the pending job, removed with its temp directory when it ends
+    del context.user_data['continuation']
+    context.user_data['temp_dir'] = continuation['dir']
+    context.user_data['file_paths'] = list(continuation['pages'])
+    context.user_data['page_ranges'] = continuation['pages']
+    context.user_data['delivery_choice'] = continuation['delivery']
+    logger.info('User %s continues with the next pages of %d file(s)', user_id, len(continuation['pages']))
+
+    await _run_job(update, context)
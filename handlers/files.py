@@ -2,20 +2,261 @@
 File upload handler.
 """
 import os
+import time
+import asyncio
 import logging
 import tempfile
 
 from telegram import Update
 from telegram.ext import ContextTypes
 
-from consts import ALLOWED_FORMATS, MAX_SIZE
+from consts import (ALLOWED_FORMATS, MAX_SIZE, PHOTO_TARGET_SIDE, MEDIA_GROUP_DELAY, ZIP_FORMAT, ZIP_MAX_ENTRIES,
+                    ZIP_MAX_UNCOMPRESSED)
 from localization import get_text
 from utils.keyboards import get_user_lang, get_text_delivery_keyboard
-from utils.helpers import sanitize_filename
+from utils.helpers import sanitize_filename, is_draining, parse_page_range, max_upload_size, format_megabytes
+from utils.archive import extract_archive, ArchiveError
+from utils.logger import stage_fields
+from .speculative import start_speculative_ocr, restart_speculative_ocr, cancel_speculative_ocr
+from .delivery import discard_continuation
 
 logger = logging.getLogger(__name__)
 
 
+def _choose_photo_size(photo_sizes, target_side: int = PHOTO_TARGET_SIDE, max_size: int = MAX_SIZE):
+    """
+    Choose the cheapest photo variant that is still large enough for OCR.
+
+    :param photo_sizes: PhotoSize variants of one photo
+    :param target_side: Minimum length of the longer side in pixels
+    :param max_size: Upload limit in bytes
+    :return: Smallest PhotoSize reaching target_side, or the largest one if none does
+    """
+    candidates = [p for p in photo_sizes if not p.file_size or p.file_size <= max_size] or list(photo_sizes)
+    candidates.sort(key=lambda p: p.width * p.height)
+    for photo in candidates:
+        if max(photo.width, photo.height) >= target_side:
+            return photo
+    return candidates[-1]
+
+
+def _reserve_download_path(context: ContextTypes.DEFAULT_TYPE, user_id: int, file_name: str) -> str:
+    """
+    Build a unique path for a download in the user's temp directory.
+
+    :param context: Context object
+    :param user_id: Telegram user ID
+    :param file_name: Original file name
+    :return: Path that does not exist yet
+    """
+    # Create temp directory if not exists
+    if 'temp_dir' not in context.user_data:
+        context.user_data['temp_dir'] = tempfile.mkdtemp(prefix=f'ocr_bot_{user_id}_')
+
+    temp_dir = context.user_data['temp_dir']
+
+    # Sanitize filename to prevent path traversal
+    safe_name = sanitize_filename(file_name)
+    download_path = os.path.join(temp_dir, safe_name)
+
+    # Ensure uniqueness if file with same name exists
+    base, ext_with_dot = os.path.splitext(safe_name)
+    counter = 1
+    while os.path.exists(download_path):
+        download_path = os.path.join(temp_dir, f"{base}_{counter}{ext_with_dot}")
+        counter += 1
+
+    # Claim the name right away, album items are downloaded concurrently
+    open(download_path, 'xb').close()  # pylint: disable=consider-using-with
+    return download_path
+
+
+async def _fetch_file(context: ContextTypes.DEFAULT_TYPE, file, download_path: str):
+    """
+    Put an uploaded file at its download path.
+
+    A local Bot API server keeps uploads on this machine's disk, so the file is
+    linked there instead of copied; otherwise it is downloaded over HTTP.
+
+    :param context: Context object
+    :param file: File returned by get_file()
+    :param download_path: Reserved path in the user's temp directory
+    """
+    local_path = file.file_path
+    if context.bot_data.get('local_mode') and os.path.isabs(local_path) and os.path.isfile(local_path):
+        link_path = f'{download_path}.link'
+        try:
+            os.symlink(local_path, link_path)
+            os.replace(link_path, download_path)
+            return
+        except OSError as e:
+            logger.warning('Could not link %s, copying it instead: %s', local_path, e)
+    await file.download_to_drive(custom_path=download_path)
+
+
+async def _send_delivery_prompt(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Ask the user how to deliver the recognized text.
+
+    :param update: Update object
+    :param context: Context object
+    """
+    context.user_data['awaiting_delivery_choice'] = True
+    await update.message.reply_text(
+        get_text(get_user_lang(context), 'file_uploaded'),
+        reply_markup=get_text_delivery_keyboard(context)
+    )
+
+
+async def _prompt_when_album_complete(update: Update, context: ContextTypes.DEFAULT_TYPE, group_id: str):
+    """
+    Show the delivery choice once no new album item arrived for MEDIA_GROUP_DELAY seconds.
+
+    :param update: Update of the last album item
+    :param context: Context object
+    :param group_id: Telegram media group ID
+    """
+    await asyncio.sleep(MEDIA_GROUP_DELAY)
+    album = context.user_data.get('media_groups', {}).pop(group_id, None)
+    if album is None:
+        return
+    logger.info('User %s uploaded album %s with %d file(s)', update.effective_user.id, group_id, album['files'])
+    if album['first'] and context.user_data.get('file_paths'):
+        await _send_delivery_prompt(update, context)
+
+
+async def _download_upload(update: Update, context: ContextTypes.DEFAULT_TYPE, telegram_file, file_name: str,
+                           pages: range = None):
+    """
+    Download an uploaded file and add it to the user's pending job.
+
+    Files of one media group (album) are batched: the delivery choice is shown
+    once after the whole album has been downloaded instead of after its first item.
+
+    :param update: Update object
+    :param context: Context object
+    :param telegram_file: Document or PhotoSize to download
+    :param file_name: File name to store the download under
+    :param pages: Range of 0-based PDF pages to recognize, None for the default
+    """
+    user_id = update.effective_user.id
+    # A new upload replaces the next pages offered after the previous job
+    discard_continuation(context.user_data)
+    group_id = update.message.media_group_id
+    album = None
+    if group_id:
+        albums = context.user_data.setdefault('media_groups', {})
+        album = albums.get(group_id)
+        if album is None:
+            album = albums[group_id] = {'first': not context.user_data.get('file_paths'), 'downloads': 0,
+                                        'files': 0, 'timer': None}
+        if album['timer']:
+            album['timer'].cancel()
+            album['timer'] = None
+        album['downloads'] += 1
+
+    download_path = _reserve_download_path(context, user_id, file_name)
+    started = time.perf_counter()
+    try:
+        # Download file
+        file = await telegram_file.get_file()
+        await _fetch_file(context, file, download_path)
+
+        # Store file path
+        file_paths = context.user_data.get('file_paths', [])
+        file_paths.append(download_path)
+        context.user_data['file_paths'] = file_paths
+        if pages is not None:
+            context.user_data.setdefault('page_ranges', {})[download_path] = pages
+        logger.info('User %s uploaded file: %s', user_id, file_name,
+                    extra=stage_fields('download', time.perf_counter() - started, user_id=user_id))
+
+        # Start recognizing right away, while the user picks the delivery method
+        start_speculative_ocr(context, download_path)
+        if album is not None:
+            album['files'] += 1
+    finally:
+        if album is not None:
+            album['downloads'] -= 1
+            if not album['downloads']:
+                album['timer'] = asyncio.create_task(_prompt_when_album_complete(update, context, group_id))
+
+    if album is None and len(file_paths) == 1:
+        # Show delivery choice keyboard after first file
+        await _send_delivery_prompt(update, context)
+
+
+def _forget_files(context: ContextTypes.DEFAULT_TYPE, paths: list):
+    """
+    Remove files that are already deleted from the user's pending job and cancel their OCR.
+
+    :param context: Context object
+    :param paths: Paths of the files
+    """
+    cancel_speculative_ocr(context, paths)
+    file_paths = context.user_data.get('file_paths', [])
+    file_paths[:] = [path for path in file_paths if path not in paths]
+
+
+async def _receive_archive(update: Update, context: ContextTypes.DEFAULT_TYPE, doc):
+    """
+    Download a ZIP archive and add its supported files to the user's pending job.
+
+    The files are recognized in parallel like separate uploads, each one as
+    soon as it is extracted, and delivered as one result named after the archive.
+
+    :param update: Update object
+    :param context: Context object
+    :param doc: Uploaded Document
+    """
+    user_id = update.effective_user.id
+    lang = get_user_lang(context)
+    # A new upload replaces the next pages offered after the previous job
+    discard_continuation(context.user_data)
+    archive_path = _reserve_download_path(context, user_id, doc.file_name)
+    first = not context.user_data.get('file_paths')
+    loop = asyncio.get_running_loop()
+    queued = []
+
+    def queue_file(path):
+        queued.append(path)
+        context.user_data.setdefault('file_paths', []).append(path)
+        start_speculative_ocr(context, path)
+
+    started = time.perf_counter()
+    try:
+        file = await doc.get_file()
+        await _fetch_file(context, file, archive_path)
+        paths, skipped = await asyncio.to_thread(
+            extract_archive, archive_path, lambda name: _reserve_download_path(context, user_id, name),
+            on_extracted=lambda path: loop.call_soon_threadsafe(queue_file, path))
+    except ArchiveError as e:
+        logger.warning('User %s uploaded rejected archive %s: %s', user_id, doc.file_name, e)
+        _forget_files(context, queued)
+        os.remove(archive_path)
+        await update.message.reply_text(get_text(lang, e.key, filename=doc.file_name, max_files=ZIP_MAX_ENTRIES,
+                                                 max_size=format_megabytes(ZIP_MAX_UNCOMPRESSED)))
+        return
+    except BaseException:
+        _forget_files(context, queued)
+        os.remove(archive_path)
+        raise
+    # Keep the archive's name claimed, its bundled result is named after it
+    os.remove(archive_path)
+    open(archive_path, 'xb').close()  # pylint: disable=consider-using-with
+
+    context.user_data.setdefault('archives', {})[os.path.basename(archive_path)] = paths
+    logger.info('User %s uploaded archive %s with %d supported file(s), %d skipped', user_id, doc.file_name,
+                len(paths), skipped, extra=stage_fields('download', time.perf_counter() - started, user_id=user_id))
+    # Files queued early got a re-run share of a smaller job
+    restart_speculative_ocr(context)
+
+    await update.message.reply_text(get_text(lang, 'zip_received', filename=doc.file_name, count=len(paths),
+                                             skipped=skipped))
+    if first:
+        await _send_delivery_prompt(update, context)
+
+
 async def handle_files(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Handle file uploads.
@@ -26,25 +267,33 @@ async def handle_files(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     lang = get_user_lang(context)
 
+    if is_draining(context.bot_data):
+        await update.message.reply_text(get_text(lang, 'bot_restarting'))
+        return
+
     if not update.message.document:
         await update.message.reply_text(get_text(lang, 'not_document'))
         return
 
     doc = update.message.document
+    max_size = max_upload_size(context.bot_data)
 
     # Check file size
-    if doc.file_size > MAX_SIZE:
+    if doc.file_size > max_size:
         logger.warning(
             'User %s uploaded file too large: %s (%s bytes)',
             user_id, doc.file_name, doc.file_size
         )
         await update.message.reply_text(
-            get_text(lang, 'file_too_large', filename=doc.file_name)
+            get_text(lang, 'file_too_large', filename=doc.file_name, max_size=format_megabytes(max_size))
         )
         return
 
     # Check file format
     ext = os.path.splitext(doc.file_name)[1].lower().replace('.', '')
+    if ext == ZIP_FORMAT:
+        await _receive_archive(update, context, doc)
+        return
     if ext not in ALLOWED_FORMATS:
         logger.warning('User %s uploaded unsupported format: %s', user_id, doc.file_name)
         await update.message.reply_text(
@@ -52,37 +301,83 @@ async def handle_files(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
 
-    # Create temp directory if not exists
-    if 'temp_dir' not in context.user_data:
-        context.user_data['temp_dir'] = tempfile.mkdtemp(prefix=f'ocr_bot_{user_id}_')
+    # PDF page range from a caption such as 'pages: 3-7'
+    pages = None
+    if ext == 'pdf':
+        try:
+            pages = parse_page_range(update.message.caption)
+        except ValueError:
+            await update.message.reply_text(get_text(lang, 'invalid_page_range'))
 
-    temp_dir = context.user_data['temp_dir']
+    await _download_upload(update, context, doc, doc.file_name, pages)
 
-    # Sanitize filename to prevent path traversal
-    safe_name = sanitize_filename(doc.file_name)
-    download_path = os.path.join(temp_dir, safe_name)
 
-    # Ensure uniqueness if file with same name exists
-    base, ext_with_dot = os.path.splitext(safe_name)
-    counter = 1
-    while os.path.exists(download_path):
-        download_path = os.path.join(temp_dir, f"{base}_{counter}{ext_with_dot}")
-        counter += 1
+async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Handle images sent as compressed photos.
 
-    # Download file
-    file = await doc.get_file()
-    await file.download_to_drive(custom_path=download_path)
+    Telegram offers every photo in several sizes; the smallest one that is
+    still large enough for OCR is downloaded.
 
-    # Store file path
-    file_paths = context.user_data.get('file_paths', [])
-    file_paths.append(download_path)
-    context.user_data['file_paths'] = file_paths
-    logger.info('User %s uploaded file: %s', user_id, doc.file_name)
+    :param update: Update object
+    :param context: Context object
+    """
+    user_id = update.effective_user.id
+    lang = get_user_lang(context)
 
-    # Show delivery choice keyboard after first file
-    if len(file_paths) == 1:
-        context.user_data['awaiting_delivery_choice'] = True
-        await update.message.reply_text(
-            get_text(lang, 'file_uploaded'),
-            reply_markup=get_text_delivery_keyboard(context)
-        )
+    if is_draining(context.bot_data):
+        await update.message.reply_text(get_text(lang, 'bot_restarting'))
+        return
+
+    if not update.message.photo:
+        await update.message.reply_text(get_text(lang, 'not_document'))
+        return
+
+    max_size = max_upload_size(context.bot_data)
+    photo = _choose_photo_size(update.message.photo, max_size=max_size)
+    file_name = f'photo_{photo.file_unique_id}.jpg'
+
+    if photo.file_size and photo.file_size > max_size:
+        logger.warning('User %s sent photo too large: %s bytes', user_id, photo.file_size)
+        await update.message.reply_text(get_text(lang, 'file_too_large', filename=file_name,
+                                                 max_size=format_megabytes(max_size)))
+        return
+
+    logger.info('User %s sent photo, using %dx%d variant', user_id, photo.width, photo.height)
+    await _download_upload(update, context, photo, file_name)
+
+
+async def handle_page_range(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Handle a page range such as 'pages: 3-7' sent after uploading PDF files.
+
+    The range applies to all uploaded PDFs of the pending job.
+
+    :param update: Update object
+    :param context: Context object
+    """
+    user_id = update.effective_user.id
+    lang = get_user_lang(context)
+    pdf_paths = [path for path in context.user_data.get('file_paths', []) if path.lower().endswith('.pdf')]
+
+    if not pdf_paths:
+        await update.message.reply_text(get_text(lang, 'please_upload_file'))
+        return
+
+    try:
+        pages = parse_page_range(update.message.text)
+    except ValueError:
+        await update.message.reply_text(get_text(lang, 'invalid_page_range'))
+        return
+
+    page_ranges = context.user_data.setdefault('page_ranges', {})
+    for path in pdf_paths:
+        page_ranges[path] = pages
+    # Speculative jobs started with the previous range are useless now
+    restart_speculative_ocr(context, pdf_paths)
+    logger.info('User %s selected pages %d-%d', user_id, pages.start + 1, pages.stop)
+
+    await update.message.reply_text(
+        get_text(lang, 'page_range_set', start=pages.start + 1, end=pages.stop),
+        reply_markup=get_text_delivery_keyboard(context)
+    )
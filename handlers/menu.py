@@ -6,10 +6,13 @@ import logging
 from telegram import Update
 from telegram.ext import ContextTypes
 
-from localization import get_text, get_supported_languages
+from consts import OCR_PROFILES, DEFAULT_OCR_PROFILE, PDF_DEFAULT_PAGES
+from localization import get_text, get_supported_languages, get_menu_action
 from utils.keyboards import (get_user_lang, get_main_keyboard, get_language_keyboard, get_text_delivery_keyboard,
-                             get_interface_language_keyboard)
+                             get_interface_language_keyboard, get_ocr_profile_keyboard)
+from utils.helpers import max_upload_size, format_megabytes
 from .start import handle_interface_language_choice
+from .speculative import cancel_speculative_ocr, restart_speculative_ocr
 
 logger = logging.getLogger(__name__)
 
@@ -18,7 +21,8 @@ async def _handle_confirm_choice(
         update: Update,
         context: ContextTypes.DEFAULT_TYPE,
         lang: str,
-        supported_langs: dict
+        choice: str,  # pylint: disable=unused-argument
+        value: str  # pylint: disable=unused-argument
 ) -> bool:
     """
     Handle confirm button in multi-language selection mode.
@@ -26,9 +30,13 @@ async def _handle_confirm_choice(
     :param update: Update object
     :param context: Context object
     :param lang: User's interface language
-    :param supported_langs: Dictionary of supported languages
+    :param choice: User's choice
+    :param value: Action value from the menu index
     :return: True if handled, False otherwise
     """
+    if not context.user_data.get('lang_confirm_state'):
+        return False
+
     user_id = update.effective_user.id
     context.user_data['lang_confirm_state'] = False
     lang_selection = context.user_data.get('lang_selection', [])
@@ -36,6 +44,8 @@ async def _handle_confirm_choice(
     if lang_selection:
         final_lang_string = '+'.join(lang_selection)
         context.user_data['ocr_lang_choice'] = final_lang_string
+        restart_speculative_ocr(context)
+        supported_langs = get_supported_languages(lang)
         lang_names = [k for k, v in supported_langs.items() if v in lang_selection]
         logger.info('User %s selected multiple OCR languages: %s', user_id, final_lang_string)
         await update.message.reply_text(
@@ -48,30 +58,33 @@ async def _handle_confirm_choice(
     return True
 
 
-async def _handle_multi_lang_selection(
+async def _handle_ocr_language_choice(
         update: Update,
         context: ContextTypes.DEFAULT_TYPE,
         lang: str,
         choice: str,
-        supported_langs: dict
+        value: str
 ) -> bool:
     """
-    Handle language selection in multi-language mode.
+    Handle OCR language selection.
+
+    In multi-language mode the language is added to the selection,
+    otherwise it becomes the OCR language right away.
 
     :param update: Update object
     :param context: Context object
     :param lang: User's interface language
     :param choice: User's choice
-    :param supported_langs: Dictionary of supported languages
+    :param value: Tesseract language code
     :return: True if handled, False otherwise
     """
-    choice_lower = choice.lower()
-    if choice_lower in supported_langs:
-        ocr_code = supported_langs[choice_lower]
+    user_id = update.effective_user.id
+
+    if context.user_data.get('lang_confirm_state'):
         lang_selection = context.user_data.get('lang_selection', [])
 
-        if ocr_code not in lang_selection:
-            lang_selection.append(ocr_code)
+        if value not in lang_selection:
+            lang_selection.append(value)
             context.user_data['lang_selection'] = lang_selection
 
         await update.message.reply_text(
@@ -80,88 +93,186 @@ async def _handle_multi_lang_selection(
         )
         return True
 
-    return False
+    context.user_data['ocr_lang_choice'] = value
+    restart_speculative_ocr(context)
+    logger.info('User %s selected OCR language: %s', user_id, value)
+    await update.message.reply_text(get_text(lang, 'language_selected', lang=choice))
+    return True
 
 
-async def _handle_single_lang_choice(
+async def _handle_quick_language_button(
         update: Update,
         context: ContextTypes.DEFAULT_TYPE,
         lang: str,
         choice: str,
-        supported_langs: dict
+        value: str
 ) -> bool:
     """
-    Handle single language selection.
+    Handle the main menu shortcut buttons for Ukrainian and English.
 
     :param update: Update object
     :param context: Context object
     :param lang: User's interface language
     :param choice: User's choice
-    :param supported_langs: Dictionary of supported languages
+    :param value: Button translation key
     :return: True if handled, False otherwise
     """
-    user_id = update.effective_user.id
-    choice_lower = choice.lower()
-    lang_map = {
-        get_text(lang, 'btn_ukrainian'): 'ukr',
-        get_text(lang, 'btn_english'): 'eng',
-    }
-
-    if choice in lang_map:
-        context.user_data['ocr_lang_choice'] = lang_map[choice]
-        logger.info('User %s selected OCR language: %s', user_id, lang_map[choice])
-        await update.message.reply_text(get_text(lang, 'language_selected', lang=choice))
-        return True
+    return await _handle_ocr_language_choice(update, context, lang, choice, _QUICK_LANGUAGES[value])
 
-    if choice_lower in supported_langs:
-        context.user_data['ocr_lang_choice'] = supported_langs[choice_lower]
-        logger.info('User %s selected OCR language: %s', user_id, supported_langs[choice_lower])
-        await update.message.reply_text(get_text(lang, 'language_selected', lang=choice))
-        return True
 
-    return False
+async def _handle_interface_language_button(
+        update: Update,
+        context: ContextTypes.DEFAULT_TYPE,
+        lang: str,
+        choice: str,  # pylint: disable=unused-argument
+        value: str  # pylint: disable=unused-argument
+) -> bool:
+    """
+    Handle the interface language button.
 
+    :param update: Update object
+    :param context: Context object
+    :param lang: User's interface language
+    :param choice: User's choice
+    :param value: Action value from the menu index
+    :return: True if handled, False otherwise
+    """
+    context.user_data['awaiting_interface_lang'] = True
+    await update.message.reply_text(
+        get_text(lang, 'choose_interface_language'),
+        reply_markup=get_interface_language_keyboard()
+    )
+    return True
 
-async def _handle_menu_buttons(
+
+async def _handle_other_language_button(
         update: Update,
         context: ContextTypes.DEFAULT_TYPE,
         lang: str,
-        choice: str
+        choice: str,  # pylint: disable=unused-argument
+        value: str  # pylint: disable=unused-argument
 ) -> bool:
     """
-    Handle menu navigation buttons.
+    Handle the other language button.
 
     :param update: Update object
     :param context: Context object
     :param lang: User's interface language
     :param choice: User's choice
+    :param value: Action value from the menu index
     :return: True if handled, False otherwise
     """
-    if choice == get_text(lang, 'btn_other_language'):
-        await update.message.reply_text(
-            get_text(lang, 'choose_language'),
-            reply_markup=get_language_keyboard(context)
-        )
-        return True
+    await update.message.reply_text(
+        get_text(lang, 'choose_language'),
+        reply_markup=get_language_keyboard(context)
+    )
+    return True
 
-    if choice == get_text(lang, 'btn_multiple_languages'):
-        context.user_data['lang_confirm_state'] = True
-        context.user_data['lang_selection'] = []
-        await update.message.reply_text(
-            get_text(lang, 'choose_multiple_languages'),
-            reply_markup=get_language_keyboard(context)
-        )
-        return True
 
-    if choice == get_text(lang, 'btn_back_to_menu'):
-        context.user_data['lang_confirm_state'] = False
-        await update.message.reply_text(
-            get_text(lang, 'choose_alphabet'),
-            reply_markup=get_main_keyboard(context)
-        )
-        return True
+async def _handle_multiple_languages_button(
+        update: Update,
+        context: ContextTypes.DEFAULT_TYPE,
+        lang: str,
+        choice: str,  # pylint: disable=unused-argument
+        value: str  # pylint: disable=unused-argument
+) -> bool:
+    """
+    Handle the multiple languages button.
 
-    return False
+    :param update: Update object
+    :param context: Context object
+    :param lang: User's interface language
+    :param choice: User's choice
+    :param value: Action value from the menu index
+    :return: True if handled, False otherwise
+    """
+    context.user_data['lang_confirm_state'] = True
+    context.user_data['lang_selection'] = []
+    await update.message.reply_text(
+        get_text(lang, 'choose_multiple_languages'),
+        reply_markup=get_language_keyboard(context)
+    )
+    return True
+
+
+async def _handle_ocr_profile_button(
+        update: Update,
+        context: ContextTypes.DEFAULT_TYPE,
+        lang: str,
+        choice: str,  # pylint: disable=unused-argument
+        value: str  # pylint: disable=unused-argument
+) -> bool:
+    """
+    Handle the OCR profile button.
+
+    :param update: Update object
+    :param context: Context object
+    :param lang: User's interface language
+    :param choice: User's choice
+    :param value: Action value from the menu index
+    :return: True if handled, False otherwise
+    """
+    profile = context.user_data.get('ocr_profile', DEFAULT_OCR_PROFILE)
+    await update.message.reply_text(
+        get_text(lang, 'choose_ocr_profile', profile=get_text(lang, f'btn_profile_{profile}')),
+        reply_markup=get_ocr_profile_keyboard(context)
+    )
+    return True
+
+
+async def _handle_ocr_profile_choice(
+        update: Update,
+        context: ContextTypes.DEFAULT_TYPE,
+        lang: str,
+        choice: str,
+        value: str
+) -> bool:
+    """
+    Handle OCR profile selection.
+
+    :param update: Update object
+    :param context: Context object
+    :param lang: User's interface language
+    :param choice: User's choice
+    :param value: Button translation key
+    :return: True if handled, False otherwise
+    """
+    profile = _PROFILE_BUTTONS[value]
+    context.user_data['ocr_profile'] = profile
+    restart_speculative_ocr(context)
+    logger.info('User %s selected OCR profile: %s', update.effective_user.id, profile)
+    await update.message.reply_text(
+        get_text(lang, 'ocr_profile_selected', profile=choice),
+        reply_markup=get_main_keyboard(context)
+    )
+    return True
+
+
+async def _handle_back_to_menu_button(
+        update: Update,
+        context: ContextTypes.DEFAULT_TYPE,
+        lang: str,
+        choice: str,  # pylint: disable=unused-argument
+        value: str  # pylint: disable=unused-argument
+) -> bool:
+    """
+    Handle the back to menu button.
+
+    :param update: Update object
+    :param context: Context object
+    :param lang: User's interface language
+    :param choice: User's choice
+    :param value: Action value from the menu index
+    :return: True if handled, False otherwise
+    """
+    context.user_data['lang_confirm_state'] = False
+    # The user left the delivery choice, stop recognizing in the background
+    cancel_speculative_ocr(context)
+    await update.message.reply_text(
+        get_text(lang, 'choose_alphabet'),
+        reply_markup=get_main_keyboard(context)
+    )
+    return True
 
 
 async def _show_fallback_keyboard(update: Update, context: ContextTypes.DEFAULT_TYPE, lang: str):
@@ -191,47 +302,50 @@ async def _show_fallback_keyboard(update: Update, context: ContextTypes.DEFAULT_
         )
 
 
+# Main menu shortcut buttons and the OCR languages they select
+_QUICK_LANGUAGES = {
+    'btn_ukrainian': 'ukr',
+    'btn_english': 'eng',
+}
+
+# Profile selection buttons and the OCR profiles they select
+_PROFILE_BUTTONS = {f'btn_profile_{profile}': profile for profile in OCR_PROFILES}
+
+# Menu actions from the precompiled localization index and their handlers
+_ROUTES = {
+    'btn_interface_language': _handle_interface_language_button,
+    'btn_confirm': _handle_confirm_choice,
+    'ocr_language': _handle_ocr_language_choice,
+    'btn_ukrainian': _handle_quick_language_button,
+    'btn_english': _handle_quick_language_button,
+    'btn_other_language': _handle_other_language_button,
+    'btn_multiple_languages': _handle_multiple_languages_button,
+    'btn_back_to_menu': _handle_back_to_menu_button,
+    'btn_ocr_profile': _handle_ocr_profile_button,
+    **{key: _handle_ocr_profile_choice for key in _PROFILE_BUTTONS},
+}
+
+
 async def handle_menu_navigation(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Handle menu navigation and language selection.
 
-    Routes user input to appropriate handlers based on current state.
-    Uses early returns to reduce complexity.
+    Routes user input with a single lookup in the precompiled menu index.
+    Interface language selection in progress takes priority.
 
     :param update: Update object
     :param context: Context object
     """
     choice = update.message.text
     lang = get_user_lang(context)
-    supported_langs = get_supported_languages(lang)
 
-    # Priority 1: Interface language selection in progress
     if context.user_data.get('awaiting_interface_lang'):
         if await handle_interface_language_choice(update, context):
             return
 
-    # Priority 2: Interface language button pressed
-    if choice == get_text(lang, 'btn_interface_language'):
-        context.user_data['awaiting_interface_lang'] = True
-        await update.message.reply_text(
-            get_text(lang, 'choose_interface_language'),
-            reply_markup=get_interface_language_keyboard()
-        )
-        return
-
-    # Priority 3: Multi-language selection mode
-    if context.user_data.get('lang_confirm_state'):
-        if choice == get_text(lang, 'btn_confirm'):
-            await _handle_confirm_choice(update, context, lang, supported_langs)
-            return
-        if await _handle_multi_lang_selection(update, context, lang, choice, supported_langs):
-            return
-
-    # Priority 4: Single language or menu buttons
-    if await _handle_single_lang_choice(update, context, lang, choice, supported_langs):
-        return
-
-    if await _handle_menu_buttons(update, context, lang, choice):
+    action, value = get_menu_action(lang, choice)
+    route = _ROUTES.get(action)
+    if route and await route(update, context, lang, choice, value):
         return
 
     # Nothing matched - show appropriate keyboard based on state
@@ -247,6 +361,7 @@ async def handle_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     lang = get_user_lang(context)
     await update.message.reply_text(
-        get_text(lang, 'info_message'),
+        get_text(lang, 'info_message', max_size=format_megabytes(max_upload_size(context.bot_data)),
+                 default_pages=PDF_DEFAULT_PAGES),
         reply_markup=get_main_keyboard(context)
     )
@@ -0,0 +1,255 @@
+"""
+Speculative OCR started at upload time.
+
+Recognition of each uploaded file starts in the background with the OCR
+language chosen so far, while the user is still picking a delivery method.
+The delivery handler then collects the already running results.
+"""
+import os
+import asyncio
+import logging
+
+from telegram.ext import ContextTypes
+
+from consts import OCR_SPECULATIVE, DEFAULT_OCR_PROFILE, PDF_DEFAULT_PAGES, OCR_PROFILES
+from metrics import observe
+from ocr_result import DocumentResult
+from ocr_engine import split_reruns
+from reader import process_input_files
+from utils.logger import stage_fields
+
+logger = logging.getLogger(__name__)
+
+
+def _job_settings(context: ContextTypes.DEFAULT_TYPE) -> tuple:
+    """
+    :return: Tuple (OCR language, OCR profile) chosen by the user
+    """
+    return context.user_data.get('ocr_lang_choice', 'ukr'), context.user_data.get('ocr_profile', DEFAULT_OCR_PROFILE)
+
+
+def requested_pages(context: ContextTypes.DEFAULT_TYPE, file_path: str):
+    """
+    Pages of an uploaded file to recognize in the current job.
+
+    :param context: Context object
+    :param file_path: Path of the downloaded file
+    :return: range of 0-based page numbers, the first PDF_DEFAULT_PAGES unless the user
+        gave a range, None for formats without pages
+    """
+    if not file_path.lower().endswith('.pdf'):
+        return None
+    return context.user_data.get('page_ranges', {}).get(file_path, range(PDF_DEFAULT_PAGES))
+
+
+def rerun_share(file_paths: list, file_path: str) -> int:
+    """
+    Block re-runs one file of a job may make with an adaptive profile.
+
+    ADAPTIVE_MAX_RERUNS caps a whole job, but its files are recognized by
+    separate worker processes, so each file gets a fixed share of it.
+
+    :param file_paths: Paths of the job's files
+    :param file_path: Path of the file
+    :return: Re-run limit of the file
+    """
+    index = file_paths.index(file_path) if file_path in file_paths else len(file_paths)
+    return split_reruns(max(len(file_paths), index + 1))[index]
+
+
+def result_names(file_paths: list) -> dict:
+    """
+    Unique result names of a job's files.
+
+    Results are named after their file's base name; files sharing one, e.g.
+    archive members from different folders, get a counter suffix.
+
+    :param file_paths: Paths of the job's files
+    :return: Dictionary of file paths and result names in job order
+    """
+    names = {}
+    for file_path in file_paths:
+        name = os.path.basename(file_path)
+        base, ext = os.path.splitext(name)
+        counter = 1
+        while name in names.values():
+            name = f'{base}_{counter}{ext}'
+            counter += 1
+        names[file_path] = name
+    return names
+
+
+def _job_key(ocr_lang: str, profile: str, max_reruns: int) -> tuple:
+    """
+    :return: What a file's job computes; the re-run share only matters for adaptive profiles
+    """
+    return ocr_lang, profile, max_reruns if OCR_PROFILES[profile].get('rerun_profile') else None
+
+
+def start_speculative_ocr(context: ContextTypes.DEFAULT_TYPE, file_path: str):
+    """
+    Start low-priority recognition of an uploaded file.
+
+    :param context: Context object
+    :param file_path: Path of the downloaded file
+    """
+    pool = context.bot_data.get('ocr_pool')
+    if not OCR_SPECULATIVE or pool is None:
+        return
+    ocr_lang, profile = _job_settings(context)
+    max_reruns = rerun_share(context.user_data.get('file_paths', []), file_path)
+    jobs = context.user_data.setdefault('speculative_jobs', {})
+    jobs[file_path] = pool.speculate(_job_key(ocr_lang, profile, max_reruns), process_input_files, [file_path],
+                                     ocr_lang, profile, {file_path: requested_pages(context, file_path)}, max_reruns)
+
+
+def cancel_speculative_ocr(context: ContextTypes.DEFAULT_TYPE, file_paths: list = None):
+    """
+    Cancel speculative jobs of the user.
+
+    :param context: Context object
+    :param file_paths: Files whose jobs are cancelled, all of the user's jobs if None
+    """
+    if file_paths is None:
+        jobs = context.user_data.pop('speculative_jobs', None)
+    else:
+        running = context.user_data.get('speculative_jobs', {})
+        jobs = {path: running.pop(path) for path in file_paths if path in running}
+    if not jobs:
+        return
+    for job in jobs.values():
+        job.cancel()
+    logger.info('Cancelled %d speculative OCR job(s)', len(jobs))
+
+
+def restart_speculative_ocr(context: ContextTypes.DEFAULT_TYPE, file_paths: list = ()):
+    """
+    Restart speculative jobs of uploaded files after the OCR language or profile changed.
+
+    Jobs already running with the current settings and re-run share are kept.
+
+    :param context: Context object
+    :param file_paths: Files whose jobs are restarted regardless, e.g. after their page range changed
+    """
+    ocr_lang, profile = _job_settings(context)
+    jobs = context.user_data.get('speculative_jobs', {})
+    all_paths = context.user_data.get('file_paths', [])
+    for file_path in all_paths:
+        job = jobs.get(file_path)
+        key = _job_key(ocr_lang, profile, rerun_share(all_paths, file_path))
+        if job is None or job.key != key or file_path in file_paths:
+            if job is not None:
+                job.cancel()
+            start_speculative_ocr(context, file_path)
+
+
+async def _record_failure(wait, name: str) -> dict:
+    """
+    Await one file's OCR, turning a failure into an error note so the rest of the job is still delivered.
+
+    :param wait: Awaitable returning the file's results
+    :param name: Result name of the file
+    :return: Dictionary of file names and DocumentResult objects
+    """
+    try:
+        return await wait
+    except Exception as e:  # pylint: disable=broad-except
+        # A broken file must not fail the rest of its archive, whatever its format backend raised
+        logger.error('OCR of archived file %s failed: %s', name, e, exc_info=True)
+        result = DocumentResult(name)
+        result.add_error(f'[Error processing {name}: {e}]\n')
+        return {name: result}
+
+
+def _start_waits(context: ContextTypes.DEFAULT_TYPE, file_paths: list, names: dict) -> tuple:
+    """
+    Reuse the speculative jobs started with the job's settings and run the other files on the worker pool.
+
+    Speculative jobs of files that are not reused are cancelled.
+
+    :param context: Context object
+    :param file_paths: Paths of the uploaded files
+    :param names: Dictionary of file paths and result names (see result_names)
+    :return: Tuple (awaitables of each file's results in upload order, reused speculative jobs)
+    """
+    pool = context.bot_data['ocr_pool']
+    ocr_lang, profile = _job_settings(context)
+    jobs = context.user_data.pop('speculative_jobs', {})
+    archived = {path for paths in context.user_data.get('archives', {}).values() for path in paths}
+
+    reused = []
+    waits = []
+    for file_path in file_paths:
+        job = jobs.pop(file_path, None)
+        if job is not None and job.key == _job_key(ocr_lang, profile, rerun_share(file_paths, file_path)):
+            # Jobs still waiting for an idle worker now compete as normal jobs
+            job.promote()
+            reused.append(job)
+            wait = job.result()
+        else:
+            pages = {file_path: requested_pages(context, file_path)}
+            wait = pool.run(process_input_files, [file_path], ocr_lang, profile, pages,
+                            rerun_share(file_paths, file_path))
+        waits.append(_record_failure(wait, names[file_path]) if file_path in archived else wait)
+    for job in jobs.values():
+        job.cancel()
+    logger.info('Reusing speculative OCR for %d of %d file(s)', len(reused), len(file_paths))
+    return waits, reused
+
+
+def _log_results(results: dict, job_id: str = None, user_id: int = None):
+    """
+    Record the recognition time of every file per OCR profile and count the images skipped by triage.
+
+    :param results: Dictionary of result names and DocumentResult objects
+    :param job_id: Job identifier for structured logs
+    :param user_id: Telegram user ID for structured logs
+    """
+    for result in results.values():
+        if result.profile is None:
+            # Error note of a file that failed
+            continue
+        observe(f'ocr.profile.{result.profile}', result.seconds)
+        logger.info('Recognized %s with profile %s in %.2fs', result.name, result.profile, result.seconds,
+                    extra=stage_fields('recognize', result.seconds, job_id, user_id))
+    skipped = sum(result.skipped for result in results.values())
+    if skipped:
+        logger.info('Triage skipped %d text-free image(s)', skipped,
+                    extra=stage_fields('triage', job_id=job_id, user_id=user_id))
+
+
+async def collect_ocr_results(context: ContextTypes.DEFAULT_TYPE, file_paths: list, job_id: str = None,
+                              user_id: int = None) -> dict:
+    """
+    Get OCR results for the uploaded files, reusing speculative jobs started with the same settings.
+
+    Files without a usable speculative job are recognized as one normal job
+    each, so the pool spreads them over its workers. Each file gets its share
+    of the job's adaptive re-run budget (see rerun_share). A file extracted
+    from an archive that fails is returned as an error note instead of failing
+    the whole job.
+    Recognition time of every file is recorded per OCR profile, and images
+    skipped by triage are counted per job.
+
+    :param context: Context object
+    :param file_paths: Paths of the uploaded files
+    :param job_id: Job identifier for structured logs
+    :param user_id: Telegram user ID for structured logs
+    :return: Dictionary of result names (see result_names) and DocumentResult objects in upload order
+    """
+    names = result_names(file_paths)
+    waits, reused = _start_waits(context, file_paths, names)
+
+    results = {}
+    try:
+        # Every wait returns the one result of its file
+        for file_path, part in zip(file_paths, await asyncio.gather(*waits)):
+            result = next(iter(part.values()))
+            result.name = names[file_path]
+            results[result.name] = result
+    finally:
+        for job in reused:
+            job.cancel()
+
+    _log_results(results, job_id, user_id)
+    return results
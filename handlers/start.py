@@ -12,6 +12,8 @@ from utils.keyboards import (
     get_interface_language_keyboard,
     get_main_keyboard,
 )
+from .speculative import cancel_speculative_ocr
+from .delivery import discard_continuation
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +27,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     user_id = update.effective_user.id
     logger.info('User %s started the bot', user_id)
+    cancel_speculative_ocr(context)
+    discard_continuation(context.user_data)
     context.user_data['awaiting_interface_lang'] = True
     await update.message.reply_text(
         get_text('uk', 'choose_interface_language'),
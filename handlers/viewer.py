@@ -0,0 +1,183 @@
+"""
+Paginated result viewer.
+
+Results longer than one message are delivered as a single message showing one
+page, with inline buttons to move between pages and to download the full
+texts. Pages are served from a bounded in-memory store by editing that
+message, so a large document costs a handful of API calls instead of one
+message per chunk.
+"""
+import os
+import time
+import logging
+from collections import OrderedDict
+
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
+from telegram.ext import ContextTypes
+
+from consts import VIEWER_CALLBACK_PREFIX, VIEWER_MAX_RESULTS, VIEWER_MAX_CHARS, VIEWER_TTL
+from localization import get_text
+from utils.keyboards import get_user_lang
+
+logger = logging.getLogger(__name__)
+
+
+class _View:
+    """
+    Delivered result of one job: texts per file and page bounds within them.
+    """
+    __slots__ = ('user_id', 'texts', 'pages', 'created', 'chars')
+
+    def __init__(self, user_id: int, texts: dict, pages: list):
+        """
+        :param user_id: Telegram user ID of the job owner
+        :param texts: Dictionary of file names and recognized texts
+        :param pages: List of (file name, start, end, part, parts) tuples
+        """
+        self.user_id = user_id
+        self.texts = texts
+        self.pages = pages
+        self.created = time.monotonic()
+        self.chars = sum(len(text) for text in texts.values())
+
+
+class ResultStore:
+    """
+    Bounded store of delivered results for page navigation.
+
+    Keeps at most max_results results and max_chars characters, evicting the
+    least recently viewed results first, and forgets results older than ttl.
+    """
+
+    def __init__(self, max_results: int = VIEWER_MAX_RESULTS, max_chars: int = VIEWER_MAX_CHARS,
+                 ttl: float = VIEWER_TTL):
+        self.max_results = max_results
+        self.max_chars = max_chars
+        self.ttl = ttl
+        self._views = OrderedDict()
+        self._chars = 0
+
+    def __len__(self):
+        return len(self._views)
+
+    def put(self, view_id: str, view: _View):
+        """
+        Add a result, evicting old ones to stay within the bounds.
+        """
+        self._views[view_id] = view
+        self._chars += view.chars
+        while len(self._views) > self.max_results or (self._chars > self.max_chars and len(self._views) > 1):
+            self._evict()
+
+    def get(self, view_id: str):
+        """
+        :return: _View or None if it was evicted or expired
+        """
+        view = self._views.get(view_id)
+        if view is None:
+            return None
+        if time.monotonic() - view.created > self.ttl:
+            self._chars -= self._views.pop(view_id).chars
+            return None
+        self._views.move_to_end(view_id)
+        return view
+
+    def _evict(self):
+        view_id, view = self._views.popitem(last=False)
+        self._chars -= view.chars
+        logger.debug('Evicted result %s from the viewer store', view_id)
+
+
+def _store(context: ContextTypes.DEFAULT_TYPE) -> ResultStore:
+    return context.bot_data.setdefault('result_store', ResultStore())
+
+
+def _render_page(view: _View, page: int, lang: str) -> str:
+    """
+    :return: Message text of a page: file header, part header and the page's text
+    """
+    file_name, start, end, part, parts = view.pages[page]
+    lines = [get_text(lang, 'file_header', filename=file_name)]
+    if parts > 1:
+        lines.append(get_text(lang, 'message_part', current=part, total=parts))
+    lines.append(view.texts[file_name][start:end] if end > start else get_text(lang, 'no_text_found'))
+    return '\n'.join(lines)
+
+
+def _page_keyboard(view_id: str, page: int, total: int, lang: str) -> InlineKeyboardMarkup:
+    """
+    :return: Inline keyboard with navigation buttons for the page and a download button
+    """
+    prefix = f'{VIEWER_CALLBACK_PREFIX}:{view_id}'
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton('◀', callback_data=f'{prefix}:{page - 1}'))
+    navigation.append(InlineKeyboardButton(f'{page + 1} / {total}', callback_data=f'{prefix}:noop'))
+    if page < total - 1:
+        navigation.append(InlineKeyboardButton('▶', callback_data=f'{prefix}:{page + 1}'))
+    return InlineKeyboardMarkup([
+        navigation,
+        [InlineKeyboardButton(get_text(lang, 'btn_download_all'), callback_data=f'{prefix}:all')],
+    ])
+
+
+async def send_result_viewer(update: Update, context: ContextTypes.DEFAULT_TYPE, view_id: str, texts: dict,
+                             pages: list):
+    """
+    Store a result and send its first page with navigation buttons.
+
+    :param update: Update object
+    :param context: Context object
+    :param view_id: Identifier of the result, e.g. the job ID
+    :param texts: Dictionary of file names and recognized texts
+    :param pages: List of (file name, start, end, part, parts) tuples, each fitting in one message
+    """
+    lang = get_user_lang(context)
+    view = _View(update.effective_user.id, texts, pages)
+    _store(context).put(view_id, view)
+    await update.message.reply_text(_render_page(view, 0, lang),
+                                    reply_markup=_page_keyboard(view_id, 0, len(pages), lang))
+
+
+async def handle_viewer_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Handle the viewer's inline buttons: show another page or send the full texts as files.
+
+    :param update: Update object
+    :param context: Context object
+    """
+    query = update.callback_query
+    lang = get_user_lang(context)
+    _, view_id, action = query.data.split(':', 2)
+    view = _store(context).get(view_id)
+
+    if view is None or view.user_id != query.from_user.id:
+        await query.answer(get_text(lang, 'results_expired'), show_alert=True)
+        return
+
+    if action == 'all':
+        await query.answer()
+        logger.info('User %s downloads all results of %s', query.from_user.id, view_id)
+        for file_name, text in view.texts.items():
+            await context.bot.send_document(
+                chat_id=query.message.chat_id,
+                document=text.encode('utf-8'),
+                filename=f'{os.path.splitext(file_name)[0]}.txt'
+            )
+        return
+
+    if not action.isdigit() or int(action) >= len(view.pages):
+        # Page counter button
+        await query.answer()
+        return
+
+    page = int(action)
+    await query.answer()
+    try:
+        await query.edit_message_text(_render_page(view, page, lang),
+                                      reply_markup=_page_keyboard(view_id, page, len(view.pages), lang))
+    except BadRequest as e:
+        # Repeated taps on the same button
+        if 'not modified' not in str(e).lower():
+            raise
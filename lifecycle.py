@@ -0,0 +1,155 @@
+"""
+Graceful shutdown and health checks.
+
+On SIGTERM or SIGINT the bot drains instead of stopping at once: it stops
+accepting uploads, reports not ready, lets in-flight OCR jobs finish within
+SHUTDOWN_DEADLINE and interrupts the rest, telling their users to resend.
+Only then does polling stop, so a rolling restart loses no results silently.
+
+Endpoints:
+----------
+GET /livez   200 while the event loop responds and the OCR worker pool runs,
+             503 once a dead worker could not be replaced
+GET /readyz  200 while the bot accepts new jobs: not draining and at least one
+             live worker within its memory budget, 503 otherwise
+"""
+import time
+import asyncio
+import logging
+import contextlib
+
+from aiohttp import web
+
+from consts import SHUTDOWN_DEADLINE, HEALTH_HOST, HEALTH_PORT
+
+logger = logging.getLogger(__name__)
+
+
+class _Job:
+    """
+    In-flight OCR job.
+    """
+    __slots__ = ('job_id', 'user_id', 'chat_id', 'task', 'started')
+
+    def __init__(self, job_id: str, user_id: int, chat_id: int, task):
+        self.job_id = job_id
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.task = task
+        self.started = time.monotonic()
+
+
+class Lifecycle:
+    """
+    Tracks in-flight jobs and coordinates the draining shutdown.
+    """
+
+    def __init__(self):
+        self.draining = False
+        self.interrupted = []
+        self._jobs = {}
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @property
+    def jobs(self) -> int:
+        """
+        Number of in-flight jobs.
+        """
+        return len(self._jobs)
+
+    @contextlib.contextmanager
+    def track(self, job_id: str, user_id: int, chat_id: int):
+        """
+        Register the current task as an in-flight job for the duration of the block.
+
+        :param job_id: Job identifier
+        :param user_id: Telegram user ID, None for HTTP API requests
+        :param chat_id: Chat the results are sent to, None for HTTP API requests
+        """
+        self._jobs[job_id] = _Job(job_id, user_id, chat_id, asyncio.current_task())
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            del self._jobs[job_id]
+            if not self._jobs:
+                self._idle.set()
+
+    def interrupt(self) -> list:
+        """
+        Cancel the in-flight jobs not interrupted yet.
+
+        :return: Newly interrupted jobs
+        """
+        jobs = [job for job in self._jobs.values() if job not in self.interrupted]
+        for job in jobs:
+            owner = 'the HTTP API' if job.user_id is None else f'user {job.user_id}'
+            logger.warning('Interrupting job %s of %s after %.0fs', job.job_id, owner, time.monotonic() - job.started)
+            job.task.cancel()
+        self.interrupted.extend(jobs)
+        return jobs
+
+    async def drain(self, deadline: float = SHUTDOWN_DEADLINE) -> list:
+        """
+        Stop accepting jobs and wait for in-flight ones, interrupting those still running at the deadline.
+
+        :param deadline: Seconds to wait for in-flight jobs
+        :return: All interrupted jobs
+        """
+        self.draining = True
+        logger.info('Draining: waiting up to %ss for %d in-flight job(s)', deadline, len(self._jobs))
+        try:
+            await asyncio.wait_for(self._idle.wait(), deadline)
+        except asyncio.TimeoutError:
+            jobs = self.interrupt()
+            # Let cancelled jobs run their cleanup
+            await asyncio.gather(*(job.task for job in jobs), return_exceptions=True)
+        return self.interrupted
+
+
+def _pool_status(pool) -> dict:
+    if pool is None:
+        return {'workers': 0, 'available': 0, 'broken': 0, 'pending': 0, 'speculative': 0}
+    return pool.status()
+
+
+def add_health_routes(app: web.Application, get_pool, lifecycle: Lifecycle = None):
+    """
+    Register /livez and /readyz on an aiohttp application.
+
+    :param app: aiohttp Application
+    :param get_pool: Callable returning the current OcrWorkerPool or None
+    :param lifecycle: Lifecycle of the process, None if it never drains
+    """
+
+    async def livez(_request: web.Request) -> web.Response:
+        status = _pool_status(get_pool())
+        alive = status['workers'] and not status['broken']
+        return web.json_response(status, status=200 if alive else 503)
+
+    async def readyz(_request: web.Request) -> web.Response:
+        status = _pool_status(get_pool())
+        status['draining'] = bool(lifecycle and lifecycle.draining)
+        status['jobs'] = lifecycle.jobs if lifecycle else 0
+        ready = status['available'] and not status['draining']
+        return web.json_response(status, status=200 if ready else 503)
+
+    app.router.add_get('/livez', livez)
+    app.router.add_get('/readyz', readyz)
+
+
+async def start_health_server(get_pool, lifecycle: Lifecycle, host: str = HEALTH_HOST,
+                              port: int = HEALTH_PORT) -> web.AppRunner:
+    """
+    Start the health check server on the running event loop.
+
+    :return: AppRunner, call its cleanup() to stop the server
+    """
+    app = web.Application()
+    add_health_routes(app, get_pool, lifecycle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info('Health checks listening on http://%s:%d', host, port)
+    return runner
@@ -0,0 +1,3 @@
+"""
+Load-testing tools: a fake Telegram Bot API server and a virtual user simulator.
+"""
@@ -0,0 +1,296 @@
+"""
+Fake Telegram Bot API server for load testing.
+
+Implements the subset of the Bot API the bot uses (getUpdates, sendMessage,
+editMessageText, sendDocument, getFile, file download and a few no-op
+methods such as answerCallbackQuery) in memory, so
+the bot can be driven by simulated users without touching Telegram.
+
+Point the bot at it with:
+    BOT_API_BASE_URL=http://127.0.0.1:8081/bot BOT_API_FILE_URL=http://127.0.0.1:8081/file/bot
+
+With a local directory it behaves like a Bot API server in local mode: getFile
+writes the file there and returns its absolute path (run the bot with BOT_API_LOCAL=1).
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+import itertools
+from collections import defaultdict
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'OCR Bot', 'username': 'ocr_test_bot'}
+
+
+class FakeBotApi:  # pylint: disable=too-many-instance-attributes
+    # One counter or store per kind of Bot API object, like the real server keeps
+    """
+    In-memory Bot API state shared by the HTTP handlers and the simulator.
+    """
+
+    def __init__(self, local_dir: str = None):
+        """
+        :param local_dir: Directory files are served from in local mode, None serves them over HTTP
+        """
+        self.local_dir = local_dir
+        self._updates = []
+        self._new_update = asyncio.Event()
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._callback_ids = itertools.count(1)
+        self._files = {}
+        self._file_ids = itertools.count(1)
+        self.outbox = defaultdict(asyncio.Queue)
+        self.sent_documents = 0
+        self.api_calls = defaultdict(int)
+
+    # Simulator side
+
+    def add_file(self, content: bytes) -> str:
+        """
+        Store a file the virtual user uploads.
+
+        :return: file_id to use in a document update
+        """
+        file_id = f'file{next(self._file_ids)}'
+        self._files[file_id] = content
+        return file_id
+
+    def push_update(self, update: dict):
+        """
+        Queue an update for the bot's next getUpdates call.
+        """
+        update['update_id'] = next(self._update_ids)
+        self._updates.append(update)
+        self._new_update.set()
+
+    # The optional fields mirror those of a Telegram message
+    # pylint: disable-next=too-many-arguments,too-many-positional-arguments
+    def push_message(self, user_id: int, text: str = None, document: dict = None, caption: str = None,
+                     photo: list = None, media_group_id: str = None):
+        """
+        Queue a message from a virtual user in a private chat.
+
+        :param user_id: Virtual user ID, also the chat ID
+        :param text: Message text; commands get a bot_command entity
+        :param document: Document object of an uploaded file
+        :param caption: Caption of the document or photo
+        :param photo: PhotoSize objects of an uploaded photo
+        :param media_group_id: Album the message belongs to
+        """
+        message = {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}'},
+        }
+        if text is not None:
+            message['text'] = text
+            if text.startswith('/'):
+                message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        if document is not None:
+            message['document'] = document
+        if photo is not None:
+            message['photo'] = photo
+        if media_group_id is not None:
+            message['media_group_id'] = media_group_id
+        if caption is not None:
+            message['caption'] = caption
+        self.push_update({'message': message})
+
+    def push_callback_query(self, user_id: int, message: dict, data: str):
+        """
+        Queue a press of an inline keyboard button by a virtual user.
+
+        :param user_id: Virtual user ID
+        :param message: Message sent by the bot that carries the button
+        :param data: Callback data of the button
+        """
+        self.push_update({'callback_query': {
+            'id': str(next(self._callback_ids)),
+            'from': {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}'},
+            'chat_instance': str(user_id),
+            'message': message,
+            'data': data,
+        }})
+
+    # Bot API side
+
+    async def get_updates(self, params: dict) -> list:
+        """
+        getUpdates: return the updates from the offset on, long polling for up to `timeout` seconds.
+
+        :param params: Request parameters (offset, timeout, limit)
+        :return: List of updates
+        """
+        offset = int(params.get('offset') or 0)
+        timeout = float(params.get('timeout') or 0)
+        self._updates = [u for u in self._updates if u['update_id'] >= offset]
+        if not self._updates and timeout:
+            self._new_update.clear()
+            try:
+                await asyncio.wait_for(self._new_update.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:int(params.get('limit') or 100)]
+
+    def _message(self, chat_id, **fields) -> dict:
+        """
+        :return: New message from the bot in a private chat, with the given fields added
+        """
+        message = {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': int(chat_id), 'type': 'private'},
+            'from': BOT_USER,
+        }
+        message.update(fields)
+        return message
+
+    def send_message(self, params: dict) -> dict:
+        """
+        sendMessage: deliver a text message to the virtual user's outbox.
+
+        :param params: Request parameters (chat_id, text, reply_markup)
+        :return: Sent message
+        """
+        message = self._message(params['chat_id'], text=params.get('text', ''))
+        reply_markup = params.get('reply_markup')
+        if isinstance(reply_markup, str):
+            reply_markup = json.loads(reply_markup)
+        if reply_markup and 'inline_keyboard' in reply_markup:
+            # Like Telegram, only inline keyboards are echoed back in the sent message
+            message['reply_markup'] = reply_markup
+        self.outbox[int(params['chat_id'])].put_nowait(('message', message))
+        return message
+
+    def edit_message_text(self, params: dict) -> dict:
+        """
+        editMessageText: deliver the edited message to the virtual user's outbox.
+
+        :param params: Request parameters (chat_id, message_id, text)
+        :return: Edited message
+        """
+        message = self._message(params['chat_id'], text=params.get('text', ''))
+        message['message_id'] = int(params['message_id'])
+        self.outbox[int(params['chat_id'])].put_nowait(('edit', message))
+        return message
+
+    async def send_document(self, params: dict, request: web.Request) -> dict:
+        """
+        sendDocument: read the uploaded file and deliver a document message to the outbox.
+
+        :param params: Request parameters (chat_id, document)
+        :param request: HTTP request, read only for multipart uploads
+        :return: Sent message
+        """
+        size = 0
+        filename = 'document'
+        if request.content_type.startswith('multipart/'):
+            field = params.get('document')
+            if isinstance(field, web.FileField):
+                filename = field.filename
+                size = len(field.file.read())
+        self.sent_documents += 1
+        message = self._message(params['chat_id'], document={
+            'file_id': f'sent{self.sent_documents}', 'file_unique_id': f'sent{self.sent_documents}',
+            'file_name': filename, 'file_size': size,
+        })
+        self.outbox[int(params['chat_id'])].put_nowait(('document', message))
+        return message
+
+    def get_file(self, params: dict) -> dict:
+        """
+        getFile: describe an uploaded file; in local mode, also write it to the local directory.
+
+        :param params: Request parameters (file_id)
+        :return: File object
+        """
+        file_id = params['file_id']
+        file_path = f'documents/{file_id}'
+        if self.local_dir:
+            file_path = os.path.join(self.local_dir, file_path)
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(file_path, 'wb') as f:
+                f.write(self._files.get(file_id, b''))
+        return {
+            'file_id': file_id,
+            'file_unique_id': file_id,
+            'file_size': len(self._files.get(file_id, b'')),
+            'file_path': file_path,
+        }
+
+    def file_content(self, file_id: str):
+        """
+        :return: Content of an uploaded file as bytes, None if the file ID is unknown
+        """
+        return self._files.get(file_id)
+
+
+async def _read_params(request: web.Request) -> dict:
+    """
+    :return: Bot API parameters from a JSON body, a form body or the query string
+    """
+    if request.content_type == 'application/json':
+        return await request.json()
+    if request.method == 'POST':
+        return dict(await request.post())
+    return dict(request.query)
+
+
+def create_app(api: FakeBotApi) -> web.Application:
+    """
+    Create the fake Bot API HTTP application.
+    """
+
+    async def handle_method(request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        params = await _read_params(request)
+        api.api_calls[method] += 1
+
+        if method == 'getMe':
+            result = BOT_USER
+        elif method == 'getUpdates':
+            result = await api.get_updates(params)
+        elif method == 'sendMessage':
+            result = api.send_message(params)
+        elif method == 'editMessageText':
+            result = api.edit_message_text(params)
+        elif method == 'sendDocument':
+            result = await api.send_document(params, request)
+        elif method == 'getFile':
+            result = api.get_file(params)
+        else:
+            # deleteWebhook, sendChatAction, answerCallbackQuery, setMyCommands, ...
+            result = True
+        return web.json_response({'ok': True, 'result': result})
+
+    async def handle_file(request: web.Request) -> web.Response:
+        file_id = request.match_info['path'].rsplit('/', 1)[-1]
+        content = api.file_content(file_id)
+        if content is None:
+            raise web.HTTPNotFound()
+        return web.Response(body=content, content_type='application/octet-stream')
+
+    app = web.Application(client_max_size=100 * 1024 * 1024)
+    app.router.add_route('*', '/bot{token}/{method}', handle_method)
+    app.router.add_get('/file/bot{token}/{path:.*}', handle_file)
+    return app
+
+
+async def start_server(api: FakeBotApi, host: str, port: int) -> web.AppRunner:
+    """
+    Start the fake Bot API on the running event loop.
+
+    :return: AppRunner, call its cleanup() to stop the server
+    """
+    runner = web.AppRunner(create_app(api))
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info('Fake Bot API listening on http://%s:%d', host, port)
+    return runner
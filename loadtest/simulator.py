@@ -0,0 +1,353 @@
+"""
+End-to-end load test: virtual users driving the bot through a fake Bot API.
+
+Each virtual user goes through /start -> interface language -> OCR language ->
+upload -> delivery choice, and the time from sending each update until the
+bot's expected reply is recorded per stage. Recorded, anonymized update traces
+can be replayed instead of the scripted flow.
+
+Usage (from the repository root):
+    python -m loadtest.simulator --users 50 --concurrency 10 --launch-bot
+    python -m loadtest.simulator --users 20 --file scan.pdf --delivery file
+    python -m loadtest.simulator --anonymize raw_updates.jsonl > trace.jsonl
+    python -m loadtest.simulator --replay trace.jsonl --speed 5 --launch-bot
+    python -m loadtest.simulator --users 20 --local-mode --launch-bot
+
+Without --launch-bot, start the bot yourself pointed at the fake server:
+    TOKEN=loadtest:token BOT_API_BASE_URL=http://127.0.0.1:8081/bot \\
+    BOT_API_FILE_URL=http://127.0.0.1:8081/file/bot python bot.py
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from collections import defaultdict
+
+from consts import REQUIRED_KEYS
+from localization import get_text, get_all_translations_for_key
+from loadtest.fake_bot_api import FakeBotApi, start_server
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STAGES = ('start', 'interface_language', 'ocr_language', 'upload', 'delivery')
+INTERFACE_BUTTON = 'English 🇬🇧'
+INTERFACE_LANG = 'en'
+
+
+class StageStats:
+    """
+    Latency samples per stage.
+    """
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.timeouts = defaultdict(int)
+
+    def add(self, stage: str, seconds: float):
+        """
+        Record the latency of a completed stage.
+        """
+        self.samples[stage].append(seconds)
+
+    def timeout(self, stage: str):
+        """
+        Record a stage that got no reply in time.
+        """
+        self.timeouts[stage] += 1
+
+    @staticmethod
+    def percentile(values: list, fraction: float) -> float:
+        """
+        :param values: Latency samples
+        :param fraction: Percentile as a fraction, e.g. 0.95
+        :return: Nearest-rank percentile of the samples
+        """
+        ordered = sorted(values)
+        index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+        return ordered[index]
+
+    def print(self, elapsed: float, flows: int, api: FakeBotApi):
+        """
+        Print the latency table, the throughput and the rate of Bot API calls.
+
+        :param elapsed: Duration of the run in seconds
+        :param flows: Number of completed user flows
+        :param api: Fake server whose calls are counted
+        """
+        print(f"{'stage':<20}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'timeouts':>10}")
+        stages = list(STAGES) + sorted(set(self.samples) - set(STAGES))
+        for stage in stages:
+            values = self.samples.get(stage)
+            if not values and not self.timeouts.get(stage):
+                continue
+            values = values or [float('nan')]
+            print(f'{stage:<20}{len(self.samples.get(stage, [])):>7}'
+                  f'{self.percentile(values, 0.50) * 1000:>10.0f}'
+                  f'{self.percentile(values, 0.95) * 1000:>10.0f}'
+                  f'{self.percentile(values, 0.99) * 1000:>10.0f}'
+                  f'{self.timeouts.get(stage, 0):>10}')
+        calls = sum(api.api_calls.values())
+        print(f'Completed {flows} flow(s) in {elapsed:.1f}s: {flows / elapsed:.2f} flows/s, '
+              f'{calls} Bot API calls ({calls / elapsed:.1f}/s)')
+
+
+class VirtualUser:
+    """
+    One simulated Telegram user talking to the bot in a private chat.
+    """
+
+    def __init__(self, api: FakeBotApi, user_id: int, stats: StageStats, timeout: float):
+        self.api = api
+        self.user_id = user_id
+        self.stats = stats
+        self.timeout = timeout
+
+    def _drain(self):
+        queue = self.api.outbox[self.user_id]
+        while not queue.empty():
+            queue.get_nowait()
+
+    async def step(self, stage: str, expected=None, **message) -> bool:
+        """
+        Send a message and wait for the bot's reply.
+
+        :param stage: Stage name used in the report
+        :param expected: Text of the reply that completes the stage, None for any reply
+        :param message: Arguments for FakeBotApi.push_message
+        :return: True if the reply arrived before the timeout
+        """
+        self._drain()
+        queue = self.api.outbox[self.user_id]
+        started = time.perf_counter()
+        self.api.push_message(self.user_id, **message)
+        deadline = started + self.timeout
+        try:
+            while True:
+                _, reply = await asyncio.wait_for(queue.get(), max(0.0, deadline - time.perf_counter()))
+                if expected is None or reply.get('text') == expected:
+                    break
+        except asyncio.TimeoutError:
+            self.stats.timeout(stage)
+            return False
+        self.stats.add(stage, time.perf_counter() - started)
+        return True
+
+    async def run_flow(self, document: dict, delivery_key: str) -> bool:
+        """
+        Go through the whole bot flow once.
+
+        :return: True if every stage completed
+        """
+        steps = (
+            ('start', get_text('uk', 'choose_interface_language'), {'text': '/start'}),
+            ('interface_language', get_text(INTERFACE_LANG, 'start_message'), {'text': INTERFACE_BUTTON}),
+            ('ocr_language', None, {'text': get_text(INTERFACE_LANG, 'btn_english')}),
+            ('upload', get_text(INTERFACE_LANG, 'file_uploaded'), {'document': document}),
+            ('delivery', get_text(INTERFACE_LANG, 'choose_alphabet'), {'text': get_text(INTERFACE_LANG, delivery_key)}),
+        )
+        for stage, expected, message in steps:
+            if not await self.step(stage, expected, **message):
+                return False
+        return True
+
+
+def make_sample_pdf() -> bytes:
+    """
+    Build a small PDF with a text layer, so the pipeline runs without Tesseract installed.
+    """
+    import fitz  # pylint: disable=import-outside-toplevel
+    doc = fitz.open()
+    for number in range(1, 4):
+        page = doc.new_page()
+        page.insert_text((72, 72), f'Load test page {number}\nThe quick brown fox jumps over the lazy dog.')
+    return doc.tobytes()
+
+
+def make_document(api: FakeBotApi, content: bytes, file_name: str) -> dict:
+    """
+    Register an upload with the fake server and build its Document object.
+    """
+    file_id = api.add_file(content)
+    return {
+        'file_id': file_id,
+        'file_unique_id': file_id,
+        'file_name': file_name,
+        'file_size': len(content),
+        'mime_type': 'application/octet-stream',
+    }
+
+
+async def run_scripted(api: FakeBotApi, args, content: bytes, file_name: str, stats: StageStats) -> int:
+    """
+    Run args.users scripted flows with at most args.concurrency users at a time.
+
+    :return: Number of completed flows
+    """
+    semaphore = asyncio.Semaphore(args.concurrency)
+    delivery_key = 'btn_message' if args.delivery == 'message' else 'btn_text_file'
+
+    async def one_user(user_id):
+        async with semaphore:
+            user = VirtualUser(api, user_id, stats, args.timeout)
+            return await user.run_flow(make_document(api, content, file_name), delivery_key)
+
+    results = await asyncio.gather(*(one_user(100000 + index) for index in range(args.users)))
+    return sum(results)
+
+
+async def run_replay(api: FakeBotApi, args, content: bytes, file_name: str, stats: StageStats) -> int:
+    """
+    Replay a trace: every user's events are sent at their recorded offsets divided by args.speed.
+
+    :return: Number of replayed events that got a reply
+    """
+    events = defaultdict(list)
+    with open(args.replay, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                event = json.loads(line)
+                events[event['user']].append(event)
+
+    started = time.perf_counter()
+    user_ids = {name: 200000 + index for index, name in enumerate(sorted(events))}
+
+    async def replay_user(name):
+        user = VirtualUser(api, user_ids[name], stats, args.timeout)
+        answered = 0
+        for event in sorted(events[name], key=lambda e: e['t']):
+            await asyncio.sleep(max(0.0, started + event['t'] / args.speed - time.perf_counter()))
+            stage = event.get('stage') or event['event']
+            if event['event'] == 'document':
+                message = {'document': make_document(api, content, file_name)}
+            else:
+                message = {'text': event['text']}
+            answered += await user.step(stage, **message)
+        return answered
+
+    return sum(await asyncio.gather(*(replay_user(name) for name in events)))
+
+
+def anonymize_trace(raw_path: str, output=sys.stdout):
+    """
+    Convert raw Telegram update JSON lines into an anonymized replay trace.
+
+    User IDs become ordinal names, free text that is not a command or a menu
+    button is dropped, and documents keep only their extension and size.
+    """
+    known_texts = {INTERFACE_BUTTON, 'Українська 🇺🇦'}
+    for key in REQUIRED_KEYS:
+        if key.startswith('btn_'):
+            known_texts.update(get_all_translations_for_key(key))
+
+    users = {}
+    first_date = None
+    with open(raw_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            message = json.loads(line).get('message')
+            if not message:
+                continue
+            first_date = message['date'] if first_date is None else first_date
+            user = users.setdefault(message['from']['id'], f'u{len(users) + 1}')
+            event = {'t': message['date'] - first_date, 'user': user}
+            if 'document' in message:
+                document = message['document']
+                event.update(event='document', ext=os.path.splitext(document.get('file_name', ''))[1].lower(),
+                             size=document.get('file_size', 0))
+            elif message.get('text', '').startswith('/'):
+                event.update(event='command', text=message['text'].split()[0])
+            elif message.get('text') in known_texts:
+                event.update(event='text', text=message['text'])
+            else:
+                event.update(event='text', text='<free text>')
+            output.write(json.dumps(event, ensure_ascii=False) + '\n')
+
+
+def launch_bot(host: str, port: int, local_mode: bool = False) -> subprocess.Popen:
+    """
+    Start bot.py pointed at the fake server.
+
+    :param local_mode: Run the bot in local Bot API mode
+    """
+    env = dict(os.environ)
+    env.update({
+        'TOKEN': 'loadtest:token',
+        'BOT_API_BASE_URL': f'http://{host}:{port}/bot',
+        'BOT_API_FILE_URL': f'http://{host}:{port}/file/bot',
+    })
+    if local_mode:
+        env['BOT_API_LOCAL'] = '1'
+    return subprocess.Popen([sys.executable, 'bot.py'], cwd=ROOT_DIR, env=env)
+
+
+async def main_async(args):
+    """
+    Serve the fake Bot API, optionally start the bot, run the scripted or replayed load and print the stats.
+
+    :param args: Parsed command line arguments
+    """
+    api = FakeBotApi(tempfile.mkdtemp(prefix='fake_bot_api_') if args.local_mode else None)
+    runner = await start_server(api, args.host, args.port)
+    bot_process = launch_bot(args.host, args.port, args.local_mode) if args.launch_bot else None
+    try:
+        if args.file:
+            with open(args.file, 'rb') as f:
+                content = f.read()
+            file_name = os.path.basename(args.file)
+        else:
+            content, file_name = make_sample_pdf(), 'loadtest.pdf'
+
+        if bot_process:
+            # Wait for the bot to start polling
+            user = VirtualUser(api, 1, StageStats(), args.timeout)
+            await user.step('warmup', text='/start')
+
+        stats = StageStats()
+        started = time.perf_counter()
+        if args.replay:
+            completed = await run_replay(api, args, content, file_name, stats)
+        else:
+            completed = await run_scripted(api, args, content, file_name, stats)
+        stats.print(time.perf_counter() - started, completed, api)
+    finally:
+        if bot_process:
+            bot_process.terminate()
+            # Keep serving while the bot shuts down, it calls getUpdates once more
+            await asyncio.to_thread(bot_process.wait, 30)
+        await runner.cleanup()
+        if api.local_dir:
+            shutil.rmtree(api.local_dir, ignore_errors=True)
+
+
+def main():
+    """
+    Parse the command line and run the load test, or anonymize a trace.
+    """
+    parser = argparse.ArgumentParser(description='Load test the bot against a fake Telegram Bot API.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--users', type=int, default=20, help='virtual users for the scripted flow')
+    parser.add_argument('--concurrency', type=int, default=10, help='users active at the same time')
+    parser.add_argument('--delivery', choices=('message', 'file'), default='message')
+    parser.add_argument('--file', help='document uploaded by every user (default: generated 3-page PDF)')
+    parser.add_argument('--timeout', type=float, default=120.0, help='seconds to wait for each reply')
+    parser.add_argument('--replay', help='anonymized trace to replay instead of the scripted flow')
+    parser.add_argument('--speed', type=float, default=1.0, help='replay speed-up factor')
+    parser.add_argument('--anonymize', metavar='RAW_UPDATES', help='print an anonymized trace of raw updates')
+    parser.add_argument('--launch-bot', action='store_true', help='start bot.py against the fake server')
+    parser.add_argument('--local-mode', action='store_true', help='serve files like a local Bot API server')
+    args = parser.parse_args()
+
+    if args.anonymize:
+        anonymize_trace(args.anonymize)
+        return
+    asyncio.run(main_async(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 import json
 import os
 import logging
+from string import Formatter
 from consts import REQUIRED_LANGUAGES, REQUIRED_KEYS
 
 TRANSLATIONS_FILE = os.path.join(os.path.dirname(__file__), 'translations.json')
@@ -74,6 +75,42 @@ def load_translations() -> dict:
     return translations
 
 
+class _Template:
+    """
+    Translation string with its format fields parsed once at load time.
+    """
+    __slots__ = ('text', 'fields')
+
+    def __init__(self, text: str):
+        self.text = text
+        self.fields = frozenset(name for _, name, _, _ in Formatter().parse(text) if name)
+
+
+def compile_translations(translations: dict) -> tuple:
+    """
+    Precompile translations into lookup tables used on every update.
+
+    Builds, per interface language, the parsed format templates and a reverse
+    index from menu text to action. Button texts map to their translation key,
+    OCR language names map to 'ocr_language' with the Tesseract code as value.
+
+    :param translations: Validated translations dictionary
+    :return: Tuple (templates, menu_index)
+    """
+    templates = {}
+    menu_index = {}
+    for lang, lang_data in translations.items():
+        templates[lang] = {key: _Template(text) for key, text in lang_data.items() if isinstance(text, str)}
+
+        index = {text: (key, key) for key, text in lang_data.items() if key.startswith('btn_')}
+        for name, ocr_code in lang_data.get('ocr_languages', {}).items():
+            index.setdefault(name, ('ocr_language', ocr_code))
+        menu_index[lang] = index
+
+    logger.debug('Translations compiled: %d languages', len(templates))
+    return templates, menu_index
+
+
 def get_text(lang_code: str, key: str, **kwargs) -> str:
     """
     Get localized text by key
@@ -83,15 +120,34 @@ def get_text(lang_code: str, key: str, **kwargs) -> str:
     :param kwargs: Format arguments for the string
     :return: Localized string
     """
-    text = TRANSLATIONS.get(lang_code, TRANSLATIONS['uk']).get(key, key)
-    if text == key:
+    template = _TEMPLATES.get(lang_code, _DEFAULT_TEMPLATES).get(key)
+    if template is None:
         logger.warning("Translation key '%s' not found for language '%s'", key, lang_code)
-    if kwargs:
-        try:
-            text = text.format(**kwargs)
-        except KeyError as e:
-            logger.error("Missing format argument %s for key '%s'", e, key)
-    return text
+        return key
+    if not kwargs or not template.fields:
+        return template.text
+    try:
+        return template.text.format(**kwargs)
+    except KeyError as e:
+        logger.error("Missing format argument %s for key '%s'", e, key)
+        return template.text
+
+
+def get_menu_action(lang_code: str, text: str) -> tuple:
+    """
+    Resolve menu text to an action with a single lookup in the precompiled index.
+
+    Falls back to a case-insensitive lookup so typed OCR language names still match.
+
+    :param lang_code: Language code ('uk' or 'en')
+    :param text: Text of the incoming message
+    :return: Tuple (action, value), or (None, None) if the text is not a menu item
+    """
+    index = _MENU_INDEX.get(lang_code, _DEFAULT_MENU_INDEX)
+    action = index.get(text)
+    if action is None and text:
+        action = index.get(text.lower())
+    return action or _NO_ACTION
 
 
 def get_supported_languages(lang_code: str) -> dict:
@@ -120,3 +176,7 @@ def get_all_translations_for_key(key: str) -> set:
 
 
 TRANSLATIONS = load_translations()
+_TEMPLATES, _MENU_INDEX = compile_translations(TRANSLATIONS)
+_DEFAULT_TEMPLATES = _TEMPLATES['uk']
+_DEFAULT_MENU_INDEX = _MENU_INDEX['uk']
+_NO_ACTION = (None, None)
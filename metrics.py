@@ -0,0 +1,67 @@
+"""
+In-process timing metrics.
+
+Keeps the latest METRICS_WINDOW samples of each named timing and summarizes
+them as count, mean and percentiles. Used to compare OCR profiles and to
+report what the bot spends its time on, without an external metrics system.
+"""
+import logging
+from collections import defaultdict, deque
+
+from consts import METRICS_WINDOW
+
+logger = logging.getLogger(__name__)
+
+
+class Timings:
+    """
+    Bounded samples of named durations.
+    """
+
+    def __init__(self, window: int = METRICS_WINDOW):
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._counts = defaultdict(int)
+
+    def observe(self, name: str, seconds: float):
+        """
+        Record one duration.
+
+        :param name: Metric name, e.g. 'ocr.profile.fast'
+        :param seconds: Duration in seconds
+        """
+        self._samples[name].append(seconds)
+        self._counts[name] += 1
+
+    def summary(self) -> dict:
+        """
+        :return: Dictionary of metric name to count, mean, p50 and p95 in seconds
+        """
+        result = {}
+        for name, samples in self._samples.items():
+            ordered = sorted(samples)
+            result[name] = {
+                'count': self._counts[name],
+                'mean': sum(ordered) / len(ordered),
+                'p50': ordered[(len(ordered) - 1) // 2],
+                'p95': ordered[int((len(ordered) - 1) * 0.95)],
+            }
+        return result
+
+    def log_summary(self):
+        """
+        Log the summary of every metric.
+        """
+        for name, stats in sorted(self.summary().items()):
+            logger.info('%s: %d samples, mean %.3fs, p50 %.3fs, p95 %.3fs',
+                        name, stats['count'], stats['mean'], stats['p50'], stats['p95'])
+
+
+# Process-wide timings
+TIMINGS = Timings()
+
+
+def observe(name: str, seconds: float):
+    """
+    Record one duration in the process-wide timings.
+    """
+    TIMINGS.observe(name, seconds)
@@ -0,0 +1,677 @@
+"""
+Tesseract OCR of single images.
+
+Runs Tesseract for the OCR profiles, with one process call writing both the
+text and the word data so every result comes with its mean word confidence.
+Adaptive profiles re-run low-confidence blocks at a larger scale. Very tall
+or very large images are cut into strips along blank rows and recognized in
+parallel, while small images of a document are staged and recognized several
+at a time in one Tesseract run (_ImageBatch).
+
+Format backends are imported on first use (see BACKENDS).
+"""
+import os
+import shlex
+import subprocess
+import tempfile
+import logging
+import importlib
+import threading
+import contextlib
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+
+from consts import (TILING_ENABLED, TILE_MIN_HEIGHT, TILE_MIN_PIXELS, TILE_HEIGHT, TILE_OVERLAP, TILE_SEARCH_WINDOW,
+                    TILE_GAP_THRESHOLD, TILE_PROFILE_WIDTH, TILE_MAX_OVERLAP_LINES, TILE_MAX_WORKERS, OCR_PROFILES,
+                    DEFAULT_OCR_PROFILE, ADAPTIVE_MIN_CONFIDENCE, ADAPTIVE_MAX_RERUNS, ADAPTIVE_RERUN_PADDING,
+                    ADAPTIVE_MIN_TEXT_HEIGHT, ADAPTIVE_MAX_UPSCALE, OCR_DIRECT_INPUT, DIRECT_INPUT_FORMATS,
+                    DIRECT_INPUT_MODES, OCR_BATCHING, OCR_BATCH_MAX_PIXELS, OCR_BATCH_SIZE)
+from ocr_result import DocumentResult, SOURCE_TEXT, SOURCE_IMAGE, SOURCE_ERROR
+
+logger = logging.getLogger(__name__)
+
+# Path to the Tesseract executable for Docker environment
+TESSERACT_CMD = '/usr/bin/tesseract'
+
+# For local run on Windows, uncomment and set the correct path to tesseract.exe
+# TESSERACT_CMD = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+
+# Format backends, imported on first use to keep startup and worker spawn fast
+BACKENDS = ('fitz', 'docx', 'PIL.Image', 'pytesseract')
+
+
+@lru_cache(maxsize=None)
+def _backend(name):
+    """
+    Import a format backend on first use.
+
+    :param name: Module name from BACKENDS
+    :return: Imported module
+    """
+    module = importlib.import_module(name)
+    if name == 'pytesseract':
+        module.pytesseract.tesseract_cmd = TESSERACT_CMD
+    logger.debug('Backend %s loaded', name)
+    return module
+
+
+def preload_backends():
+    """
+    Import all format backends up front, e.g. in OCR worker processes.
+    """
+    for name in BACKENDS:
+        _backend(name)
+
+
+@lru_cache(maxsize=None)
+def tesseract_config(profile: str = DEFAULT_OCR_PROFILE, psm: int = None) -> str:
+    """
+    Build Tesseract command line options for an OCR profile.
+
+    A profile whose model directory is not installed falls back to the default models.
+
+    :param profile: Name from OCR_PROFILES
+    :param psm: Page segmentation mode overriding the profile's
+    :return: Options string for pytesseract's config argument
+    """
+    settings = OCR_PROFILES[profile]
+    options = []
+    tessdata_dir = settings.get('tessdata_dir')
+    if tessdata_dir:
+        if os.path.isdir(tessdata_dir):
+            options.append(f'--tessdata-dir {tessdata_dir}')
+        else:
+            logger.warning('Models of OCR profile %s not found in %s, using default models', profile, tessdata_dir)
+    if settings.get('oem') is not None:
+        options.append(f"--oem {settings['oem']}")
+    if psm is None:
+        psm = settings.get('psm')
+    if psm is not None:
+        options.append(f'--psm {psm}')
+    return ' '.join(options)
+
+
+class RerunBudget:
+    """
+    Block re-runs an adaptive OCR job may still make.
+
+    Shared by all images recognized in one process and by the threads of a
+    tiled image. A job recognized by several worker processes gives each of
+    them a share of its budget (see split_reruns).
+    """
+
+    def __init__(self, limit: int = ADAPTIVE_MAX_RERUNS):
+        self.limit = limit
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return {'limit': self.limit, 'used': self.used}
+
+    def __setstate__(self, state):
+        self.__init__(state['limit'])
+        self.used = state['used']
+
+    def take(self) -> bool:
+        """
+        :return: True if one more re-run is allowed, counting it
+        """
+        with self._lock:
+            if self.used >= self.limit:
+                return False
+            self.used += 1
+            return True
+
+
+class _TextBlock:
+    """
+    Words of one Tesseract text block with their confidences and bounding box.
+    """
+    __slots__ = ('lines', 'confidences', 'heights', 'box')
+
+    def __init__(self):
+        self.lines = {}
+        self.confidences = []
+        self.heights = []
+        self.box = None
+
+    def add(self, word: str, confidence: float, line_key: tuple, left: int, top: int, width: int, height: int):
+        """
+        Add a word and grow the block's bounding box to include it.
+
+        :param line_key: Tuple (paragraph number, line number) of the word within the block
+        """
+        self.lines.setdefault(line_key, []).append(word)
+        self.confidences.append(confidence)
+        self.heights.append(height)
+        box = (left, top, left + width, top + height)
+        if self.box is None:
+            self.box = box
+        else:
+            self.box = (min(self.box[0], box[0]), min(self.box[1], box[1]),
+                        max(self.box[2], box[2]), max(self.box[3], box[3]))
+
+    @property
+    def confidence(self) -> float:
+        """
+        :return: Mean confidence of the block's words
+        """
+        return sum(self.confidences) / len(self.confidences)
+
+    def text(self) -> str:
+        """
+        :return: Text of the block, with its paragraphs separated by blank lines
+        """
+        lines = []
+        paragraph = None
+        for (par_num, _), words in self.lines.items():
+            if paragraph is not None and par_num != paragraph:
+                lines.append('')
+            paragraph = par_num
+            lines.append(' '.join(words))
+        return '\n'.join(lines)
+
+
+def _read_blocks(data: dict) -> list:
+    """
+    Group pytesseract image_to_data output into text blocks.
+
+    :param data: image_to_data result as a dictionary
+    :return: _TextBlock objects with at least one word, in reading order
+    """
+    blocks = {}
+    for i, word in enumerate(data['text']):
+        confidence = float(data['conf'][i])
+        if confidence < 0 or not word.strip():
+            continue
+        block = blocks.setdefault((data['page_num'][i], data['block_num'][i]), _TextBlock())
+        block.add(word, confidence, (data['par_num'][i], data['line_num'][i]),
+                  data['left'][i], data['top'][i], data['width'][i], data['height'][i])
+    return list(blocks.values())
+
+
+def _run_tesseract(source: str, lang, config, output='txt', data: bytes = None, output_base='stdout') -> str:
+    """
+    Run the Tesseract binary, by default with its output on stdout, without temporary files.
+
+    :param source: Image path, path of a text file listing image paths, or 'stdin'
+    :param output: Tesseract output formats separated by spaces, e.g. 'txt', 'tsv' or 'txt tsv'
+    :param data: Encoded image, e.g. PNG or JPEG bytes, piped through stdin
+    :param output_base: Path the output files are written to without their extensions, 'stdout' to return the output
+    :return: Tesseract's output on stdout
+    """
+    pytesseract = _backend('pytesseract')
+    args = [pytesseract.pytesseract.tesseract_cmd, source, output_base, '-l', lang, *shlex.split(config)]
+    if output != 'txt':
+        args.extend(output.split())
+    proc = subprocess.run(args, input=data, capture_output=True, check=False)
+    if proc.returncode:
+        raise pytesseract.TesseractError(proc.returncode, proc.stderr.decode('utf-8', 'replace').strip())
+    return proc.stdout.decode('utf-8')
+
+
+def _mean_confidence(data: dict, page: int = None):
+    """
+    :param data: image_to_data result as a dictionary
+    :param page: Only count the words of this 1-based page, e.g. one image of a batched run
+    :return: Mean confidence (0-100) of the recognized words, None if there are none
+    """
+    confidences = [float(confidence) for i, confidence in enumerate(data.get('conf', ()))
+                   if float(confidence) >= 0 and str(data['text'][i]).strip()
+                   and (page is None or data['page_num'][i] == page)]
+    return sum(confidences) / len(confidences) if confidences else None
+
+
+def _read_outputs(output_base: str) -> tuple:
+    """
+    :param output_base: Output path of a Tesseract run with the 'txt tsv' outputs
+    :return: Tuple (text, word data as a dictionary)
+    """
+    with open(f'{output_base}.txt', encoding='utf-8') as f:
+        text = f.read()
+    with open(f'{output_base}.tsv', encoding='utf-8') as f:
+        data = _backend('pytesseract').pytesseract.file_to_dict(f.read(), '\t', -1)
+    return text, data
+
+
+def split_reruns(parts: int, limit: int = ADAPTIVE_MAX_RERUNS) -> list:
+    """
+    Split a job's block re-run budget between parts recognized separately.
+
+    :param parts: Number of parts, e.g. files or page batches
+    :param limit: Re-runs of the whole job
+    :return: Re-run limit of each part; the first parts get one more when the limit does not divide evenly
+    """
+    return [limit // parts + (index < limit % parts) for index in range(parts)]
+
+
+def _run_engine(source, lang, config, data=False):
+    """
+    Run Tesseract on a PIL image, an image file path or encoded image bytes.
+
+    PIL images are encoded to a temporary file the way pytesseract does it;
+    paths are read by Tesseract itself and bytes are piped through stdin.
+    Text comes with the mean word confidence from the same run, which also
+    writes its word data.
+
+    :param source: PIL image, path or bytes
+    :param data: Return word data (image_to_data) instead of text
+    :return: Tuple (text, mean word confidence or None) or image_to_data result as a dictionary
+    """
+    pytesseract = _backend('pytesseract')
+    if data:
+        if isinstance(source, bytes):
+            output = _run_tesseract('stdin', lang, config, 'tsv', source)
+            return pytesseract.pytesseract.file_to_dict(output, '\t', -1)
+        return pytesseract.image_to_data(source, lang=lang, config=config, output_type=pytesseract.Output.DICT)
+
+    with tempfile.TemporaryDirectory(prefix='ocr_run_') as temp_dir:
+        output_base = os.path.join(temp_dir, 'output')
+        if isinstance(source, bytes):
+            _run_tesseract('stdin', lang, config, 'txt tsv', source, output_base)
+        else:
+            # Images are prepared and saved like pytesseract does, paths are passed through
+            with pytesseract.pytesseract.save(source) as (_, input_path):
+                _run_tesseract(input_path, lang, config, 'txt tsv', output_base=output_base)
+        text, words = _read_outputs(output_base)
+    return text, _mean_confidence(words)
+
+
+def _rerun_block(image, block: _TextBlock, lang, settings: dict) -> tuple:
+    """
+    OCR a low-confidence block again with heavier preprocessing and the profile's re-run settings.
+
+    The block is cropped with ADAPTIVE_RERUN_PADDING, converted to grayscale,
+    contrast-stretched, upscaled if its text is small and median-filtered.
+
+    :return: Tuple (text, mean word confidence, 0 if nothing was recognized)
+    """
+    pil = _backend('PIL.Image')
+    filters = importlib.import_module('PIL.ImageFilter')
+    ops = importlib.import_module('PIL.ImageOps')
+
+    left, top, right, bottom = block.box
+    crop = image.crop((max(0, left - ADAPTIVE_RERUN_PADDING), max(0, top - ADAPTIVE_RERUN_PADDING),
+                       min(image.width, right + ADAPTIVE_RERUN_PADDING),
+                       min(image.height, bottom + ADAPTIVE_RERUN_PADDING)))
+    crop = ops.autocontrast(crop.convert('L'), cutoff=1)
+    text_height = sorted(block.heights)[len(block.heights) // 2]
+    scale = min(ADAPTIVE_MAX_UPSCALE, -(-ADAPTIVE_MIN_TEXT_HEIGHT // max(1, text_height)))
+    if scale > 1:
+        crop = crop.resize((crop.width * scale, crop.height * scale), pil.Resampling.LANCZOS)
+    crop = crop.filter(filters.MedianFilter(3))
+
+    data = _run_engine(crop, lang, tesseract_config(settings['rerun_profile'], settings.get('rerun_psm')), data=True)
+    blocks = _read_blocks(data)
+    confidences = [confidence for rerun in blocks for confidence in rerun.confidences]
+    if not confidences:
+        return '', 0
+    return '\n'.join(rerun.text() for rerun in blocks), sum(confidences) / len(confidences)
+
+
+def _recognize_adaptive(image, lang, profile, reruns: RerunBudget, source=None) -> tuple:
+    """
+    OCR an image with the profile's fast settings, re-running blocks below ADAPTIVE_MIN_CONFIDENCE.
+
+    A re-run replaces the block text only if it is more confident. Once the
+    job's re-run budget is spent, the first pass text is kept as is. The
+    image is only decoded here if a block is re-run. The confidence of each
+    block's kept text, weighted by its words, gives the image's confidence.
+
+    :param image: PIL image
+    :param lang: language for OCR
+    :param profile: OCR profile with 'rerun_profile' settings
+    :param reruns: Re-run budget of the job
+    :param source: Path or encoded bytes of the image for the first pass, the image itself by default
+    :return: Tuple (extracted text, mean confidence of the kept block texts or None)
+    """
+    settings = OCR_PROFILES[profile]
+    data = _run_engine(image if source is None else source, lang, tesseract_config(profile), data=True)
+    texts = []
+    weighted = 0.0
+    words = 0
+    for block in _read_blocks(data):
+        text, confidence = block.text(), block.confidence
+        if confidence < ADAPTIVE_MIN_CONFIDENCE and reruns.take():
+            rerun_text, rerun_confidence = _rerun_block(image, block, lang, settings)
+            logger.debug('Re-ran block with confidence %.0f, new confidence %.0f', confidence, rerun_confidence)
+            if rerun_confidence > confidence:
+                text, confidence = rerun_text, rerun_confidence
+        texts.append(text)
+        weighted += confidence * len(block.confidences)
+        words += len(block.confidences)
+    if not texts:
+        return '', None
+    return '\n\n'.join(texts) + '\n', weighted / words
+
+
+def _image_to_text(image, lang, profile, reruns: RerunBudget = None, source=None) -> tuple:
+    """
+    OCR a PIL image with the profile's settings.
+
+    :param reruns: Re-run budget of the job, used by adaptive profiles
+    :param source: Path or encoded bytes of the undecoded image Tesseract reads instead of the PIL image
+    :return: Tuple (extracted text, mean word confidence or None)
+    """
+    if OCR_PROFILES[profile].get('rerun_profile'):
+        return _recognize_adaptive(image, lang, profile, reruns or RerunBudget(), source)
+    return _run_engine(image if source is None else source, lang, tesseract_config(profile))
+
+
+def _reads_directly(image) -> bool:
+    """
+    :param image: PIL image, opened but not necessarily decoded
+    :return: True if Tesseract can read the image's original encoding the way PIL would decode it
+    """
+    return (OCR_DIRECT_INPUT and image.format in DIRECT_INPUT_FORMATS and image.mode in DIRECT_INPUT_MODES
+            and 'transparency' not in image.info and getattr(image, 'n_frames', 1) == 1)
+
+
+def _ocr_errors() -> tuple:
+    """
+    :return: Exception types raised by image decoding and Tesseract
+    """
+    return OSError, _backend('PIL.Image').UnidentifiedImageError, _backend('pytesseract').TesseractError
+
+
+def _find_strip_cuts(image) -> list:
+    """
+    Choose rows where a tall image is cut into strips.
+
+    Builds a row-projection profile of edge energy on a narrowed grayscale copy,
+    so blank rows are found regardless of text polarity, and cuts each strip at
+    the blank row closest to TILE_HEIGHT within TILE_SEARCH_WINDOW.
+
+    :param image: PIL image
+    :return: Sorted list of cut rows, excluding 0 and the image height
+    """
+    pil = _backend('PIL.Image')
+    filters = importlib.import_module('PIL.ImageFilter')
+    width, height = image.size
+
+    narrow = image.convert('L').resize((min(width, TILE_PROFILE_WIDTH), height), pil.Resampling.BOX)
+    edges = narrow.filter(filters.FIND_EDGES)
+    profile = edges.resize((1, height), pil.Resampling.BOX).tobytes()
+
+    cuts = []
+    position = 0
+    while height - position > TILE_HEIGHT + TILE_SEARCH_WINDOW:
+        target = position + TILE_HEIGHT
+        low = max(position + TILE_HEIGHT // 2, target - TILE_SEARCH_WINDOW)
+        high = min(height - 1, target + TILE_SEARCH_WINDOW)
+        cut = target
+        for offset in range(0, high - low + 1):
+            # Check rows alternately below and above the target
+            for row in (target + offset, target - offset):
+                if low <= row <= high and profile[row] <= TILE_GAP_THRESHOLD:
+                    cut = row
+                    break
+            else:
+                continue
+            break
+        cuts.append(cut)
+        position = cut
+    return cuts
+
+
+def _merge_strip_texts(texts) -> str:
+    """
+    Join strip texts, dropping lines repeated in the overlap between neighbouring strips.
+
+    :param texts: Recognized text of each strip, top to bottom
+    :return: Merged text
+    """
+    merged = []
+    for text in texts:
+        lines = text.splitlines()
+        tail = [line.strip() for line in merged[-TILE_MAX_OVERLAP_LINES:] if line.strip()]
+        head = [line.strip() for line in lines[:TILE_MAX_OVERLAP_LINES * 2] if line.strip()]
+        for size in range(min(len(tail), len(head)), 0, -1):
+            if tail[-size:] == head[:size]:
+                # Skip the duplicated non-empty lines at the top of this strip
+                skipped = 0
+                while skipped < size:
+                    if lines.pop(0).strip():
+                        skipped += 1
+                break
+        merged.extend(lines)
+    return '\n'.join(merged) + '\n' if merged else ''
+
+
+@contextlib.contextmanager
+def _omp_thread_limit(threads):
+    """
+    Set OMP_THREAD_LIMIT for Tesseract processes started in the block, restoring it afterwards.
+
+    :param threads: Thread limit, None leaves the environment unchanged
+    """
+    previous = os.environ.get('OMP_THREAD_LIMIT')
+    if threads:
+        os.environ['OMP_THREAD_LIMIT'] = str(threads)
+    try:
+        yield
+    finally:
+        if threads and previous is not None:
+            os.environ['OMP_THREAD_LIMIT'] = previous
+        elif threads:
+            del os.environ['OMP_THREAD_LIMIT']
+
+
+def _recognize_tiled(image, lang, profile=DEFAULT_OCR_PROFILE, reruns=None):
+    """
+    OCR a tall image as overlapping horizontal strips in parallel.
+
+    The job's OMP_THREAD_LIMIT, set by the worker pool, bounds the strips OCR'd
+    at once and is split between them.
+
+    :param image: PIL image
+    :param lang: language for OCR
+    :param profile: OCR profile name
+    :param reruns: RerunBudget of the job for adaptive profiles
+    :return: Tuple (extracted text, mean confidence of the strips or None)
+    """
+    width, height = image.size
+    cuts = _find_strip_cuts(image)
+    bounds = zip([0] + cuts, cuts + [height])
+    boxes = [(0, max(0, top - TILE_OVERLAP), width, min(height, bottom + TILE_OVERLAP)) for top, bottom in bounds]
+    logger.debug('Tiling %sx%s image into %d strips', width, height, len(boxes))
+
+    image.load()
+    if reruns is None:
+        # One budget for all strips
+        reruns = RerunBudget()
+    threads = int(os.environ.get('OMP_THREAD_LIMIT') or 0)
+    parallel = min(TILE_MAX_WORKERS, threads) if threads else TILE_MAX_WORKERS
+    with _omp_thread_limit(threads // parallel if threads else None), \
+            ThreadPoolExecutor(max_workers=parallel) as executor:
+        strips = list(executor.map(lambda box: _image_to_text(image.crop(box), lang, profile, reruns), boxes))
+    confidences = [confidence for _, confidence in strips if confidence is not None]
+    return (_merge_strip_texts([text for text, _ in strips]),
+            sum(confidences) / len(confidences) if confidences else None)
+
+
+def _needs_tiling(image) -> bool:
+    """
+    :param image: PIL image
+    :return: True if the image is tall or large enough to be OCR'd in strips
+    """
+    width, height = image.size
+    if height < TILE_HEIGHT * 2:
+        return False
+    return height > TILE_MIN_HEIGHT or width * height > TILE_MIN_PIXELS
+
+
+def recognize_text_from_image(image_path, lang='eng', profile=DEFAULT_OCR_PROFILE, reruns=None, source=None):
+    """
+    Function to extract text from an image using Tesseract OCR
+
+    Very tall or very large images are cut into strips along blank rows and
+    OCR'd in parallel when TILING_ENABLED is set. Adaptive profiles re-run
+    low-confidence blocks within the job's re-run budget. Otherwise images in
+    a format Tesseract reads are handed over undecoded (see OCR_DIRECT_INPUT).
+
+    :param image_path: path to the image file or PIL Image object
+    :param lang: language for OCR
+    :param profile: OCR profile name from OCR_PROFILES
+    :param reruns: RerunBudget shared by the images of a job, a new one by default
+    :param source: Path or encoded bytes a PIL Image object was opened from, if it was not transformed
+    :return: Tuple (extracted text, mean word confidence or None if no words were recognized)
+    """
+    if isinstance(image_path, str):
+        # Only reads the header, the pixels are decoded on first use
+        with _backend('PIL.Image').open(image_path) as image:
+            return recognize_text_from_image(image, lang, profile, reruns, image_path)
+    image = image_path
+    if TILING_ENABLED and _needs_tiling(image):
+        return _recognize_tiled(image, lang, profile, reruns)
+    if source is not None and not _reads_directly(image):
+        source = None
+    return _image_to_text(image, lang, profile, reruns, source)
+
+
+class _PendingImage:
+    """
+    Small image staged on disk for a batched Tesseract run.
+    """
+    __slots__ = ('path',)
+
+    def __init__(self, path: str):
+        self.path = path
+
+
+class _ImageBatch:
+    """
+    Ordered builder of a DocumentResult that OCRs small images in shared Tesseract runs.
+
+    Small images are staged in a temporary directory and recognized OCR_BATCH_SIZE
+    at a time by passing Tesseract a file listing them; its text output separates
+    the images with form feeds. Text added while images are pending is held back,
+    so the document keeps its order. If a batched run fails, its images are
+    recognized one by one, so errors are still reported per image.
+    """
+
+    def __init__(self, result: DocumentResult, lang, profile=DEFAULT_OCR_PROFILE, reruns=None):
+        self.result = result
+        self.lang = lang
+        self.profile = profile
+        self.reruns = reruns
+        self.enabled = OCR_BATCHING and not OCR_PROFILES[profile].get('rerun_profile')
+        self._pieces = []
+        self._pending = []
+        # Owns the staging directory, created by the first staged image
+        self._cleanup = contextlib.ExitStack()
+        self._temp_dir = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        with self._cleanup:
+            if exc_type is None:
+                self.flush()
+
+    def add(self, text: str, source: str = SOURCE_TEXT, page=None, image=None, confidence=None):
+        """
+        Append text to the document after the images queued before it.
+        """
+        if self._pending:
+            self._pieces.append((text, source, page, image, confidence))
+        else:
+            self.result.add(text, source, page, image, confidence)
+
+    def add_error(self, message: str, page=None, image=None):
+        """
+        Append an error note after the images queued before it.
+        """
+        self.add(message, SOURCE_ERROR, page, image)
+
+    def add_image(self, recognized, label: str, page=None, image=None, suffix: str = ''):
+        """
+        Append the text of an OCR'd image, or queue a staged one.
+
+        :param recognized: Tuple (text, confidence) or _PendingImage from recognize()
+        :param label: Image description for error notes, e.g. 'on page 3'
+        :param suffix: Appended to the recognized text
+        """
+        if not isinstance(recognized, _PendingImage):
+            text, confidence = recognized
+            self.add(text + suffix, SOURCE_IMAGE, page, image, confidence)
+            return
+        self._pending.append(recognized)
+        self._pieces.append((recognized, label, page, image, suffix))
+        if len(self._pending) >= OCR_BATCH_SIZE:
+            self.flush()
+
+    def recognize(self, image, source=None):
+        """
+        OCR an image now, or stage it for a batched run if it is small.
+
+        :param image: PIL image
+        :param source: Path or encoded bytes the image was opened from, if it was not transformed
+        :return: Tuple (text, confidence) or _PendingImage
+        """
+        width, height = image.size
+        if not self.enabled or width * height > OCR_BATCH_MAX_PIXELS:
+            return recognize_text_from_image(image, self.lang, self.profile, self.reruns, source)
+        if self._temp_dir is None:
+            self._temp_dir = self._cleanup.enter_context(tempfile.TemporaryDirectory(prefix='ocr_batch_'))
+        if isinstance(source, str) and _reads_directly(image):
+            return _PendingImage(source)
+        if isinstance(source, bytes) and _reads_directly(image):
+            path = os.path.join(self._temp_dir, f'{len(self._pending)}.{image.format.lower()}')
+            with open(path, 'wb') as f:
+                f.write(source)
+            return _PendingImage(path)
+        # Transparency is replaced with white the way pytesseract does it
+        prepared, _ = _backend('pytesseract').pytesseract.prepare(image)
+        path = os.path.join(self._temp_dir, f'{len(self._pending)}.png')
+        prepared.save(path, format='PNG')
+        return _PendingImage(path)
+
+    def _run(self) -> list:
+        """
+        :return: Tuples (text, confidence) of the pending images from one Tesseract run,
+            None for each image if they have to be recognized one by one
+        """
+        list_path = os.path.join(self._temp_dir, 'images.txt')
+        output_base = os.path.join(self._temp_dir, 'output')
+        with open(list_path, 'w', encoding='utf-8') as f:
+            f.write(''.join(f'{pending.path}\n' for pending in self._pending))
+        try:
+            _run_tesseract(list_path, self.lang, tesseract_config(self.profile), 'txt tsv', output_base=output_base)
+            text, words = _read_outputs(output_base)
+        except _ocr_errors() as e:
+            logger.warning('Batched OCR of %d images failed, recognizing them one by one: %s', len(self._pending), e)
+            return [None] * len(self._pending)
+        # Every image's text ends with a form feed, so the last part is empty
+        pages = text.split('\f')
+        if len(pages) != len(self._pending) + 1:
+            logger.warning('Batched OCR returned %d texts for %d images, recognizing them one by one',
+                           len(pages) - 1, len(self._pending))
+            return [None] * len(self._pending)
+        logger.debug('Recognized %d small images in one Tesseract run', len(self._pending))
+        return [(f'{page}\f', _mean_confidence(words, number)) for number, page in enumerate(pages[:-1], start=1)]
+
+    def flush(self):
+        """
+        Recognize the pending images and append everything held back.
+        """
+        if not self._pending:
+            return
+        texts = dict(zip(self._pending, self._run()))
+        pieces, self._pieces, self._pending = self._pieces, [], []
+        for piece in pieces:
+            if not isinstance(piece[0], _PendingImage):
+                self.result.add(*piece)
+                continue
+            pending, label, page, image, suffix = piece
+            recognized = texts[pending]
+            if recognized is None:
+                try:
+                    recognized = recognize_text_from_image(pending.path, self.lang, self.profile, self.reruns)
+                except _ocr_errors() as e:
+                    logger.error('Error processing image %s in %s: %s', label, self.result.name, e)
+                    self.result.add_error(f'\n[Error processing image {label}: {e}]\n', page=page, image=image)
+                    continue
+            text, confidence = recognized
+            self.result.add(text + suffix, SOURCE_IMAGE, page, image, confidence)
@@ -0,0 +1,522 @@
+"""
+OCR worker pool.
+
+Each worker is a single-process executor, and jobs go to the least busy
+worker. Tesseract runs as a new process for every call, so no model stays
+loaded in a worker between jobs and any worker serves any language equally
+well. The traineddata files of the common languages are read into the shared
+OS page cache once at start instead.
+
+The pool is sized from the container's CPU quota, and every job is given an
+OpenMP thread limit for Tesseract from the number of busy workers when it
+starts (see resources.ConcurrencyPlan).
+
+Jobs take file paths, never decoded pixels: images and PDF pages are
+extracted and decoded inside the worker that recognizes them, and only text
+comes back. Keep it that way for new jobs, since a pickled page image costs
+megabytes per call while a path costs bytes and the file stays in the page cache.
+
+Workers send their log records to the parent over a queue, where they are
+handled by the parent's loggers like its own records.
+
+A worker process that dies, e.g. from a crash in a native backend or the OOM
+killer, breaks its executor. The worker is replaced with a new process and
+its jobs are retried up to OCR_CRASH_RETRIES times; a broken worker is never
+picked for a job.
+"""
+import os
+import time
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from logging.handlers import QueueHandler, QueueListener
+
+from consts import (OCR_WORKERS, OCR_PREWARM_LANGS, TESSDATA_DIR, OCR_PRELOAD_BACKENDS, OCR_MEMORY_BUDGET_MB,
+                    OCR_THROTTLE_INTERVAL, OCR_SPECULATIVE_SLOTS, OCR_CRASH_RETRIES)
+from ocr_engine import preload_backends
+from resources import MemoryBudget, ConcurrencyPlan, current_rss
+from metrics import observe
+
+logger = logging.getLogger(__name__)
+
+_worker_budget = MemoryBudget(OCR_MEMORY_BUDGET_MB)
+
+
+def split_lang(lang: str) -> tuple:
+    """
+    Split a Tesseract language string into individual model codes.
+
+    :param lang: Language string, e.g. 'ukr+eng'
+    :return: Tuple of model codes, e.g. ('ukr', 'eng')
+    """
+    return tuple(code for code in lang.split('+') if code)
+
+
+def find_tessdata_dir():
+    """
+    Locate the directory that holds Tesseract traineddata files.
+
+    :return: Directory path or None if it cannot be found
+    """
+    candidates = [
+        TESSDATA_DIR,
+        os.getenv('TESSDATA_PREFIX'),
+        '/usr/share/tesseract-ocr/5/tessdata',
+        '/usr/share/tesseract-ocr/4.00/tessdata',
+        '/usr/share/tessdata',
+    ]
+    for candidate in candidates:
+        if candidate and os.path.isdir(candidate):
+            return candidate
+    return None
+
+
+def prewarm_models(tessdata_dir, langs) -> list:
+    """
+    Read the traineddata files of common languages into the OS page cache.
+
+    Tesseract runs as a new process for every call and maps its models from
+    disk each time, so the page cache, shared by all processes, is the only
+    place where a loaded model survives between jobs.
+
+    :param tessdata_dir: Directory with traineddata files
+    :param langs: Tesseract language strings, e.g. ('ukr', 'eng')
+    :return: Model codes whose files were found
+    """
+    warmed = []
+    for code in dict.fromkeys(code for lang in langs for code in split_lang(lang)):
+        path = os.path.join(tessdata_dir, f'{code}.traineddata')
+        try:
+            with open(path, 'rb') as f:
+                if hasattr(os, 'posix_fadvise'):
+                    os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+                else:
+                    while f.read(1024 * 1024):
+                        pass
+        except OSError as e:
+            logger.warning('Could not pre-warm model %s: %s', path, e)
+            continue
+        warmed.append(code)
+    return warmed
+
+
+class _ParentLogHandler(logging.Handler):
+    """
+    Hand records received from worker processes to the parent's logger of the same name.
+    """
+
+    def emit(self, record: logging.LogRecord):
+        logging.getLogger(record.name).handle(record)
+
+
+def _init_worker(preload, log_queue=None, log_level=logging.NOTSET):
+    """
+    Worker process initializer: send log records to the parent and import backends.
+
+    :param preload: Import format backends now instead of on first job
+    :param log_queue: Multiprocessing queue read by the parent, None to leave logging unconfigured
+    :param log_level: Lowest level sent to the parent
+    """
+    if log_queue is not None:
+        root_logger = logging.getLogger()
+        root_logger.handlers[:] = [QueueHandler(log_queue)]
+        root_logger.setLevel(log_level)
+    if preload:
+        preload_backends()
+
+
+def _ping():
+    """
+    No-op job used to force worker processes to start.
+    """
+    return os.getpid()
+
+
+def _run_in_worker(func, args, kwargs, threads=None):
+    """
+    Execute a job inside a worker.
+
+    :param threads: OpenMP thread limit for the Tesseract runs of the job, inherited by their processes
+    :return: Tuple (result of func, worker RSS in bytes after the job)
+    """
+    if threads:
+        os.environ['OMP_THREAD_LIMIT'] = str(threads)
+    result = func(*args, **kwargs)
+    # Releases memory back to the system when the worker went over budget
+    _worker_budget.exceeded()
+    return result, current_rss()
+
+
+class _Worker:
+    """
+    Parent-side handle for one worker process.
+    """
+
+    def __init__(self, index: int, executor: ProcessPoolExecutor):
+        self.index = index
+        self.executor = executor
+        self.pending = 0
+        self.speculative = 0
+        self.rss = 0
+        self.over_budget = False
+        self.broken = False  # The process died and could not be replaced yet
+
+    @property
+    def alive(self) -> bool:
+        """
+        False once the process died, also when it died between jobs.
+        """
+        # The executor's manager thread flags it as soon as its process exits
+        return not self.broken and not getattr(self.executor, '_broken', False)
+
+
+class SpeculativeJob:
+    """
+    Low-priority background job whose result may be needed later.
+
+    The job only starts on an idle worker and while the pool's speculative
+    slots allow it. Asking for its result promotes it to a normal job.
+    """
+
+    def __init__(self, pool, key, func, args, kwargs):
+        """
+        :param pool: OcrWorkerPool running the job
+        :param key: What the job computes, e.g. its OCR settings, so callers can tell if it is still usable
+        """
+        self.key = key
+        self._promoted = asyncio.Event()
+        run = pool._run_speculative  # pylint: disable=protected-access
+        self.task = asyncio.ensure_future(run(self, func, args, kwargs))
+        self.task.add_done_callback(self._retrieve_exception)
+
+    @staticmethod
+    def _retrieve_exception(task):
+        # Failures are reported to whoever awaits result(); abandoned jobs fail silently
+        if not task.cancelled():
+            task.exception()
+
+    @property
+    def promoted(self) -> bool:
+        """
+        :return: True once the job has been promoted to run as a normal job (see promote)
+        """
+        return self._promoted.is_set()
+
+    async def wait_promoted(self, timeout: float):
+        """
+        Wait until the job is promoted or the timeout expires.
+        """
+        try:
+            await asyncio.wait_for(self._promoted.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def promote(self):
+        """
+        Let the job run as a normal job if it has not started yet.
+        """
+        self._promoted.set()
+
+    async def result(self):
+        """
+        Promote the job to normal priority and wait for its result.
+        """
+        self.promote()
+        return await self.task
+
+    def cancel(self):
+        """
+        Cancel the job; a job already running in a worker finishes there and its result is dropped.
+        """
+        self.task.cancel()
+
+
+class OcrWorkerPool:
+    """
+    Pool of OCR worker processes.
+    """
+
+    def __init__(
+            self,
+            size=None,
+            prewarm_langs=OCR_PREWARM_LANGS,
+            preload=OCR_PRELOAD_BACKENDS
+    ):
+        """
+        :param size: Number of worker processes (defaults to OCR_WORKERS or the available CPUs)
+        :param prewarm_langs: Language strings whose models are read into the page cache at startup
+        :param preload: Import format backends when a worker starts
+        """
+        self.plan = ConcurrencyPlan(size or OCR_WORKERS)
+        self.size = self.plan.processes
+        self.prewarm_langs = tuple(prewarm_langs)
+        self.preload = preload
+        self.memory_limit = OCR_MEMORY_BUDGET_MB * 1024 * 1024 if OCR_MEMORY_BUDGET_MB else None
+        self.speculative_slots = OCR_SPECULATIVE_SLOTS or max(1, self.size // 2)
+        self._speculative_running = 0
+        self._workers = []
+        self._log_queue = None
+        self._log_listener = None
+        self._threads = None
+
+    def _spawn_worker(self, index: int) -> _Worker:
+        """
+        Start one worker process.
+        """
+        executor = ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(self.preload, self._log_queue, logging.getLogger().getEffectiveLevel())
+        )
+        executor.submit(_ping)
+        return _Worker(index, executor)
+
+    def start(self):
+        """
+        Spawn worker processes and pre-warm the common models.
+        """
+        if self._workers:
+            return
+
+        warmed = []
+        tessdata_dir = find_tessdata_dir()
+        if not tessdata_dir:
+            logger.warning('Tesseract data directory not found, models will not be pre-warmed')
+        else:
+            warmed = prewarm_models(tessdata_dir, self.prewarm_langs)
+
+        self._log_queue = multiprocessing.get_context('spawn').Queue()
+        self._log_listener = QueueListener(self._log_queue, _ParentLogHandler())
+        self._log_listener.start()
+        self._workers = [self._spawn_worker(index) for index in range(self.size)]
+
+        logger.info('OCR worker pool started: %d workers, pre-warmed models: %s',
+                    self.size, ', '.join(warmed) or '-')
+        logger.info('Concurrency plan: %s', self.plan)
+
+    def _recycle(self, worker: _Worker):
+        """
+        Replace an idle worker that stayed over its memory budget with a fresh process.
+        """
+        logger.warning('Recycling worker %d: RSS %d MB over budget', worker.index, worker.rss // (1024 * 1024))
+        worker.executor.shutdown(wait=False)
+        self._workers[self._workers.index(worker)] = self._spawn_worker(worker.index)
+
+    def _replace_broken(self, worker: _Worker):
+        """
+        Replace a worker whose process died with a fresh process.
+
+        A worker that cannot be replaced stays in the pool marked broken, and
+        replacing it is tried again before the next job is dispatched.
+        """
+        if worker not in self._workers:
+            return
+        retry = worker.broken
+        if not retry:
+            logger.error('OCR worker %d died, starting a new process', worker.index)
+            worker.broken = True
+            worker.executor.shutdown(wait=False, cancel_futures=True)
+        try:
+            replacement = self._spawn_worker(worker.index)
+        except (OSError, RuntimeError) as e:
+            logger.log(logging.DEBUG if retry else logging.ERROR, 'Could not start a new process for OCR worker %d: %s',
+                       worker.index, e)
+            return
+        self._workers[self._workers.index(worker)] = replacement
+
+    def _usable(self) -> list:
+        """
+        :return: Workers whose process is alive and within its memory budget
+        """
+        for worker in [w for w in self._workers if not w.alive]:
+            self._replace_broken(worker)
+        return [w for w in self._workers if w.alive and not w.over_budget]
+
+    def _pick_worker(self):
+        """
+        Choose the least busy worker for a job among workers within their memory budget.
+
+        Workers busy with speculative jobs are only used when no other worker is left.
+
+        :return: Worker or None if every worker is over budget or broken
+        """
+        available = self._usable()
+        if not available:
+            return None
+        available = [w for w in available if not w.speculative] or available
+        return min(available, key=lambda w: w.pending)
+
+    def _pick_idle_worker(self):
+        """
+        Choose an idle worker within its memory budget.
+
+        :return: Worker or None if no worker is idle
+        """
+        idle = [w for w in self._usable() if w.pending == 0]
+        return idle[0] if idle else None
+
+    def _job_done(self, worker: _Worker, speculative: bool, future):
+        """
+        Update worker accounting once a job has left the worker.
+        """
+        worker.pending -= 1
+        worker.speculative -= speculative
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            self._replace_broken(worker)
+        elif not future.cancelled() and future.exception() is None:
+            worker.rss = future.result()[1]
+            if self.memory_limit and worker.rss > self.memory_limit:
+                worker.over_budget = True
+        if worker.over_budget and worker.pending == 0 and worker in self._workers:
+            self._recycle(worker)
+
+    async def _dispatch(self, worker: _Worker, func, args, kwargs, speculative: bool = False):
+        """
+        Submit a job to a worker and wait for its result.
+
+        The worker counts as busy until the job really leaves the process, even
+        if the caller is cancelled while the job is already running.
+        """
+        threads = self._plan_threads(worker)
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            future = worker.executor.submit(_run_in_worker, func, args, kwargs, threads)
+        except BrokenProcessPool:
+            self._replace_broken(worker)
+            raise
+        worker.pending += 1
+        worker.speculative += speculative
+        future.add_done_callback(lambda f: loop.call_soon_threadsafe(self._job_done, worker, speculative, f))
+        result, _ = await asyncio.wrap_future(future)
+        observe(f'ocr.threads.{threads}', time.perf_counter() - started)
+        return result
+
+    def _plan_threads(self, worker: _Worker) -> int:
+        """
+        Choose the OpenMP thread limit of a job about to be submitted to a worker.
+
+        A job queued behind another one on the same worker does not add to the busy
+        workers. Running jobs keep their limit, so the CPUs may be oversubscribed
+        briefly when the queue fills up.
+        """
+        busy = sum(1 for w in self._workers if w.pending or w is worker)
+        threads = self.plan.threads(busy)
+        if threads != self._threads:
+            logger.debug('Concurrency plan: %d busy workers, %d threads per job', busy, threads)
+            self._threads = threads
+        return threads
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Run a job on the least busy worker.
+
+        :param func: Picklable callable executed in the worker
+        :return: Result of func
+        """
+        if not self._workers:
+            raise RuntimeError('OCR worker pool is not started')
+        return await self._run(func, args, kwargs, OCR_CRASH_RETRIES)
+
+    async def _run(self, func, args, kwargs, retries: int):
+        """
+        Run a job on the least busy worker, retrying it on a new process if its worker dies.
+
+        :param retries: Times the job may still be retried
+        """
+        while True:
+            worker = self._pick_worker()
+            while worker is None:
+                # Every worker is over its memory budget or broken: throttle until one is replaced
+                await asyncio.sleep(OCR_THROTTLE_INTERVAL)
+                worker = self._pick_worker()
+            try:
+                return await self._dispatch(worker, func, args, kwargs)
+            except BrokenProcessPool:
+                self._replace_broken(worker)
+                if retries <= 0:
+                    raise
+                retries -= 1
+                logger.warning('Retrying a job of dead OCR worker %d', worker.index)
+
+    def speculate(self, key, func, *args, **kwargs) -> SpeculativeJob:
+        """
+        Start a low-priority job whose result may be needed later.
+
+        Speculative jobs never queue behind or ahead of confirmed jobs: they wait
+        for an idle worker and a free speculative slot, so at most
+        speculative_slots workers are busy with them at any time.
+
+        :param key: What the job computes, kept as SpeculativeJob.key
+        :param func: Picklable callable executed in the worker
+        :return: SpeculativeJob
+        """
+        if not self._workers:
+            raise RuntimeError('OCR worker pool is not started')
+        return SpeculativeJob(self, key, func, args, kwargs)
+
+    async def _run_speculative(self, job: SpeculativeJob, func, args, kwargs):
+        """
+        Run a speculative job at low priority until it completes or is promoted.
+
+        A job whose worker died goes on as a normal job with one retry less.
+        """
+        retries = OCR_CRASH_RETRIES
+        while not job.promoted:
+            worker = self._pick_idle_worker() if self._speculative_running < self.speculative_slots else None
+            if worker is not None:
+                self._speculative_running += 1
+                try:
+                    return await self._dispatch(worker, func, args, kwargs, speculative=True)
+                except BrokenProcessPool:
+                    self._replace_broken(worker)
+                    if retries <= 0:
+                        raise
+                    retries -= 1
+                    logger.warning('Retrying a speculative job of dead OCR worker %d', worker.index)
+                    break
+                finally:
+                    self._speculative_running -= 1
+            await job.wait_promoted(OCR_THROTTLE_INTERVAL)
+        return await self._run(func, args, kwargs, retries)
+
+    def status(self) -> dict:
+        """
+        Snapshot of the pool state for health checks.
+
+        Workers found dead are replaced first, so dead workers are only reported
+        when no new process could be started for them.
+
+        :return: Dictionary with the number of live workers, live workers within their
+            memory budget, dead workers that could not be replaced, queued or running
+            jobs, running speculative jobs, the concurrency plan and the thread limit
+            given to the latest job
+        """
+        self._usable()
+        alive = [w for w in self._workers if w.alive]
+        return {
+            'workers': len(alive),
+            'available': sum(1 for w in alive if not w.over_budget),
+            'broken': len(self._workers) - len(alive),
+            'pending': sum(w.pending for w in self._workers),
+            'speculative': self._speculative_running,
+            'plan': self.plan.as_dict(),
+            'threads': self._threads,
+        }
+
+    def shutdown(self, wait: bool = True):
+        """
+        Stop all worker processes.
+
+        :param wait: Wait for running jobs to finish
+        """
+        for worker in self._workers:
+            worker.executor.shutdown(wait=wait, cancel_futures=not wait)
+        self._workers = []
+        if self._log_listener is not None:
+            self._log_listener.stop()
+            self._log_listener = None
+        logger.info('OCR worker pool stopped')
@@ -0,0 +1,242 @@
+"""
+Structured OCR results.
+
+A DocumentResult is built incrementally while a file is processed: every piece
+of text (a PDF text layer, an OCR'd image, an error note) is appended once and
+described by a small Block record with its offsets, page, source and
+confidence. Plain text, per-page text, TSV or hOCR are rendered only when a
+delivery path asks for them.
+"""
+from html import escape
+
+# Block sources
+SOURCE_TEXT = 'text'
+SOURCE_IMAGE = 'image'
+SOURCE_ERROR = 'error'
+
+# Output formats supported by DocumentResult.render and their file extensions
+RESULT_FORMATS = {
+    'text': '.txt',
+    'tsv': '.tsv',
+    'hocr': '.hocr',
+}
+
+TSV_COLUMNS = ('page', 'image', 'source', 'start', 'end', 'confidence', 'text')
+
+
+class Block:
+    """
+    One contiguous piece of a document's text.
+    """
+    __slots__ = ('page', 'image', 'source', 'start', 'end', 'confidence')
+
+    def __init__(self, page, image, source: str, start: int, end: int, confidence=None):
+        """
+        :param page: 1-based page number or None if the format has no pages
+        :param image: 1-based index of the image on the page/document, None for text layers
+        :param source: SOURCE_TEXT, SOURCE_IMAGE or SOURCE_ERROR
+        :param start: Start offset in the document text
+        :param end: End offset in the document text
+        :param confidence: Mean OCR confidence (0-100) or None if unknown
+        """
+        self.page = page
+        self.image = image
+        self.source = source
+        self.start = start
+        self.end = end
+        self.confidence = confidence
+
+
+class DocumentResult:
+    """
+    OCR result of one input file.
+    """
+    __slots__ = ('name', 'blocks', 'profile', 'seconds', 'skipped', 'page_count', '_parts', '_length', '_text')
+
+    def __init__(self, name: str):
+        """
+        :param name: Original file name
+        """
+        self.name = name
+        self.blocks = []
+        self.profile = None  # OCR profile the document was recognized with
+        self.seconds = 0.0  # Recognition time in the worker
+        self.skipped = 0  # Embedded images skipped by triage as text-free
+        self.page_count = None  # Pages in the source document, None for formats without pages
+        self._parts = []
+        self._length = 0
+        self._text = None
+
+    @classmethod
+    def bundle(cls, name: str, results: list):
+        """
+        Combine the results of an archive's files into one document.
+
+        Each file's text is preceded by a header line with its name; its blocks
+        keep their sources, pages and confidences.
+
+        :param name: Name of the bundle, e.g. the archive's file name
+        :param results: DocumentResult objects in archive order
+        :return: DocumentResult
+        """
+        bundled = cls(name)
+        for result in results:
+            bundled.add(f'=== {result.name} ===\n', SOURCE_TEXT)
+            for block in result.blocks:
+                bundled.add(result.block_text(block), block.source, block.page, block.image, block.confidence)
+            bundled.add('\n', SOURCE_TEXT)
+            bundled.skipped += result.skipped
+            bundled.seconds += result.seconds
+            bundled.profile = result.profile or bundled.profile
+        return bundled
+
+    def add(self, text: str, source: str = SOURCE_TEXT, page=None, image=None, confidence=None):
+        """
+        Append a piece of text to the document.
+
+        :param text: Text to append
+        :param source: SOURCE_TEXT, SOURCE_IMAGE or SOURCE_ERROR
+        :param page: 1-based page number
+        :param image: 1-based image index
+        :param confidence: Mean OCR confidence (0-100)
+        :return: Created Block or None if the text is empty
+        """
+        if not text:
+            return None
+        start = self._length
+        self._length += len(text)
+        self._parts.append(text)
+        self._text = None
+        block = Block(page, image, source, start, self._length, confidence)
+        self.blocks.append(block)
+        return block
+
+    def add_error(self, message: str, page=None, image=None):
+        """
+        Append an error note for a part of the document that could not be processed.
+
+        :param message: Error note included in the text output
+        :param page: 1-based page number
+        :param image: 1-based image index
+        :return: Created Block
+        """
+        return self.add(message, SOURCE_ERROR, page, image)
+
+    @property
+    def text(self) -> str:
+        """
+        Full plain text, joined on first access.
+        """
+        if self._text is None:
+            self._text = ''.join(self._parts)
+            self._parts = [self._text] if self._text else []
+        return self._text
+
+    @property
+    def errors(self) -> int:
+        """
+        Number of parts that could not be processed.
+        """
+        return sum(1 for block in self.blocks if block.source == SOURCE_ERROR)
+
+    def __str__(self):
+        return self.text
+
+    def __len__(self):
+        return self._length
+
+    def is_empty(self) -> bool:
+        """
+        :return: True if the document contains no text besides whitespace
+        """
+        return not self.text.strip()
+
+    def block_text(self, block: Block) -> str:
+        """
+        :param block: Block of this document
+        :return: Text of the block
+        """
+        return self.text[block.start:block.end]
+
+    def page_texts(self) -> dict:
+        """
+        Text grouped by page.
+
+        :return: Dictionary of page number (None for page-less formats) to text
+        """
+        text = self.text
+        pages = {}
+        for block in self.blocks:
+            pages.setdefault(block.page, []).append(text[block.start:block.end])
+        return {page: ''.join(parts) for page, parts in pages.items()}
+
+    def to_tsv(self) -> str:
+        """
+        Render blocks as tab-separated values, one block per row.
+        """
+        text = self.text
+        rows = ['\t'.join(TSV_COLUMNS)]
+        for block in self.blocks:
+            block_text = text[block.start:block.end].replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+            confidence = '' if block.confidence is None else f'{block.confidence:.1f}'
+            rows.append('\t'.join((
+                '' if block.page is None else str(block.page),
+                '' if block.image is None else str(block.image),
+                block.source,
+                str(block.start),
+                str(block.end),
+                confidence,
+                block_text,
+            )))
+        return '\n'.join(rows) + '\n'
+
+    def to_hocr(self) -> str:
+        """
+        Render blocks as a minimal hOCR document, one ocr_page per page and one ocr_carea per block.
+        """
+        text = self.text
+        lines = [
+            '<?xml version="1.0" encoding="UTF-8"?>',
+            '<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN"',
+            '    "http://www.w3.org/TR/xhtml1/DTD/xhtml1-transitional.dtd">',
+            '<html xmlns="http://www.w3.org/1999/xhtml" xml:lang="en" lang="en">',
+            '<head>',
+            f'<title>{escape(self.name)}</title>',
+            '<meta http-equiv="Content-Type" content="text/html;charset=utf-8"/>',
+            '<meta name="ocr-system" content="OCR Telegram Bot"/>',
+            '<meta name="ocr-capabilities" content="ocr_page ocr_carea"/>',
+            '</head>',
+            '<body>',
+        ]
+        current_page = object()
+        for number, block in enumerate(self.blocks, start=1):
+            if block.page != current_page:
+                if number > 1:
+                    lines.append('</div>')
+                current_page = block.page
+                page_number = block.page or 1
+                lines.append(f"<div class='ocr_page' id='page_{page_number}' title='ppageno {page_number - 1}'>")
+            title = f"x_source {block.source}"
+            if block.confidence is not None:
+                title += f'; x_wconf {round(block.confidence)}'
+            lines.append(f"<div class='ocr_carea' id='block_{number}' title='{title}'>"
+                         f'{escape(text[block.start:block.end])}</div>')
+        if self.blocks:
+            lines.append('</div>')
+        lines.extend(['</body>', '</html>'])
+        return '\n'.join(lines) + '\n'
+
+    def render(self, fmt: str = 'text') -> str:
+        """
+        Render the document in one of RESULT_FORMATS.
+
+        :param fmt: 'text', 'tsv' or 'hocr'
+        :return: Rendered document
+        """
+        if fmt == 'text':
+            return self.text
+        if fmt == 'tsv':
+            return self.to_tsv()
+        if fmt == 'hocr':
+            return self.to_hocr()
+        raise ValueError(f'Unsupported result format: {fmt}')
@@ -1,92 +1,280 @@
 import os
+import time
 import zipfile
 import io
 import tempfile
 import logging
-import fitz
-import docx
-from PIL import Image, UnidentifiedImageError
-import pytesseract
+import importlib
+
+from consts import (OCR_MEMORY_BUDGET_MB, PDF_TARGET_DPI, PDF_DRAFT_DECODING, TILING_ENABLED, DEFAULT_OCR_PROFILE,
+                    TRIAGE_ENABLED, TRIAGE_SIDE, TRIAGE_MIN_STDDEV, TRIAGE_INK_CONTRAST, TRIAGE_MIN_INK_PIXELS,
+                    TRIAGE_EDGE_THRESHOLD, TRIAGE_MIN_EDGE_RATIO, ADAPTIVE_MAX_RERUNS)
+from ocr_engine import (RerunBudget, recognize_text_from_image, _backend, _reads_directly, _needs_tiling, _ocr_errors,
+                        _ImageBatch)
+from ocr_result import DocumentResult, RESULT_FORMATS, SOURCE_TEXT, SOURCE_IMAGE
+from resources import MemoryBudget
 
 logger = logging.getLogger(__name__)
 
-# Set the path to the Tesseract executable for Docker environment
-pytesseract.pytesseract.tesseract_cmd = '/usr/bin/tesseract'
 
+def _triage_image(image):
+    """
+    Cheaply decide whether an image clearly contains no text.
+
+    Measures a grayscale copy reduced to TRIAGE_SIDE: its standard deviation,
+    the number of ink pixels that differ from the background level by
+    TRIAGE_INK_CONTRAST, and the number of edge pixels. Text strokes are thin,
+    so text has many edge pixels per ink pixel, while gradients, filled shapes
+    and smooth photos have almost none. Images with transparency are never
+    skipped, their gray levels say little about what Tesseract sees.
 
-# For local run on Windows, uncomment and set the correct path to tesseract.exe
-# pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+    :param image: PIL image
+    :return: Reason the image is text-free ('blank' or 'no text edges'), None if it should be OCR'd
+    """
+    if 'A' in image.getbands() or 'transparency' in image.info:
+        return None
+    pil = _backend('PIL.Image')
+    filters = importlib.import_module('PIL.ImageFilter')
+    stat = importlib.import_module('PIL.ImageStat')
+
+    gray = image.convert('L')
+    gray.thumbnail((TRIAGE_SIDE, TRIAGE_SIDE), pil.Resampling.BOX)
+    if stat.Stat(gray).stddev[0] < TRIAGE_MIN_STDDEV:
+        return 'blank'
+
+    histogram = gray.histogram()
+    background = histogram.index(max(histogram))
+    ink = (sum(histogram[:max(0, background - TRIAGE_INK_CONTRAST)])
+           + sum(histogram[background + TRIAGE_INK_CONTRAST + 1:]))
+    if ink < TRIAGE_MIN_INK_PIXELS:
+        return 'blank'
+
+    # The edge filter leaves a frame of false edges on the border
+    width, height = gray.size
+    edges = gray.filter(filters.FIND_EDGES).crop((1, 1, width - 1, height - 1)).histogram()
+    if sum(edges[TRIAGE_EDGE_THRESHOLD:]) < ink * TRIAGE_MIN_EDGE_RATIO:
+        return 'no text edges'
+    return None
+
+
+def _triage_encoded(fp):
+    """
+    Triage an encoded image without decoding it in full.
 
+    JPEG images are decoded straight at about TRIAGE_SIDE and JPEG 2000 images
+    at the coarsest resolution level that is still larger, other formats are
+    decoded in full.
 
-def recognize_text_from_image(image_path, lang='eng'):
+    :param fp: Path or file object of the encoded image
+    :return: Reason the image is text-free, None if it should be OCR'd
     """
-    Function to extract text from an image using Tesseract OCR
+    with _backend('PIL.Image').open(fp) as image:
+        if image.format == 'JPEG2000':
+            # JPEG 2000 decodes at 1 / 2**reduce of the full resolution
+            scale = max(image.size) // TRIAGE_SIDE
+            if scale >= 2:
+                image.reduce = min(scale.bit_length() - 1, 5)
+        else:
+            image.draft('L', (TRIAGE_SIDE, TRIAGE_SIDE))
+        return _triage_image(image)
 
-    :param image_path: path to the image file or PIL Image object
-    :param lang: language for OCR
-    :return: text: extracted text
+
+def _draft_scale(page, xref, image_size, target_dpi):
+    """
+    How many times an embedded image exceeds the resolution needed at its placement on the page.
+
+    :param page: PyMuPDF page
+    :param xref: Image xref
+    :param image_size: Image size in pixels (width, height)
+    :param target_dpi: Resolution OCR needs
+    :return: Reduction factor, 1 if the image should be decoded at full resolution
+    """
+    rects = page.get_image_rects(xref)
+    if not rects:
+        return 1
+    rect = max(rects, key=lambda r: r.width * r.height)
+    if rect.width <= 0 or rect.height <= 0:
+        return 1
+    needed_width = rect.width / 72 * target_dpi
+    needed_height = rect.height / 72 * target_dpi
+    return max(1, int(min(image_size[0] / needed_width, image_size[1] / needed_height)))
+
+
+def _reduce_on_decode(image, ext, scale):
+    """
+    Ask the decoder to produce a reduced-resolution image instead of decoding it in full.
+
+    :param image: Unloaded PIL image
+    :param ext: Image format reported by PyMuPDF ('jpeg', 'jpx', ...)
+    :param scale: Reduction factor from _draft_scale
+    :return: True if the image will be decoded at a reduced resolution
+    """
+    if scale < 2:
+        return False
+    if ext in ('jpeg', 'jpg'):
+        width, height = image.size
+        image.draft(image.mode, (max(1, width // scale), max(1, height // scale)))
+        return True
+    if ext == 'jpx':
+        # JPEG 2000 decodes at 1 / 2**reduce of the full resolution
+        image.reduce = min(scale.bit_length() - 1, 5)
+        return True
+    return False
+
+
+def _recognize_spilled(image_bytes: bytes, ext: str, lang, profile, reruns):
+    """
+    OCR an encoded image from a temporary file, so Tesseract decodes it instead of this process.
+
+    :return: Tuple (text, confidence)
+    """
+    with tempfile.NamedTemporaryFile(prefix='pdf_image_', suffix=f'.{ext}', delete=False) as f:
+        f.write(image_bytes)
+        spill_path = f.name
+    try:
+        return recognize_text_from_image(spill_path, lang, profile, reruns)
+    finally:
+        os.remove(spill_path)
+
+
+def _recognize_pdf_image(doc, page, xref, lang, budget, profile=DEFAULT_OCR_PROFILE, reruns=None, batch=None):
+    """
+    OCR one embedded PDF image within the worker's memory budget.
+
+    Images that triage finds text-free on a thumbnail are skipped, JPEG and
+    JPEG 2000 images are decoded at the lowest resolution that still gives
+    PDF_TARGET_DPI at their size on the page, and images kept at full
+    resolution are piped to Tesseract in their original encoding. Over budget,
+    images Tesseract reads itself that need no tiling are spilled to a
+    temporary file and decoded by Tesseract instead of in this process; the
+    rest still go through the reduced decoding above.
+
+    :param batch: _ImageBatch of the document, small images are staged in it
+    :return: Tuple (text, confidence), _PendingImage if the image was staged, None if it was skipped by triage
     """
-    if isinstance(image_path, str):
-        image = Image.open(image_path)
-    else:
-        image = image_path
-    text = pytesseract.image_to_string(image, lang=lang)
-    return text
+    base_image = doc.extract_image(xref)
+    image_bytes = base_image['image']
+    ext = base_image['ext']
+    del base_image
+
+    with _backend('PIL.Image').open(io.BytesIO(image_bytes)) as image:
+        # Only the header is read until the image is recognized
+        if budget.exceeded() and _reads_directly(image) and not (TILING_ENABLED and _needs_tiling(image)):
+            return _recognize_spilled(image_bytes, ext, lang, profile, reruns)
+        if TRIAGE_ENABLED:
+            reason = _triage_encoded(io.BytesIO(image_bytes))
+            if reason:
+                logger.debug('Skipping image %s on page %s: %s', xref, page.number + 1, reason)
+                return None
+        reduced = False
+        if PDF_DRAFT_DECODING:
+            reduced = _reduce_on_decode(image, ext, _draft_scale(page, xref, image.size, PDF_TARGET_DPI))
+        source = None if reduced else image_bytes
+        if batch is not None:
+            return batch.recognize(image, source)
+        return recognize_text_from_image(image, lang, profile, reruns, source)
+
+
+def count_pdf_pages(pdf_path) -> int:
+    """
+    Function to count pages of a PDF file without processing them
+
+    :param pdf_path: path to the PDF file
+    :return: number of pages
+    """
+    with _backend('fitz').open(pdf_path) as doc:
+        return len(doc)
 
 
-def recognize_text_from_pdf(pdf_path, lang='eng'):
+def recognize_text_from_pdf(pdf_path, lang='eng', pages=None, profile=DEFAULT_OCR_PROFILE, reruns=None):
     """
     Function to extract text from a PDF file using PyMuPDF and Tesseract OCR
 
+    Pages and images are released as soon as they are processed, and image
+    decoding respects the worker's OCR_MEMORY_BUDGET_MB.
+
     :param pdf_path: path to the PDF file
     :param lang: language for OCR
-    :return: text: extracted text
-    """
-    doc = fitz.open(pdf_path)
-    text = ''
-    for page_num in range(len(doc)):
-        page = doc.load_page(page_num)
-        text += page.get_text()
-        for img in page.get_images(full=True):
-            xref = img[0]
-            base_image = doc.extract_image(xref)
-            image_bytes = base_image['image']
-
-            try:
-                image = Image.open(io.BytesIO(image_bytes))
-                text += recognize_text_from_image(image, lang)
-            except (OSError, UnidentifiedImageError, pytesseract.pytesseract.TesseractError) as e:
-                logger.error('Error processing image on page %s in %s: %s', page_num + 1, pdf_path, e)
-                text += f'\n[Error processing image on page {page_num + 1}: {e}]\n'
+    :param pages: optional range of 0-based page numbers to process, all pages by default
+    :param profile: OCR profile name from OCR_PROFILES
+    :param reruns: RerunBudget of the job for adaptive profiles, a new one by default
+    :return: result: DocumentResult with the text layer and OCR'd images of the processed pages
+    """
+    budget = MemoryBudget(OCR_MEMORY_BUDGET_MB)
+    if reruns is None:
+        reruns = RerunBudget()
+    result = DocumentResult(os.path.basename(pdf_path))
+    with _backend('fitz').open(pdf_path) as doc, _ImageBatch(result, lang, profile, reruns) as batch:
+        result.page_count = len(doc)
+        page_numbers = range(len(doc)) if pages is None else range(len(doc))[pages.start:pages.stop]
+        for page_num in page_numbers:
+            page = doc.load_page(page_num)
+            batch.add(page.get_text(), SOURCE_TEXT, page=page_num + 1)
+            for image_num, img in enumerate(page.get_images(full=True), start=1):
+                try:
+                    recognized = _recognize_pdf_image(doc, page, img[0], lang, budget, profile, reruns, batch)
+                    if recognized is None:
+                        result.skipped += 1
+                        continue
+                    batch.add_image(recognized, f'on page {page_num + 1}', page=page_num + 1, image=image_num)
+                except _ocr_errors() as e:
+                    logger.error('Error processing image on page %s in %s: %s', page_num + 1, pdf_path, e)
+                    batch.add_error(f'\n[Error processing image on page {page_num + 1}: {e}]\n',
+                                    page=page_num + 1, image=image_num)
+            del page
+            if budget.limit:
+                # Drop MuPDF's cached page resources before the next page
+                _backend('fitz').TOOLS.store_shrink(100)
 
     logger.debug('PDF processing completed: %s', pdf_path)
-    return text
+    return result
+
+
+def _triage_docx_image(image_path) -> bool:
+    """
+    :param image_path: Path of an image extracted from a DOCX file
+    :return: True if triage finds the image text-free
+    """
+    reason = _triage_encoded(image_path)
+    if reason:
+        logger.debug('Skipping image %s: %s', os.path.basename(image_path), reason)
+    return reason is not None
 
 
-def recognize_text_from_docx(docx_path, lang='eng'):
+def recognize_text_from_docx(docx_path, lang='eng', profile=DEFAULT_OCR_PROFILE, reruns=None):
     """
     Function to extract text from a DOCX file using python-docx and Tesseract OCR
 
     :param docx_path: path to the DOCX file
     :param lang: language for OCR
-    :return: text: extracted text
+    :param profile: OCR profile name from OCR_PROFILES
+    :param reruns: RerunBudget of the job for adaptive profiles, a new one by default
+    :return: result: DocumentResult with the paragraphs and OCR'd images
     """
-    doc = docx.Document(docx_path)
-    text = ''
-    for para in doc.paragraphs:
-        text += para.text + '\n'
-
-    with tempfile.TemporaryDirectory(prefix='docx_images_') as temp_dir:
+    if reruns is None:
+        reruns = RerunBudget()
+    doc = _backend('docx').Document(docx_path)
+    result = DocumentResult(os.path.basename(docx_path))
+    result.add(''.join(f'{para.text}\n' for para in doc.paragraphs), SOURCE_TEXT)
+
+    with tempfile.TemporaryDirectory(prefix='docx_images_') as temp_dir, \
+            _ImageBatch(result, lang, profile, reruns) as batch:
         image_paths = extract_images_from_docx(docx_path, temp_dir)
-        for image_path in image_paths:
+        for image_num, image_path in enumerate(image_paths, start=1):
             try:
-                text += recognize_text_from_image(image_path, lang) + '\n'
-            except (OSError, UnidentifiedImageError, pytesseract.pytesseract.TesseractError) as e:
+                if TRIAGE_ENABLED and _triage_docx_image(image_path):
+                    result.skipped += 1
+                    continue
+                with _backend('PIL.Image').open(image_path) as image:
+                    recognized = batch.recognize(image, image_path)
+                batch.add_image(recognized, os.path.basename(image_path), image=image_num, suffix='\n')
+            except _ocr_errors() as e:
                 logger.error('Error processing image %s from %s: %s', os.path.basename(image_path), docx_path, e)
-                text += f'\n[Error processing image {os.path.basename(image_path)}: {e}]\n'
+                batch.add_error(f'\n[Error processing image {os.path.basename(image_path)}: {e}]\n',
+                                image=image_num)
 
     logger.debug('DOCX processing completed: %s', docx_path)
-    return text
+    return result
 
 
 def extract_images_from_docx(docx_path, extract_dir):
@@ -116,25 +304,35 @@ def extract_images_from_docx(docx_path, extract_dir):
     return image_paths
 
 
-def process_input_files(file_paths, lang):
+def process_input_files(file_paths, lang, profile=DEFAULT_OCR_PROFILE, pages=None, max_reruns=ADAPTIVE_MAX_RERUNS):
     """
     Function to process files and extract text based on the file type
 
     :param file_paths: list of file paths
     :param lang: Tesseract OCR language code(s), e.g. 'eng' for English, 'fra' for French,
     or 'eng+fra' for multiple languages
-    :return: results: dictionary with file names and extracted text
+    :param profile: OCR profile name from OCR_PROFILES
+    :param pages: optional dictionary of PDF file paths and ranges of 0-based page numbers to process
+    :param max_reruns: Block re-runs adaptive profiles may make for all the files, e.g. the files' share
+        of a job whose other files are recognized separately
+    :return: results: dictionary with file names and DocumentResult objects
     """
 
     results = {}
+    reruns = RerunBudget(max_reruns)
     for file_path in file_paths:
-        logger.info('Processing file: %s with language: %s', os.path.basename(file_path), lang)
-        if file_path.endswith('.pdf'):
-            text = recognize_text_from_pdf(file_path, lang)
-        elif file_path.endswith('.docx'):
-            text = recognize_text_from_docx(file_path, lang)
-        elif file_path.lower().endswith(('.png', '.jpg', '.jpeg', '.tiff', '.bmp', '.gif')):
-            text = recognize_text_from_image(file_path, lang)
+        logger.info('Processing file: %s with language: %s, profile: %s', os.path.basename(file_path), lang, profile)
+        started = time.perf_counter()
+        ext = os.path.splitext(file_path)[1].lower()
+        if ext == '.pdf':
+            page_range = pages.get(file_path) if pages else None
+            result = recognize_text_from_pdf(file_path, lang, page_range, profile, reruns)
+        elif ext == '.docx':
+            result = recognize_text_from_docx(file_path, lang, profile, reruns)
+        elif ext in ('.png', '.jpg', '.jpeg', '.tiff', '.bmp', '.gif'):
+            result = DocumentResult(os.path.basename(file_path))
+            text, confidence = recognize_text_from_image(file_path, lang, profile, reruns)
+            result.add(text, SOURCE_IMAGE, image=1, confidence=confidence)
         else:
             logger.error('Unsupported file format: %s', file_path)
             raise ValueError(f'Unsupported file format: {file_path}')
@@ -153,22 +351,33 @@ def process_input_files(file_paths, lang):
                     break
                 counter += 1
 
-        results[key] = text
+        if result.skipped:
+            logger.info('Skipped %d text-free image(s) in %s', result.skipped, base_name)
+
+        result.name = key
+        result.profile = profile
+        result.seconds = time.perf_counter() - started
+        results[key] = result
 
+    if reruns.used:
+        logger.info('Adaptive OCR re-ran %d of at most %d low-confidence block(s)', reruns.used, reruns.limit)
     return results
 
 
-def save_texts_to_files(texts, output_dir):
+def save_texts_to_files(texts, output_dir, fmt='text'):
     """
     Function to save extracted texts to files
 
-    :param texts: dictionary with file names and extracted text
+    :param texts: dictionary with file names and DocumentResult objects (or plain text)
     :param output_dir: directory to save the output files
+    :param fmt: output format, one of RESULT_FORMATS ('text', 'tsv' or 'hocr')
     """
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
+    extension = RESULT_FORMATS[fmt]
     for filename, text in texts.items():
-        output_path = os.path.join(output_dir, f'{os.path.splitext(filename)[0]}.txt')
+        content = text.render(fmt) if isinstance(text, DocumentResult) else text
+        output_path = os.path.join(output_dir, f'{os.path.splitext(filename)[0]}{extension}')
         with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(text)
+            f.write(content)
@@ -0,0 +1,170 @@
+"""
+Process resource accounting for OCR workers.
+
+Also plans CPU use: the number of worker processes follows the container's
+cgroup CPU quota rather than the host's CPU count, and the OpenMP threads a
+Tesseract run may use (OMP_THREAD_LIMIT) follow the number of busy workers,
+so a lone job gets several threads and a full queue one thread per job.
+
+Kept free of Telegram and format backend imports so worker processes can use
+it at no startup cost.
+"""
+import os
+import gc
+import math
+import ctypes
+import ctypes.util
+import logging
+from functools import lru_cache
+
+from consts import OCR_THREADS_MAX
+
+logger = logging.getLogger(__name__)
+
+_CGROUP_V2_CPU_MAX = '/sys/fs/cgroup/cpu.max'
+_CGROUP_V1_CPU_DIR = '/sys/fs/cgroup/cpu'
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def current_rss() -> int:
+    """
+    Resident set size of the current process.
+
+    :return: RSS in bytes, or 0 if it cannot be determined on this platform
+    """
+    try:
+        with open('/proc/self/statm', 'r', encoding='ascii') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+@lru_cache(maxsize=None)
+def _libc():
+    """
+    Load the C library on first use.
+
+    :return: ctypes library or None if it cannot be found
+    """
+    name = ctypes.util.find_library('c')
+    return ctypes.CDLL(name) if name else None
+
+
+def release_memory():
+    """
+    Collect garbage and hand freed heap memory back to the operating system.
+    """
+    gc.collect()
+    libc = _libc()
+    if libc is not None and hasattr(libc, 'malloc_trim'):
+        libc.malloc_trim(0)
+
+
+class MemoryBudget:
+    """
+    RSS limit for one worker process.
+    """
+
+    def __init__(self, limit_mb):
+        """
+        :param limit_mb: RSS limit in megabytes, None disables the budget
+        """
+        self.limit = limit_mb * 1024 * 1024 if limit_mb else None
+
+    def exceeded(self) -> bool:
+        """
+        Check the budget, releasing memory first if the process is over it.
+
+        :return: True if the process stays over budget after releasing memory
+        """
+        if not self.limit or current_rss() <= self.limit:
+            return False
+        release_memory()
+        rss = current_rss()
+        if rss <= self.limit:
+            return False
+        logger.warning('Worker %s over memory budget: %d MB', os.getpid(), rss // (1024 * 1024))
+        return True
+
+
+def _read_first_line(path: str) -> str:
+    with open(path, 'r', encoding='ascii') as f:
+        return f.readline().strip()
+
+
+def cpu_quota():
+    """
+    CPU limit of the container from the cgroup v2 cpu.max file or the cgroup v1 CFS quota.
+
+    :return: Number of CPUs, possibly fractional, or None if no quota is set
+    """
+    try:
+        quota, period = _read_first_line(_CGROUP_V2_CPU_MAX).split()[:2]
+    except (OSError, ValueError):
+        try:
+            quota = _read_first_line(os.path.join(_CGROUP_V1_CPU_DIR, 'cpu.cfs_quota_us'))
+            period = _read_first_line(os.path.join(_CGROUP_V1_CPU_DIR, 'cpu.cfs_period_us'))
+        except OSError:
+            return None
+    try:
+        quota, period = int(quota), int(period)
+    except ValueError:
+        # 'max' in cgroup v2
+        return None
+    if quota <= 0 or period <= 0:
+        # -1 in cgroup v1
+        return None
+    return quota / period
+
+
+def available_cpus() -> tuple:
+    """
+    CPUs this process may keep busy: the cgroup quota, the CPU affinity mask or the CPU count, whichever is lower.
+
+    :return: Tuple (number of CPUs, at least 1; source of the number for logs)
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        cpus, source = len(os.sched_getaffinity(0)), 'affinity'
+    else:
+        cpus, source = os.cpu_count() or 1, 'cpu count'
+    quota = cpu_quota()
+    if quota is not None and quota < cpus:
+        # A fractional quota is rounded down, extra processes would only be throttled
+        cpus, source = max(1, math.floor(quota)), f'cgroup quota {quota:g}'
+    return cpus, source
+
+
+class ConcurrencyPlan:
+    """
+    Split of the available CPUs into OCR worker processes and OpenMP threads per Tesseract run.
+    """
+
+    def __init__(self, processes=None, threads_max: int = OCR_THREADS_MAX):
+        """
+        :param processes: Number of worker processes, None means one per available CPU
+        :param threads_max: Most threads one Tesseract run gets, it scales poorly beyond a few
+        """
+        self.cpus, self.source = available_cpus()
+        self.processes = processes or self.cpus
+        self.threads_max = max(1, threads_max)
+
+    def threads(self, busy: int) -> int:
+        """
+        OpenMP threads for a job starting while busy workers, including its own, have work.
+
+        :param busy: Number of busy workers
+        :return: Value for OMP_THREAD_LIMIT
+        """
+        busy = max(1, min(busy, self.processes))
+        return max(1, min(self.threads_max, self.cpus // busy))
+
+    def as_dict(self) -> dict:
+        """
+        :return: Plan summary for logs and health checks
+        """
+        return {'cpus': self.cpus, 'cpu_source': self.source, 'processes': self.processes,
+                'threads_max': self.threads(1)}
+
+    def __str__(self):
+        return (f'{self.processes} processes x {self.threads(self.processes)}-{self.threads(1)} threads '
+                f'on {self.cpus} CPUs ({self.source})')
@@ -1,24 +1,39 @@
 """
 Utility modules for the OCR Telegram Bot.
 """
-from .logger import setup_logger
+from .logger import setup_logger, stop_logging, stage_fields
 from .keyboards import (get_user_lang, get_interface_language_keyboard, get_main_keyboard, get_text_delivery_keyboard,
-                        get_language_keyboard)
+                        get_language_keyboard, get_ocr_profile_keyboard, get_next_pages_keyboard)
 from .filters import create_translation_filter, create_multi_key_filter
-from .helpers import sanitize_filename
+from .archive import extract_archive, ArchiveError
+from .helpers import (sanitize_filename, utf16_len, is_draining, max_upload_size, format_megabytes, parse_page_range,
+                      PAGE_RANGE)
 
 __all__ = [
     # Logger
     'setup_logger',
+    'stop_logging',
+    'stage_fields',
     # Keyboards
     'get_user_lang',
     'get_interface_language_keyboard',
     'get_main_keyboard',
     'get_text_delivery_keyboard',
     'get_language_keyboard',
+    'get_ocr_profile_keyboard',
+    'get_next_pages_keyboard',
     # Filters
     'create_translation_filter',
     'create_multi_key_filter',
+    # Archives
+    'extract_archive',
+    'ArchiveError',
     # Helpers
     'sanitize_filename',
+    'utf16_len',
+    'is_draining',
+    'max_upload_size',
+    'format_megabytes',
+    'parse_page_range',
+    'PAGE_RANGE',
 ]
@@ -0,0 +1,115 @@
+"""
+ZIP archive extraction for uploads.
+
+Entries are read one at a time and copied to disk in chunks, so an archive is
+never held in memory. Only files in ZIP_MEMBER_FORMATS are extracted, and the
+number of files and the bytes actually decompressed are capped, since the
+sizes in an archive's headers can lie (zip bombs).
+"""
+import os
+import zlib
+import logging
+import zipfile
+
+from consts import ZIP_MAX_ENTRIES, ZIP_MAX_MEMBERS, ZIP_MAX_UNCOMPRESSED, ZIP_MEMBER_FORMATS
+
+logger = logging.getLogger(__name__)
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+class ArchiveError(Exception):
+    """
+    Raised when an archive is rejected; key is the translation key of the user message.
+    """
+
+    def __init__(self, key: str, message: str):
+        super().__init__(message)
+        self.key = key
+
+
+def _is_candidate(info: zipfile.ZipInfo) -> bool:
+    """
+    :return: True for regular, unencrypted entries in a supported format, outside metadata folders
+    """
+    name = info.filename.replace('\\', '/')
+    if info.is_dir() or info.flag_bits & 0x1:
+        return False
+    if name.startswith('__MACOSX/') or os.path.basename(name).startswith('.'):
+        return False
+    return os.path.splitext(name)[1].lower().lstrip('.') in ZIP_MEMBER_FORMATS
+
+
+def _copy_entry(source, path: str, budget: int) -> int:
+    """
+    Copy an entry to disk, stopping as soon as it decompresses to more than budget bytes.
+
+    :return: Number of bytes written
+    """
+    written = 0
+    with open(path, 'wb') as target:
+        while True:
+            chunk = source.read(min(_CHUNK_SIZE, budget - written + 1))
+            if not chunk:
+                return written
+            written += len(chunk)
+            if written > budget:
+                raise ArchiveError('zip_too_large', 'Archive decompresses to more than the allowed size')
+            target.write(chunk)
+
+
+def extract_archive(zip_path: str, reserve_path, max_entries: int = ZIP_MAX_ENTRIES,
+                    max_size: int = ZIP_MAX_UNCOMPRESSED, on_extracted=None) -> tuple:
+    """
+    Extract the supported files of a ZIP archive.
+
+    Nothing is left behind if the archive is rejected, including files
+    already passed to on_extracted.
+
+    :param zip_path: Path of the archive
+    :param reserve_path: Callable returning a new unique path for an entry's file name
+    :param max_entries: Most supported files an archive may contain
+    :param max_size: Most bytes the supported files may decompress to in total
+    :param on_extracted: Optional callable called with each file's path as soon as the file is written
+    :return: Tuple (paths of the extracted files in archive order, number of skipped entries)
+    :raises ArchiveError: if the archive is damaged, over a limit or has no supported files
+    """
+    extracted = []
+    try:
+        with zipfile.ZipFile(zip_path) as archive:
+            members = archive.infolist()
+            if len(members) > ZIP_MAX_MEMBERS:
+                raise ArchiveError('zip_too_many_files', f'Archive has {len(members)} entries')
+            entries = [info for info in members if _is_candidate(info)]
+            if len(entries) > max_entries:
+                raise ArchiveError('zip_too_many_files', f'Archive has {len(entries)} supported files')
+            if sum(info.file_size for info in entries) > max_size:
+                raise ArchiveError('zip_too_large', 'Archive declares more than the allowed size')
+
+            budget = max_size
+            for info in entries:
+                path = reserve_path(os.path.basename(info.filename.replace('\\', '/')))
+                extracted.append(path)
+                with archive.open(info) as source:
+                    budget -= _copy_entry(source, path, budget)
+                if on_extracted is not None:
+                    on_extracted(path)
+    except (zipfile.BadZipFile, zipfile.LargeZipFile, zlib.error, NotImplementedError, EOFError) as e:
+        # NotImplementedError: unsupported compression method
+        _remove(extracted)
+        raise ArchiveError('zip_invalid', str(e)) from e
+    except BaseException:
+        _remove(extracted)
+        raise
+
+    if not extracted:
+        raise ArchiveError('zip_no_files', 'Archive has no supported files')
+    files = sum(1 for info in members if not info.is_dir())
+    logger.debug('Extracted %d of %d archive files from %s', len(extracted), files, zip_path)
+    return extracted, files - len(extracted)
+
+
+def _remove(paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
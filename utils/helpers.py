@@ -4,6 +4,14 @@ Helper utility functions for the OCR Telegram Bot.
 import os
 import re
 
+from consts import PAGE_RANGE_PATTERN, PDF_MAX_PAGES, MAX_SIZE
+
+# Characters outside the Basic Multilingual Plane take two UTF-16 code units
+ASTRAL_CHARS = re.compile('[\U00010000-\U0010FFFF]')
+
+# Page range given in a caption or message, e.g. 'pages: 3-7'
+PAGE_RANGE = re.compile(PAGE_RANGE_PATTERN, re.IGNORECASE)
+
 
 def sanitize_filename(filename: str) -> str:
     """
@@ -39,3 +47,65 @@ def sanitize_filename(filename: str) -> str:
         base = base[:100]
 
     return f"{base}{ext}"
+
+
+def utf16_len(text: str) -> int:
+    """
+    Length of a string in UTF-16 code units, as counted by Telegram's message limits.
+
+    :param text: Text to measure
+    :return: Number of UTF-16 code units
+    """
+    if text.isascii():
+        return len(text)
+    return len(text) + sum(1 for _ in ASTRAL_CHARS.finditer(text))
+
+
+def is_draining(bot_data: dict) -> bool:
+    """
+    Check whether the bot is shutting down and must not start new jobs.
+
+    :param bot_data: Application bot_data holding the Lifecycle
+    :return: True while draining
+    """
+    lifecycle = bot_data.get('lifecycle')
+    return bool(lifecycle and lifecycle.draining)
+
+
+def max_upload_size(bot_data: dict) -> int:
+    """
+    Largest upload the bot accepts, chosen at startup.
+
+    :param bot_data: Application bot_data
+    :return: Size in bytes
+    """
+    return bot_data.get('max_size', MAX_SIZE)
+
+
+def format_megabytes(size: int) -> str:
+    """
+    :param size: Size in bytes
+    :return: Size in whole megabytes, e.g. '10MB'
+    """
+    return f'{size // (1024 * 1024)}MB'
+
+
+def parse_page_range(text: str):
+    """
+    Parse a page range such as 'pages: 3-7' or 'pages 5'.
+
+    Ranges longer than PDF_MAX_PAGES are shortened, the rest of the pages can
+    be recognized later as next pages.
+
+    :param text: Caption or message text
+    :return: range of 0-based page numbers, None if the text is not a page range
+    :raises ValueError: If the range starts before page 1 or ends before it starts
+    """
+    match = PAGE_RANGE.match(text or '')
+    if not match:
+        return None
+    first = int(match.group(1))
+    last = int(match.group(2) or first)
+    if first < 1 or last < first:
+        raise ValueError(f'Invalid page range: {first}-{last}')
+    return range(first - 1, min(last, first - 1 + PDF_MAX_PAGES))
@@ -1,10 +1,16 @@
 """
 Keyboard builders for the OCR Telegram Bot.
+
+Keyboards depend only on the interface language and menu state, so each
+variant is built once and reused; Telegram objects are immutable, which makes
+sharing them between updates safe.
 """
+from functools import lru_cache
+
 from telegram import ReplyKeyboardMarkup, KeyboardButton
 from telegram.ext import ContextTypes
 
-from consts import DEFAULT_INTERFACE_LANG
+from consts import DEFAULT_INTERFACE_LANG, OCR_PROFILES
 from localization import get_text, get_supported_languages
 
 
@@ -18,6 +24,7 @@ def get_user_lang(context: ContextTypes.DEFAULT_TYPE) -> str:
     return context.user_data.get('interface_lang', DEFAULT_INTERFACE_LANG)
 
 
+@lru_cache(maxsize=None)
 def get_interface_language_keyboard() -> ReplyKeyboardMarkup:
     """
     Create keyboard for interface language selection.
@@ -38,14 +45,21 @@ def get_main_keyboard(context: ContextTypes.DEFAULT_TYPE) -> ReplyKeyboardMarkup
     :param context: Context object for localization
     :return: ReplyKeyboardMarkup with main menu buttons
     """
-    lang = get_user_lang(context)
+    return _build_main_keyboard(get_user_lang(context))
+
+
+@lru_cache(maxsize=None)
+def _build_main_keyboard(lang: str) -> ReplyKeyboardMarkup:
     keyboard = [
         [
             KeyboardButton(get_text(lang, 'btn_ukrainian')),
             KeyboardButton(get_text(lang, 'btn_english')),
             KeyboardButton(get_text(lang, 'btn_other_language'))
         ],
-        [KeyboardButton(get_text(lang, 'btn_multiple_languages'))],
+        [
+            KeyboardButton(get_text(lang, 'btn_multiple_languages')),
+            KeyboardButton(get_text(lang, 'btn_ocr_profile'))
+        ],
         [
             KeyboardButton(get_text(lang, 'btn_info')),
             KeyboardButton(get_text(lang, 'btn_interface_language'))
@@ -54,6 +68,22 @@ def get_main_keyboard(context: ContextTypes.DEFAULT_TYPE) -> ReplyKeyboardMarkup
     return ReplyKeyboardMarkup(keyboard, one_time_keyboard=True, resize_keyboard=True)
 
 
+def get_next_pages_keyboard(context: ContextTypes.DEFAULT_TYPE) -> ReplyKeyboardMarkup:
+    """
+    Create main menu keyboard with a button to recognize the next pages of the last PDF.
+
+    :param context: Context object for localization
+    :return: ReplyKeyboardMarkup with the next pages button above the main menu buttons
+    """
+    return _build_next_pages_keyboard(get_user_lang(context))
+
+
+@lru_cache(maxsize=None)
+def _build_next_pages_keyboard(lang: str) -> ReplyKeyboardMarkup:
+    keyboard = [[KeyboardButton(get_text(lang, 'btn_next_pages'))], *_build_main_keyboard(lang).keyboard]
+    return ReplyKeyboardMarkup(keyboard, one_time_keyboard=True, resize_keyboard=True)
+
+
 def get_text_delivery_keyboard(context: ContextTypes.DEFAULT_TYPE) -> ReplyKeyboardMarkup:
     """
     Create keyboard for text delivery method selection.
@@ -61,7 +91,11 @@ def get_text_delivery_keyboard(context: ContextTypes.DEFAULT_TYPE) -> ReplyKeybo
     :param context: Context object for localization
     :return: ReplyKeyboardMarkup with delivery option buttons
     """
-    lang = get_user_lang(context)
+    return _build_text_delivery_keyboard(get_user_lang(context))
+
+
+@lru_cache(maxsize=None)
+def _build_text_delivery_keyboard(lang: str) -> ReplyKeyboardMarkup:
     keyboard = [[
         KeyboardButton(get_text(lang, 'btn_message')),
         KeyboardButton(get_text(lang, 'btn_text_file'))
@@ -76,14 +110,37 @@ def get_language_keyboard(context: ContextTypes.DEFAULT_TYPE) -> ReplyKeyboardMa
     :param context: Context object for localization
     :return: ReplyKeyboardMarkup with language buttons
     """
-    lang = get_user_lang(context)
+    confirm_state = bool(context.user_data.get('lang_confirm_state'))
+    return _build_language_keyboard(get_user_lang(context), confirm_state)
+
+
+@lru_cache(maxsize=None)
+def _build_language_keyboard(lang: str, confirm_state: bool) -> ReplyKeyboardMarkup:
     supported_langs = get_supported_languages(lang)
 
     keyboard = [[KeyboardButton(get_text(lang, 'btn_back_to_menu'))]]
 
-    if context.user_data.get('lang_confirm_state'):
+    if confirm_state:
         keyboard.insert(0, [KeyboardButton(get_text(lang, 'btn_confirm'))])
 
     keyboard.extend([[KeyboardButton(lang_name)] for lang_name in supported_langs.keys()])
 
     return ReplyKeyboardMarkup(keyboard, one_time_keyboard=True, resize_keyboard=True)
+
+
+def get_ocr_profile_keyboard(context: ContextTypes.DEFAULT_TYPE) -> ReplyKeyboardMarkup:
+    """
+    Create keyboard for OCR profile selection.
+
+    :param context: Context object for localization
+    :return: ReplyKeyboardMarkup with a button per OCR profile
+    """
+    return _build_ocr_profile_keyboard(get_user_lang(context))
+
+
+@lru_cache(maxsize=None)
+def _build_ocr_profile_keyboard(lang: str) -> ReplyKeyboardMarkup:
+    buttons = [KeyboardButton(get_text(lang, f'btn_profile_{profile}')) for profile in OCR_PROFILES]
+    keyboard = [buttons[i:i + 2] for i in range(0, len(buttons), 2)]
+    keyboard.append([KeyboardButton(get_text(lang, 'btn_back_to_menu'))])
+    return ReplyKeyboardMarkup(keyboard, one_time_keyboard=True, resize_keyboard=True)
@@ -1,23 +1,96 @@
 """
 Logger configuration for the OCR Telegram Bot.
+
+Records are put on a queue by the calling thread and written to the console
+and the rotating log file by a background listener thread, so logging from
+async handlers never blocks the event loop on file I/O or rotation.
 """
 import os
+import copy
+import json
+import queue
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 
 from consts import (
     LOG_DIR_NAME, LOG_FILE_NAME, LOG_FORMAT, LOG_LEVEL,
-    LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_ENCODING
+    LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_ENCODING, LOG_JSON
 )
 
+# Optional fields passed with extra={...} and written by JsonFormatter
+STRUCTURED_FIELDS = ('job_id', 'user_id', 'stage', 'duration')
+
+# Background listener started by setup_logger(), until stop_logging()
+_LISTENERS = []
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format records as JSON lines, including the STRUCTURED_FIELDS they carry.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = round(value, 4) if field == 'duration' else value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _LocalQueueHandler(QueueHandler):
+    """
+    Queue handler for a listener in the same process.
+
+    Merges the message arguments up front like QueueHandler, but keeps the
+    exception info, so formatters on the listener thread still see it.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def stage_fields(stage: str, duration: float = None, job_id: str = None, user_id: int = None) -> dict:
+    """
+    Build the extra argument of a structured log call.
+
+    :param stage: Processing stage, e.g. 'ocr' or 'delivery'
+    :param duration: Stage duration in seconds
+    :param job_id: Job identifier
+    :param user_id: Telegram user ID
+    :return: Dictionary for logger.info(..., extra=...)
+    """
+    return {'stage': stage, 'duration': duration, 'job_id': job_id, 'user_id': user_id}
+
+
+def stop_logging():
+    """
+    Flush queued records and stop the background listener.
+    """
+    while _LISTENERS:
+        _LISTENERS.pop().stop()
+
 
-def setup_logger() -> logging.Logger:
+def setup_logger(json_format: bool = LOG_JSON) -> logging.Logger:
     """
     Configure and return the application logger.
 
     Sets up both console and rotating file handlers with the configured
-    format, level, and rotation settings.
+    format, level, and rotation settings, behind a queue served by a
+    background thread.
 
+    :param json_format: Write the log file as JSON lines with structured fields
     :return: Configured logger instance
     """
     log_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), LOG_DIR_NAME)
@@ -45,9 +118,15 @@ def setup_logger() -> logging.Logger:
         encoding=LOG_ENCODING
     )
     file_handler.setLevel(getattr(logging, LOG_LEVEL))
-    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    file_handler.setFormatter(JsonFormatter() if json_format else logging.Formatter(LOG_FORMAT))
+
+    # Handlers run on the listener thread, callers only enqueue records
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+    listener.start()
+    _LISTENERS.append(listener)
+    atexit.register(stop_logging)
 
-    root_logger.addHandler(console_handler)
-    root_logger.addHandler(file_handler)
+    root_logger.addHandler(_LocalQueueHandler(log_queue))
 
     return logging.getLogger(__name__)